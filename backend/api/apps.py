@@ -1,6 +1,21 @@
+import logging
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Time the queries of every database connection for the request metrics
+        from .utils import instrumentation  # noqa: F401
+
+        from .utils.ilp_cover import milp
+        if milp is None:
+            logger.warning(
+                "scipy is not installed: combination searches only use branch and bound "
+                "and the backup price bound falls back to dual ascent"
+            )
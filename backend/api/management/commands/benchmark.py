@@ -0,0 +1,181 @@
+import io
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from api.utils import result_cache
+from api.utils.coverage_index import CoverageIndex, get_coverage_index
+from api.utils.package_optimizer import calculate_package_coverage
+from api.utils.set_cover_solver import solve_cover_problem
+from api.utils.synthetic_data import generate_dataset
+from api.views import PackageCombinationView, PackageCombinationViewBackup
+
+# (name, url, uses max_size)
+ENDPOINTS = [
+    ('by-teams', '/api/packages/by-teams/', False),
+    ('by-teams-soft', '/api/packages/by-teams-soft/', False),
+    ('combinations', '/api/packages/combinations/', True),
+    ('combinations-backup', '/api/packages/combinations-backup/', False),
+]
+
+
+def int_list(value):
+    return [int(part) for part in value.split(',') if part]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the optimizer endpoints and solvers on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int_list, default=[1000, 5000], help='Comma separated game counts')
+        parser.add_argument('--packages', type=int_list, default=[25, 100], help='Comma separated package counts')
+        parser.add_argument('--teams', type=int_list, default=[1, 5, 20], help='Comma separated numbers of selected teams')
+        parser.add_argument('--max-size', type=int_list, default=[4, 8], help='Comma separated combination sizes')
+        parser.add_argument('--team-pool', type=int, default=40, help='Number of distinct teams in the generated data')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per measurement')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the JSON results')
+
+    def handle(self, *args, **options):
+        # Run against a throwaway test database, the real data stays untouched
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Without entries the result cache never answers, so every run measures a full search
+        configured_cache = result_cache._result_cache
+        result_cache._result_cache = result_cache.LocalResultCache(max_entries=0, ttl=0)
+        try:
+            # No snapshots of the synthetic data, the configured snapshot file is the real one's
+            with override_settings(COVERAGE_SNAPSHOT_PATH=''):
+                results = self._run_grid(options)
+        finally:
+            result_cache._result_cache = configured_cache
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'machine': platform.machine(),
+            },
+            'options': {key: options[key] for key in ('games', 'packages', 'teams', 'max_size', 'team_pool', 'repeat', 'seed')},
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} measurements to {options['output']}"))
+
+    def _run_grid(self, options):
+        results = []
+        rng = random.Random(options['seed'])
+        for games in options['games']:
+            for packages in options['packages']:
+                dataset = {'games': games, 'packages': packages, 'teams': options['team_pool']}
+                with tempfile.TemporaryDirectory() as directory:
+                    paths = generate_dataset(
+                        directory, games, packages, teams=options['team_pool'], seed=options['seed']
+                    )
+                    self.stdout.write(f'Loading dataset {dataset}...')
+                    started = time.perf_counter()
+                    with override_settings(**paths):
+                        call_command('import_data', stdout=io.StringIO())
+                    results.append(self._result(dataset, 'import_data', {}, [time.perf_counter() - started]))
+
+                index = get_coverage_index()
+                dataset['offers'] = index.offer_count
+                results.append(self._result(
+                    dataset, 'CoverageIndex.build', {},
+                    self._time(lambda: CoverageIndex.build(index.version), options['repeat']),
+                ))
+
+                for team_count in options['teams']:
+                    teams = rng.sample(sorted(index.team_games), min(team_count, len(index.team_games)))
+                    results.extend(self._bench_selection(index, dataset, teams, options))
+        return results
+
+    def _bench_selection(self, index, dataset, teams, options):
+        results = []
+        repeat = options['repeat']
+        client = Client()
+        base = {'teams': len(teams)}
+
+        for name, url, uses_max_size in ENDPOINTS:
+            for max_size in options['max_size'] if uses_max_size else [None]:
+                body = {'teams': teams}
+                params = dict(base)
+                if max_size is not None:
+                    body['max_size'] = params['max_size'] = max_size
+                responses = []
+
+                def request():
+                    responses.append(client.post(url, body, content_type='application/json'))
+
+                with override_settings(ALLOWED_HOSTS=['testserver']):
+                    timings = self._time(request, repeat)
+                response = responses[-1]
+                extra = {'status': response.status_code, 'bytes': len(response.content)}
+                if response.status_code == 200 and isinstance(response.json(), dict):
+                    extra['partial'] = bool(response.json().get('partial'))
+                results.append(self._result(dataset, f'endpoint:{name}', params, timings, extra))
+
+        # Solver functions on their own, without HTTP and serialization
+        games_mask = index.games_for_teams(teams)
+        results.append(self._result(
+            dataset, 'calculate_package_coverage', base,
+            self._time(lambda: calculate_package_coverage(index, games_mask), repeat),
+        ))
+        backup_view = PackageCombinationViewBackup()
+        results.append(self._result(
+            dataset, 'greedy_cover', base,
+            self._time(lambda: backup_view.find_combinations(index, teams, []), repeat),
+        ))
+        combination_view = PackageCombinationView()
+        for max_size in options['max_size']:
+            problem = combination_view.prepare_problem(index, teams, [], max_size)
+            if 'solver_args' not in problem:
+                continue
+            solutions = []
+            timings = self._time(lambda: solutions.append(solve_cover_problem(**problem['solver_args'])), repeat)
+            results.append(self._result(
+                dataset, 'solve_cover_problem', dict(base, max_size=max_size), timings,
+                {
+                    'candidates': len(problem['solver_args']['masks']),
+                    'nodes': solutions[-1]['nodes'],
+                    'partial': not solutions[-1]['complete'],
+                },
+            ))
+        return results
+
+    @staticmethod
+    def _time(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def _result(self, dataset, target, params, timings, extra=None):
+        result = {
+            'dataset': dict(dataset),
+            'target': target,
+            'params': params,
+            'runs': len(timings),
+            'min_seconds': min(timings),
+            'median_seconds': statistics.median(timings),
+            'mean_seconds': statistics.fmean(timings),
+            **(extra or {}),
+        }
+        label = ', '.join(f'{key}={value}' for key, value in params.items())
+        self.stdout.write(f"  {target:<32} {label:<24} {result['median_seconds'] * 1000:10.2f} ms")
+        return result
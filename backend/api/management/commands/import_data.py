@@ -1,85 +1,126 @@
-import pandas as pd
-import pytz
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.db import transaction
-from api.models import Game, StreamingPackage, StreamingOffer
+from api.models import DataImport, Game, StreamingPackage, StreamingOffer
+from api.utils.bulk_loader import (
+    DEFAULT_CHUNK_SIZE,
+    bulk_load_csv,
+    prepare_games,
+    prepare_offers,
+    prepare_packages,
+)
+from api.utils.coverage_index import import_source, reload_coverage_index
+from api.utils.coverage_snapshot import write_snapshot
+from api.utils.delta_import import diff_table
+from api.utils.result_cache import get_result_cache
+from api.utils.team_search import get_team_search_index
+from api.utils.team_tables import sync_team_tables
+
+# (label, model, csv setting, key columns, value columns, prepare)
+TABLES = [
+    ('games', Game, 'GAMES_CSV', ['id'], ['team_home', 'team_away', 'starts_at', 'tournament_name'], prepare_games),
+    ('packages', StreamingPackage, 'PACKAGES_CSV', ['id'],
+     ['name', 'monthly_price_cents', 'monthly_price_yearly_subscription_in_cents'], prepare_packages),
+    ('offers', StreamingOffer, 'OFFERS_CSV', ['game_id', 'streaming_package_id'], ['live', 'highlights'], prepare_offers),
+]
 
 class Command(BaseCommand):
     help = 'Import data from CSV files'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of CSV rows loaded per COPY / bulk_create batch',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only apply inserts, updates and deletes against the current tables instead of reloading them',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Starting data import...')
+        chunk_size = options['chunk_size']
 
         try:
-            # Wipe existing data in a single transaction
-            with transaction.atomic():
-                StreamingOffer.objects.all().delete()
-                Game.objects.all().delete()
-                StreamingPackage.objects.all().delete()
+            if options['incremental']:
+                data_import = self._import_incremental(chunk_size)
+            else:
+                data_import = self._import_full(chunk_size)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error during import: {str(e)}'))
+            raise
 
-            with transaction.atomic():
-                # ================================
-                # 1. IMPORT GAMES
-                # ================================
-                self.stdout.write('Importing games...')
-                games_df = pd.read_csv(settings.GAMES_CSV)
-                # Convert starts_at to UTC-aware
-                games_df['starts_at'] = pd.to_datetime(games_df['starts_at'], utc=True)
+        if data_import is None:
+            self.stdout.write(self.style.SUCCESS('Data is already up to date, nothing imported'))
+            return
 
-                games = [
-                    Game(
-                        id=row['id'],
-                        team_home=row['team_home'],
-                        team_away=row['team_away'],
-                        starts_at=row['starts_at'],
-                        tournament_name=row['tournament_name']
-                    )
-                    for _, row in games_df.iterrows()
-                ]
-                Game.objects.bulk_create(games)
-                self.stdout.write(self.style.SUCCESS(f'Successfully imported {len(games)} games'))
+        index = reload_coverage_index()
+        if settings.COVERAGE_SNAPSHOT_PATH:
+            size = write_snapshot(index, settings.COVERAGE_SNAPSHOT_PATH, import_source(index.version))
+            self.stdout.write(f'Wrote coverage snapshot ({size} bytes) to {settings.COVERAGE_SNAPSHOT_PATH}')
+        get_team_search_index()
+        get_result_cache().clear()
+        self.stdout.write(self.style.SUCCESS(f'Data import completed successfully (version {data_import.id})'))
 
-                # ================================
-                # 2. IMPORT PACKAGES
-                # ================================
-                self.stdout.write('Importing packages...')
-                packages_df = pd.read_csv(settings.PACKAGES_CSV)
+    def _import_full(self, chunk_size):
+        """Wipe and reload in a single transaction, so readers never see empty tables"""
+        with transaction.atomic():
+            deleted = StreamingOffer.objects.all().delete()[0]
+            deleted += Game.objects.all().delete()[0]
+            deleted += StreamingPackage.objects.all().delete()[0]
 
-                packages = [
-                    StreamingPackage(
-                        id=row['id'],
-                        name=row['name'],
-                        monthly_price_cents=int(row['monthly_price_cents']) if pd.notna(row['monthly_price_cents']) else None,
-                        monthly_price_yearly_subscription_in_cents=int(row['monthly_price_yearly_subscription_in_cents']) 
-                            if pd.notna(row['monthly_price_yearly_subscription_in_cents']) else None
-                    )
-                    for _, row in packages_df.iterrows()
-                ]
+            inserted = 0
+            for label, model, csv_setting, key_columns, value_columns, prepare in TABLES:
+                self.stdout.write(f'Importing {label}...')
+                rows, seconds = bulk_load_csv(
+                    model, getattr(settings, csv_setting), key_columns + value_columns, prepare, chunk_size
+                )
+                rate = rows / seconds if seconds > 0 else float('inf')
+                self.stdout.write(self.style.SUCCESS(
+                    f'Successfully imported {rows} {label} in {seconds:.2f}s ({rate:,.0f} rows/s)'
+                ))
+                inserted += rows
 
-                StreamingPackage.objects.bulk_create(packages)
-                self.stdout.write(self.style.SUCCESS(f'Successfully imported {len(packages)} packages'))
+            sync_team_tables()
 
-                # ================================
-                # 3. IMPORT OFFERS
-                # ================================
-                self.stdout.write('Importing offers...')
-                offers_df = pd.read_csv(settings.OFFERS_CSV)
-                offers = [
-                    StreamingOffer(
-                        game_id=row['game_id'],
-                        streaming_package_id=row['streaming_package_id'],
-                        live=bool(row['live']),
-                        highlights=bool(row['highlights'])
-                    )
-                    for _, row in offers_df.iterrows()
-                ]
-                
-                StreamingOffer.objects.bulk_create(offers)
-                self.stdout.write(self.style.SUCCESS(f'Successfully imported {len(offers)} offers'))
+            # Bump the data version so in-memory indexes pick up the new data
+            return DataImport.objects.create(
+                mode=DataImport.MODE_FULL,
+                rows_inserted=inserted,
+                rows_deleted=deleted,
+            )
 
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error during import: {str(e)}'))
-            raise
+    def _import_incremental(self, chunk_size):
+        """Diff every CSV against its table and apply only the changed rows"""
+        with transaction.atomic():
+            deltas = {}
+            for label, model, csv_setting, key_columns, value_columns, prepare in TABLES:
+                self.stdout.write(f'Comparing {label}...')
+                deltas[label] = diff_table(
+                    model, getattr(settings, csv_setting), key_columns, value_columns, prepare, chunk_size
+                )
+                self.stdout.write(f'  {label}: {deltas[label]}')
+
+            if not any(deltas.values()):
+                return None
+
+            # Parents first for inserts and updates, children first for deletes
+            deltas['games'].apply_upserts(chunk_size)
+            deltas['packages'].apply_upserts(chunk_size)
+            deltas['offers'].apply_deletes(chunk_size)
+            deltas['offers'].apply_upserts(chunk_size)
+            deltas['games'].apply_deletes(chunk_size)
+            deltas['packages'].apply_deletes(chunk_size)
+            sync_team_tables(
+                deltas['games'].inserts['id'].tolist() + deltas['games'].updates['id'].tolist()
+            )
 
-        self.stdout.write(self.style.SUCCESS('Data import completed successfully'))
+            return DataImport.objects.create(
+                mode=DataImport.MODE_INCREMENTAL,
+                rows_inserted=sum(len(delta.inserts) for delta in deltas.values()),
+                rows_updated=sum(len(delta.updates) for delta in deltas.values()),
+                rows_deleted=sum(len(delta.delete_pks) for delta in deltas.values()),
+            )
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_data_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataimport',
+            name='mode',
+            field=models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], default='full', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='dataimport',
+            name='rows_deleted',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dataimport',
+            name='rows_inserted',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dataimport',
+            name='rows_updated',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_teams(apps, schema_editor):
+    """Fill the team tables from already imported games"""
+    Game = apps.get_model('api', 'Game')
+    Team = apps.get_model('api', 'Team')
+    TeamGame = apps.get_model('api', 'TeamGame')
+
+    games = list(Game.objects.values_list('id', 'team_home', 'team_away'))
+    names = sorted({name for _, home, away in games for name in (home, away)})
+    Team.objects.bulk_create([Team(name=name) for name in names])
+    team_ids = dict(Team.objects.values_list('name', 'id'))
+
+    team_games = []
+    for game_id, home, away in games:
+        team_games.append(TeamGame(team_id=team_ids[home], game_id=game_id, is_home=True))
+        if away != home:
+            team_games.append(TeamGame(team_id=team_ids[away], game_id=game_id, is_home=False))
+    TeamGame.objects.bulk_create(team_games, batch_size=10000)
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    Trigram index for substring team search, PostgreSQL only.
+    Indexes the same expression `icontains` compiles to, UPPER(name::text).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX teams_name_trgm ON teams USING gin ((UPPER(name::text)) gin_trgm_ops)')
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS teams_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_data_import_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Team',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+            options={
+                'db_table': 'teams',
+            },
+        ),
+        migrations.CreateModel(
+            name='TeamGame',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_home', models.BooleanField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.game')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.team')),
+            ],
+            options={
+                'db_table': 'team_games',
+                'constraints': [models.UniqueConstraint(fields=('team', 'game'), name='team_games_team_game_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_teams, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
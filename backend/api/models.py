@@ -37,4 +37,54 @@ class StreamingOffer(models.Model):
         db_table = 'offers'
 
     def __str__(self):
-        return f"{self.streaming_package.name} - {self.game}"
\ No newline at end of file
+        return f"{self.streaming_package.name} - {self.game}"
+
+class DataImport(models.Model):
+    """One row per `import_data` run that changed data; the id doubles as the data version"""
+    MODE_FULL = 'full'
+    MODE_INCREMENTAL = 'incremental'
+    MODE_CHOICES = [
+        (MODE_FULL, 'Full'),
+        (MODE_INCREMENTAL, 'Incremental'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, default=MODE_FULL)
+    rows_inserted = models.IntegerField(default=0)
+    rows_updated = models.IntegerField(default=0)
+    rows_deleted = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'imports'
+
+    def __str__(self):
+        return f"Import {self.id} ({self.mode}, {self.created_at})"
+
+
+class Team(models.Model):
+    """Every team appearing in `games`, maintained by `import_data`"""
+    name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        db_table = 'teams'
+
+    def __str__(self):
+        return self.name
+
+
+class TeamGame(models.Model):
+    """Association of a team with each game it plays, home or away"""
+    team = models.ForeignKey(Team, on_delete=models.CASCADE)
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    is_home = models.BooleanField()
+
+    class Meta:
+        db_table = 'team_games'
+        constraints = [
+            # Also serves (team_id, game_id) index-only lookups of a team's games
+            models.UniqueConstraint(fields=['team', 'game'], name='team_games_team_game_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.team} - {self.game}"
@@ -1,3 +1,981 @@
-from django.test import TestCase
+import csv
+import functools
+import io
+import itertools
+import json
+import multiprocessing
+import operator
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from api.models import DataImport, Game, StreamingOffer, StreamingPackage, Team, TeamGame
+from api.utils import approx_cover, coverage_index, instrumentation, result_cache, set_cover_solver, solver_pool
+from api.utils.approx_cover import approximate_cover, lp_lower_bound
+from api.utils.coverage_index import CoverageIndex, get_coverage_index, import_source, parse_game_filter
+from api.utils.coverage_snapshot import load_snapshot
+from api.utils.ilp_cover import ILP, milp
+from api.utils.pareto import pareto_frontier
+from api.utils.problem_reduction import reduce_cover_problem
+from api.utils.result_cache import LocalResultCache, get_result_cache
+from api.utils.schedule_optimizer import calendar_months, cheapest_schedule
+from api.utils.set_cover_solver import _price_key, cheapest_covers, solve_cover_problem
+from api.utils.team_search import TeamSearchIndex
+
+GAMES_HEADER = ['id', 'team_home', 'team_away', 'starts_at', 'tournament_name']
+PACKAGES_HEADER = ['id', 'name', 'monthly_price_cents', 'monthly_price_yearly_subscription_in_cents']
+OFFERS_HEADER = ['game_id', 'streaming_package_id', 'live', 'highlights']
+
+# Bayern plays games 1, 2, 3 and 5, Arsenal only game 4
+GAMES = [
+    (1, 'Bayern', 'Dortmund', '2024-08-23 18:30:00', 'Bundesliga'),
+    (2, 'Leipzig', 'Bayern', '2024-08-31 15:30:00', 'Bundesliga'),
+    (3, 'Bayern', 'Leipzig', '2024-10-30 20:45:00', 'DFB Pokal'),
+    (4, 'Arsenal', 'Chelsea', '2024-09-01 17:30:00', 'Premier League'),
+    (5, 'Chelsea', 'Bayern', '2024-11-05 21:00:00', 'Champions League'),
+]
+PACKAGES = [
+    (1, 'Liga Pass', 1000, 800),
+    (2, 'Cup Pass', 500, 400),
+    (3, 'Europe Pass', 700, ''),
+    (4, 'Everything', 3000, 2500),
+    (5, 'Free TV', 0, 0),
+    (6, 'Highlights Club', 200, 100),
+]
+OFFERS = [
+    (1, 1, 1, 1), (2, 1, 1, 1),
+    (3, 2, 1, 0),
+    (5, 3, 1, 1),
+    (1, 4, 1, 1), (2, 4, 1, 1), (3, 4, 1, 1), (4, 4, 1, 1), (5, 4, 1, 1),
+    (4, 5, 1, 0),
+    (1, 6, 0, 1), (2, 6, 0, 1), (3, 6, 0, 1), (5, 6, 0, 1),
+]
+
+
+def write_dataset(directory, games=GAMES, packages=PACKAGES, offers=OFFERS):
+    """Write the CSVs `import_data` reads, returns the settings pointing at them"""
+    paths = {
+        'GAMES_CSV': Path(directory) / 'games.csv',
+        'PACKAGES_CSV': Path(directory) / 'packages.csv',
+        'OFFERS_CSV': Path(directory) / 'offers.csv',
+    }
+    for setting, header, rows in (
+        ('GAMES_CSV', GAMES_HEADER, games),
+        ('PACKAGES_CSV', PACKAGES_HEADER, packages),
+        ('OFFERS_CSV', OFFERS_HEADER, offers),
+    ):
+        with open(paths[setting], 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    return paths
+
+
+def import_dataset(directory, incremental=False, snapshot_path='', chunk_size=1000, **rows):
+    with override_settings(**write_dataset(directory, **rows), COVERAGE_SNAPSHOT_PATH=snapshot_path):
+        call_command('import_data', incremental=incremental, chunk_size=chunk_size, stdout=io.StringIO())
+
+
+def exhaustive_covers(masks, prices, target, max_size, top_k):
+    """Every combo of at most `max_size` packages covering `target`, ranked like the solver"""
+    keys = []
+    for size in range(1, max_size + 1):
+        for combo in itertools.combinations(range(len(masks)), size):
+            covered = 0
+            for i in combo:
+                covered |= masks[i]
+            if not target & ~covered:
+                price_keys = [_price_key(prices[i]) for i in combo]
+                keys.append((max(flag for flag, _ in price_keys), sum(price for _, price in price_keys), size, combo))
+    return [key[3] for key in sorted(keys)[:top_k]]
+
+
+def random_problem(rng, max_packages=10, max_games=12):
+    n = rng.randint(1, max_packages)
+    games = rng.randint(1, max_games)
+    masks = [rng.getrandbits(games) for _ in range(n)]
+    prices = [rng.choice([None, 0] + [rng.randint(1, 9) for _ in range(6)]) for _ in range(n)]
+    target = rng.getrandbits(games) | 1
+    return masks, prices, target, rng.randint(1, n), rng.randint(1, 6)
+
+
+def split_problem(rng):
+    """A problem of up to four blocks of packages sharing no games, plus packages covering none"""
+    masks, prices, target, shift = [], [], 0, 0
+    for _ in range(rng.randint(2, 4)):
+        games = rng.randint(1, 5)
+        for _ in range(rng.randint(1, 4)):
+            masks.append((rng.getrandbits(games) or 1) << shift)
+            prices.append(rng.choice([None, 0] + [rng.randint(1, 9) for _ in range(6)]))
+        target |= ((1 << games) - 1) << shift
+        shift += games
+    for _ in range(rng.choice([0, 0, 1, 2])):
+        masks.append(0)
+        prices.append(rng.choice([None, 0, 1, 5]))
+    order = list(range(len(masks)))
+    rng.shuffle(order)
+    return [masks[i] for i in order], [prices[i] for i in order], target, rng.randint(1, len(masks)), rng.randint(1, 6)
+
+
+class CheapestCoversTests(SimpleTestCase):
+    def test_matches_exhaustive_search(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            masks, prices, target, max_size, top_k = random_problem(rng)
+            with self.subTest(masks=masks, prices=prices, target=target, max_size=max_size, top_k=top_k):
+                result = cheapest_covers(masks, prices, target, max_size, top_k)
+                self.assertTrue(result.complete)
+                self.assertEqual(result.combos, exhaustive_covers(masks, prices, target, max_size, top_k))
+
+    def test_time_budget_marks_result_partial(self):
+        rng = random.Random(2)
+        masks = [rng.getrandbits(200) & rng.getrandbits(200) for _ in range(40)]
+        prices = [rng.randint(100, 5000) for _ in masks]
+        result = cheapest_covers(masks, prices, (1 << 200) - 1, 10, 3, time_budget=0)
+        self.assertFalse(result.complete)
+
+    def test_decomposed_search_matches_exhaustive_search(self):
+        rng = random.Random(3)
+        with mock.patch.object(
+            set_cover_solver, '_decomposed_search', wraps=set_cover_solver._decomposed_search
+        ) as decomposed:
+            for _ in range(200):
+                masks, prices, target, max_size, top_k = split_problem(rng)
+                with self.subTest(masks=masks, prices=prices, target=target, max_size=max_size, top_k=top_k):
+                    result = cheapest_covers(masks, prices, target, max_size, top_k)
+                    self.assertEqual(result.combos, exhaustive_covers(masks, prices, target, max_size, top_k))
+        self.assertGreater(decomposed.call_count, 25)
+
+    def test_connected_components(self):
+        components, idle = set_cover_solver._connected_components([0b0011, 0b0100, 0, 0b0110, 0b1000])
+        self.assertEqual(sorted(sorted(positions) for _, positions in components), [[0, 1, 3], [4]])
+        self.assertEqual(sorted(games for games, _ in components), [0b0111, 0b1000])
+        self.assertEqual(idle, [2])
+
+    @skipIf(milp is None, 'scipy is not installed')
+    def test_ilp_backend_matches_exhaustive_search(self):
+        rng = random.Random(4)
+        used = 0
+        # Hand every search that branch and bound does not finish at once to the ILP
+        with mock.patch.object(set_cover_solver, 'ILP_WARM_UP_NODES', 1), \
+                mock.patch.object(set_cover_solver, 'BUDGET_CHECK_INTERVAL', 1):
+            for _ in range(150):
+                masks, prices, target, max_size, top_k = random_problem(rng)
+                with self.subTest(masks=masks, prices=prices, target=target, max_size=max_size, top_k=top_k):
+                    result = cheapest_covers(masks, prices, target, max_size, top_k, backend=ILP)
+                    self.assertTrue(result.complete)
+                    self.assertEqual(result.combos, exhaustive_covers(masks, prices, target, max_size, top_k))
+                    used += result.backend == ILP
+        self.assertGreater(used, 50)
+
+
+def exhaustive_schedule_price(month_targets, masks, monthly_prices, yearly_prices, max_size):
+    """Price of the cheapest of every split of the months into monthly and yearly segments"""
+    def bundle_price(prices, target):
+        if not target:
+            return 0
+        available = [i for i, price in enumerate(prices) if price is not None]
+        combos = exhaustive_covers([masks[i] for i in available], [prices[i] for i in available], target, max_size, 1)
+        return sum(prices[available[i]] for i in combos[0]) if combos else None
+
+    def plans(start):
+        if start == len(month_targets):
+            yield 0
+            return
+        segments = [bundle_price(monthly_prices, month_targets[start])]
+        for length in range(1, min(12, len(month_targets) - start) + 1):
+            target = 0
+            for month_target in month_targets[start:start + length]:
+                target |= month_target
+            price = bundle_price(yearly_prices, target)
+            segments.append(None if price is None else (12 * price, length))
+        for position, segment in enumerate(segments):
+            if segment is None:
+                continue
+            price, length = (segment, 1) if position == 0 else segment
+            for rest in plans(start + length):
+                yield price + rest
+
+    return min(plans(0), default=None)
+
+
+class CheapestScheduleTests(SimpleTestCase):
+    def test_calendar_months(self):
+        self.assertEqual(calendar_months('2024-11', '2025-02'), ['2024-11', '2024-12', '2025-01', '2025-02'])
+        self.assertEqual(calendar_months('2024-05', '2024-05'), ['2024-05'])
+
+    def test_matches_exhaustive_search(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            n = rng.randint(1, 6)
+            games = rng.randint(1, 10)
+            masks = [rng.getrandbits(games) for _ in range(n)]
+            monthly_prices = [rng.choice([None, 0] + [rng.randint(1, 60) for _ in range(6)]) for _ in range(n)]
+            yearly_prices = [rng.choice([None] + [rng.randint(1, 50) for _ in range(6)]) for _ in range(n)]
+            month_targets = [rng.getrandbits(games) & rng.getrandbits(games) for _ in range(rng.randint(1, 7))]
+            months = [f'2024-{month:02d}' for month in range(1, len(month_targets) + 1)]
+            max_size = rng.randint(1, n)
+            with self.subTest(
+                masks=masks, monthly_prices=monthly_prices, yearly_prices=yearly_prices,
+                month_targets=month_targets, max_size=max_size,
+            ):
+                schedule = cheapest_schedule(
+                    months, month_targets, list(range(n)), masks, monthly_prices, yearly_prices, max_size
+                )
+                self.assertTrue(schedule['complete'])
+                self.assertEqual(
+                    schedule['total_price'],
+                    exhaustive_schedule_price(month_targets, masks, monthly_prices, yearly_prices, max_size),
+                )
+                if schedule['total_price'] is None:
+                    self.assertTrue(schedule['uncoverable_months'])
+                    continue
+                # The plan adds up to the total and covers every month with games
+                self.assertEqual(sum(segment['price'] for segment in schedule['plan']), schedule['total_price'])
+                covered = dict.fromkeys(months, 0)
+                for segment in schedule['plan']:
+                    self.assertLessEqual(len(segment['package_ids']), max_size)
+                    for month in calendar_months(segment['from'], segment['to']):
+                        for package_id in segment['package_ids']:
+                            covered[month] |= masks[package_id]
+                for month, target in zip(months, month_targets):
+                    self.assertFalse(target & ~covered[month], month)
+
+
+class GameFilterTests(SimpleTestCase):
+    def test_now_is_rounded_to_the_minute(self):
+        keys = []
+        for moment in ('2024-09-01T17:30:05+00:00', '2024-09-01T17:30:59.999+00:00'):
+            with mock.patch('django.utils.timezone.now', return_value=datetime.fromisoformat(moment)):
+                keys.append(parse_game_filter({'from': 'now'}).cache_key())
+        self.assertEqual(keys[0], keys[1])
+        self.assertEqual(keys[0], (None, '2024-09-01T17:30:00+00:00', None))
+
+    def test_dates_cover_whole_days(self):
+        game_filter = parse_game_filter({'from': '2024-09-01', 'to': '2024-09-01', 'tournaments': ['B', 'A', 'B']})
+        self.assertEqual(game_filter.tournaments, ('A', 'B'))
+        self.assertEqual((game_filter.end - game_filter.start).days, 0)
+        self.assertEqual(game_filter.start.hour, 0)
+        self.assertEqual(game_filter.end.hour, 23)
+        self.assertFalse(parse_game_filter({}))
+        for data in ({'from': 'soon'}, {'to': 5}, {'tournaments': 'Bundesliga'}):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    parse_game_filter(data)
+
+
+class ApproximateCoverTests(SimpleTestCase):
+    def problems(self, seed, count=300):
+        rng = random.Random(seed)
+        for _ in range(count):
+            n = rng.randint(1, 8)
+            games = rng.randint(1, 12)
+            masks = [rng.getrandbits(games) for _ in range(n)]
+            prices = [rng.choice([0] + [rng.randint(1, 60) for _ in range(6)]) for _ in range(n)]
+            target = rng.getrandbits(games) | 1
+            reachable = target & functools.reduce(operator.or_, masks, 0)
+            optimum = None
+            if reachable:
+                combo = exhaustive_covers(masks, prices, reachable, n, 1)[0]
+                optimum = sum(prices[i] for i in combo)
+            yield masks, prices, target, reachable, optimum
+
+    def test_bounded_by_exhaustive_search(self):
+        for masks, prices, target, reachable, optimum in self.problems(8):
+            with self.subTest(masks=masks, prices=prices, target=target):
+                result = approximate_cover(masks, prices, target)
+                covered = functools.reduce(operator.or_, (masks[i] for i in result['packages']), 0)
+                self.assertEqual(covered & target, reachable)
+                if not reachable:
+                    continue
+                self.assertEqual(result['price'], sum(prices[i] for i in result['packages']))
+                self.assertGreaterEqual(result['price'], optimum)
+                self.assertLessEqual(result['lower_bound'], optimum)
+                if optimum:
+                    # At least how far the cover really is from the optimum
+                    self.assertGreaterEqual(result['ratio'] + 1e-9, result['price'] / optimum)
+
+    def test_dual_ascent_bound(self):
+        # The bound without scipy is weaker, but still at most the optimum
+        with mock.patch.object(approx_cover, 'linprog', None):
+            for masks, prices, target, reachable, optimum in self.problems(9):
+                with self.subTest(masks=masks, prices=prices, target=target):
+                    bound = lp_lower_bound(masks, prices, reachable)
+                    self.assertLessEqual(bound, (optimum or 0) + 1e-6)
+                    self.assertGreaterEqual(bound, 0)
+
+
+def exhaustive_frontier(masks, prices, target):
+    """(price, covered games) of the cheapest combo per coverage level where paying more covers more"""
+    priced = [i for i, price in enumerate(prices) if price is not None]
+    combos = []
+    for size in range(len(priced) + 1):
+        for combo in itertools.combinations(priced, size):
+            covered = functools.reduce(operator.or_, (masks[i] for i in combo), 0) & target
+            combos.append((sum(prices[i] for i in combo), -covered.bit_count()))
+    frontier = []
+    for price, value in sorted(combos):
+        if -value > (frontier[-1][1] if frontier else 0):
+            frontier.append((price, -value))
+    return frontier
+
+
+class ParetoFrontierTests(SimpleTestCase):
+    def test_matches_exhaustive_search(self):
+        rng = random.Random(10)
+        for _ in range(200):
+            n = rng.randint(1, 8)
+            games = rng.randint(1, 10)
+            masks = [rng.getrandbits(games) for _ in range(n)]
+            prices = [rng.choice([None, 0] + [rng.randint(1, 60) for _ in range(6)]) for _ in range(n)]
+            target = rng.getrandbits(games) | 1
+            with self.subTest(masks=masks, prices=prices, target=target):
+                points = pareto_frontier(masks, prices, target, max_points=100, beam_width=1 << games)
+                self.assertEqual(
+                    [(point['price'], point['value']) for point in points], exhaustive_frontier(masks, prices, target)
+                )
+                for point in points:
+                    covered = functools.reduce(operator.or_, (masks[i] for i in point['packages']), 0)
+                    self.assertEqual((covered & target).bit_count(), point['value'])
+                    self.assertEqual(sum(prices[i] for i in point['packages']), point['price'])
+
+    def test_max_points_keeps_both_ends(self):
+        masks = [1 << i for i in range(8)]
+        prices = list(range(1, 9))
+        points = pareto_frontier(masks, prices, (1 << 8) - 1, max_points=3)
+        self.assertEqual([point['value'] for point in points], [1, 4, 8])
+        self.assertEqual(points[0]['price'], 1)
+        self.assertEqual(points[-1]['price'], sum(prices))
+
+
+class ReduceCoverProblemTests(SimpleTestCase):
+    def test_keeps_the_ranking_of_the_top_covers(self):
+        rng = random.Random(6)
+        stats = {'forced': 0, 'dominated': 0, 'equivalent': 0}
+        for _ in range(500):
+            n = rng.randint(1, 9)
+            games = rng.randint(1, 10)
+            # Masks drawn from a few shared ones, so packages dominate each other often
+            base = [rng.getrandbits(games) for _ in range(3)]
+            masks = [
+                rng.choice(base + [rng.getrandbits(games)]) & rng.getrandbits(games)
+                | rng.choice([0, rng.getrandbits(games)])
+                for _ in range(n)
+            ]
+            monthly = [rng.choice([None] + [rng.randint(1, 9) for _ in range(5)]) for _ in range(n)]
+            yearly = [rng.choice([0] + [rng.randint(1, 9) for _ in range(5)]) for _ in range(n)]
+            target = rng.getrandbits(games) | 1
+            max_size = rng.randint(1, n)
+            top_k = rng.randint(1, 5)
+
+            reduced = reduce_cover_problem(masks, monthly, yearly, target, max_size, top_k)
+            for outcome in stats:
+                stats[outcome] += reduced.stats[outcome]
+            solution = solve_cover_problem(
+                [masks[i] for i in reduced.kept], reduced.monthly_prices, reduced.yearly_prices,
+                reduced.target, min(reduced.max_size, len(reduced.kept)), top_k,
+            )
+            for name, prices in (('monthly', monthly), ('yearly', yearly)):
+                def ranking(combos):
+                    return [
+                        (
+                            any(prices[i] is None for i in combo),
+                            sum(prices[i] or 0 for i in combo),
+                            len(combo),
+                        )
+                        for combo in combos
+                    ]
+
+                found = [reduced.forced + [reduced.kept[i] for i in combo] for combo in solution[name]]
+                with self.subTest(masks=masks, monthly=monthly, yearly=yearly, target=target, max_size=max_size,
+                                  top_k=top_k, prices=name):
+                    self.assertEqual(
+                        ranking(found), ranking(exhaustive_covers(masks, prices, target, max_size, top_k))
+                    )
+        # Every reduction kicked in somewhere
+        self.assertTrue(all(stats.values()), stats)
+
+
+class PartitionedSearchTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.executor = ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('spawn'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+        super().tearDownClass()
+
+    def test_matches_exhaustive_search(self):
+        rng = random.Random(5)
+        # Split every search that does not finish at once into subtrees
+        with mock.patch.object(set_cover_solver, 'WARM_UP_NODES', 1), \
+                mock.patch.object(set_cover_solver, 'BUDGET_CHECK_INTERVAL', 1), \
+                mock.patch.object(self.executor, 'submit', wraps=self.executor.submit) as submit:
+            for _ in range(40):
+                masks, prices, target, max_size, top_k = random_problem(rng, max_packages=12)
+                with self.subTest(masks=masks, prices=prices, target=target, max_size=max_size, top_k=top_k):
+                    result = cheapest_covers(
+                        masks, prices, target, max_size, top_k, executor=self.executor, workers=rng.choice([2, 4])
+                    )
+                    self.assertTrue(result.complete)
+                    self.assertEqual(result.combos, exhaustive_covers(masks, prices, target, max_size, top_k))
+        self.assertGreater(submit.call_count, 0)
+
+
+class ImportedDataTestCase(TestCase):
+    """Imports the dataset above through `import_data`"""
+
+    @classmethod
+    def setUpTestData(cls):
+        with tempfile.TemporaryDirectory() as directory:
+            import_dataset(directory)
+        get_result_cache().clear()
+
+    def combination_prices(self, response, ordered='monthly_ordered'):
+        self.assertEqual(response.status_code, 200)
+        price = 'total_monthly_price' if ordered == 'monthly_ordered' else 'total_yearly_by_monthly'
+        return [combo[price] for combo in response.json()[ordered]]
+
+
+class PackageCombinationViewTests(ImportedDataTestCase):
+    url = '/api/packages/combinations/'
+
+    def test_cheapest_combinations_include_supersets(self):
+        response = self.client.post(self.url, {'teams': ['Bayern']}, content_type='application/json')
+        self.assertEqual(self.combination_prices(response), [200, 700, 900])
+        self.assertEqual(self.combination_prices(response, 'yearly_ordered'), [100, 100, 500])
+        first = response.json()['monthly_ordered'][0]
+        self.assertEqual([package['name'] for package in first['packages']], ['Highlights Club'])
+        self.assertEqual(first['coverage'], 100.0)
+
+    def test_live_coverage_by_monthly_and_yearly_price(self):
+        response = self.client.post(
+            self.url, {'teams': ['Bayern'], 'coverage_mode': 'live'}, content_type='application/json'
+        )
+        self.assertEqual(self.combination_prices(response), [2200, 3000, 3500])
+        self.assertEqual(self.combination_prices(response, 'yearly_ordered'), [1200, 2500, 2500])
+
+    def test_max_size_and_excluded_packages(self):
+        response = self.client.post(
+            self.url, {'teams': ['Bayern'], 'max_size': 1}, content_type='application/json'
+        )
+        self.assertEqual(self.combination_prices(response), [200, 3000])
+        response = self.client.post(
+            self.url, {'teams': ['Bayern'], 'packages_to_exclude': [6]}, content_type='application/json'
+        )
+        self.assertEqual(self.combination_prices(response), [2200, 3000, 3500])
+        response = self.client.post(
+            self.url, {'teams': ['Bayern'], 'packages_to_exclude': [4, 6]}, content_type='application/json'
+        )
+        self.assertEqual(self.combination_prices(response), [2200])
+
+    def test_free_packages_covering_everything(self):
+        response = self.client.post(self.url, {'teams': ['Arsenal']}, content_type='application/json')
+        self.assertEqual(self.combination_prices(response), [0])
+        self.assertEqual(response.json()['monthly_ordered'][0]['packages'][0]['name'], 'Free TV')
+
+    def test_game_filter(self):
+        response = self.client.post(
+            self.url, {'teams': ['Bayern'], 'coverage_mode': 'live', 'tournaments': ['Bundesliga']},
+            content_type='application/json',
+        )
+        self.assertEqual(self.combination_prices(response), [1000, 3000, 4000])
+        # Games 3 and 5
+        response = self.client.post(
+            self.url, {'teams': ['Bayern'], 'coverage_mode': 'live', 'from': '2024-10-01', 'to': '2024-11-30'},
+            content_type='application/json',
+        )
+        self.assertEqual(self.combination_prices(response), [1200, 3000, 3500])
+        response = self.client.post(
+            self.url, {'teams': ['Bayern'], 'from': 'soon'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_top_k(self):
+        response = self.client.post(self.url, {'teams': ['Bayern'], 'top_k': 1}, content_type='application/json')
+        self.assertEqual(self.combination_prices(response), [200])
+        response = self.client.post(self.url, {'teams': ['Bayern'], 'top_k': 6}, content_type='application/json')
+        prices = self.combination_prices(response)
+        self.assertEqual(len(prices), 6)
+        self.assertEqual(prices[:3], [200, 700, 900])
+        self.assertEqual(prices, sorted(prices))
+
+    def test_no_teams(self):
+        response = self.client.post(self.url, {'teams': []}, content_type='application/json')
+        self.assertEqual(response.json(), {'monthly_ordered': [], 'yearly_ordered': []})
+
+    def test_unknown_coverage_mode(self):
+        # The weighted mode only has a score, no exact cover
+        for mode in ('weighted', 'any'):
+            with self.subTest(mode=mode):
+                response = self.client.post(
+                    self.url, {'teams': ['Bayern'], 'coverage_mode': mode}, content_type='application/json'
+                )
+                self.assertEqual(response.status_code, 400)
+
+
+class CoverageIndexTests(ImportedDataTestCase):
+    def test_matches_the_database(self):
+        index = get_coverage_index()
+        self.assertEqual(index.version, DataImport.objects.latest('id').id)
+        self.assertEqual(index.game_ids, [1, 2, 4, 3, 5])
+        for package_id in index.package_ids:
+            games = {
+                index.game_ids[position]
+                for position in range(len(index.game_ids)) if index.package_games[package_id] >> position & 1
+            }
+            offers = StreamingOffer.objects.filter(streaming_package_id=package_id)
+            self.assertEqual(games, set(offers.values_list('game_id', flat=True)))
+        self.assertEqual(index.games_for_teams(['Bayern']).bit_count(), 4)
+        self.assertEqual(index.packages_covering(index.games_for_teams(['Arsenal']), exclude=[4]), [5])
+        self.assertEqual(index.packages_covering_all(['Bayern']), [4, 6])
+
+    def test_rebuilt_after_an_import(self):
+        index = get_coverage_index()
+        with tempfile.TemporaryDirectory() as directory:
+            import_dataset(directory, packages=[(1, 'Liga Pass', 900, 800)] + PACKAGES[1:])
+        rebuilt = get_coverage_index()
+        self.assertGreater(rebuilt.version, index.version)
+        self.assertEqual(rebuilt.packages[1].monthly_price_cents, 900)
+
+
+class PackagesByTeamsSoftViewTests(ImportedDataTestCase):
+    url = '/api/packages/by-teams-soft/'
+
+    def coverage(self, body):
+        response = self.client.post(self.url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        coverage = {entry['package']['id']: entry['coverage'] for entry in response.json()}
+        # Highest coverage first
+        self.assertEqual(list(coverage.values()), sorted(coverage.values(), reverse=True))
+        return coverage
+
+    def test_coverage_per_package(self):
+        self.assertEqual(
+            self.coverage({'teams': ['Bayern']}), {1: 0.5, 2: 0.25, 3: 0.25, 4: 1.0, 5: 0.0, 6: 1.0}
+        )
+        self.assertEqual(
+            self.coverage({'teams': ['Bayern', 'Arsenal']}), {1: 0.4, 2: 0.2, 3: 0.2, 4: 1.0, 5: 0.2, 6: 0.8}
+        )
+
+    def test_coverage_modes(self):
+        for mode, expected in (
+            ('live', {1: 0.5, 2: 0.25, 3: 0.25, 4: 1.0, 5: 0.0, 6: 0.0}),
+            ('highlights', {1: 0.5, 2: 0.0, 3: 0.25, 4: 1.0, 5: 0.0, 6: 1.0}),
+            ('either', {1: 0.5, 2: 0.25, 3: 0.25, 4: 1.0, 5: 0.0, 6: 1.0}),
+            ('weighted', {1: 0.5, 2: 0.25, 3: 0.25, 4: 1.0, 5: 0.0, 6: 0.5}),
+        ):
+            with self.subTest(mode=mode):
+                self.assertEqual(self.coverage({'teams': ['Bayern'], 'coverage_mode': mode}), expected)
+        response = self.client.post(
+            self.url, {'teams': ['Bayern'], 'coverage_mode': 'any'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class PackagesByTeamsViewTests(ImportedDataTestCase):
+    url = '/api/packages/by-teams/'
+
+    def package_ids(self, body):
+        response = self.client.post(self.url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return sorted(package['id'] for package in response.json())
+
+    def test_packages_offering_every_game(self):
+        self.assertEqual(self.package_ids({'teams': ['Bayern']}), [4, 6])
+        self.assertEqual(self.package_ids({'teams': ['Bayern', 'Arsenal']}), [4])
+        self.assertEqual(self.package_ids({'teams': ['Bayern'], 'tournaments': ['Bundesliga']}), [1, 4, 6])
+
+    def test_no_matching_games(self):
+        # Every package offers all of no games
+        everything = [package[0] for package in PACKAGES]
+        self.assertEqual(self.package_ids({'teams': []}), everything)
+        self.assertEqual(self.package_ids({'teams': ['Nobody']}), everything)
+        self.assertEqual(self.package_ids({'teams': ['Arsenal'], 'tournaments': ['Bundesliga']}), everything)
+
+
+class ResultCacheTests(ImportedDataTestCase):
+    url = '/api/packages/combinations/'
+
+    def setUp(self):
+        # A fresh cache: versions repeat between test cases, as their imports are rolled back
+        patcher = mock.patch.object(result_cache, '_result_cache', LocalResultCache(max_entries=100, ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_repeated_selection_is_a_hit(self):
+        cache = get_result_cache()
+        first = self.client.post(self.url, {'teams': ['Bayern', 'Arsenal']}, content_type='application/json')
+        hits = cache.stats()['hits']
+        # Team order and duplicates do not matter
+        second = self.client.post(
+            self.url, {'teams': ['Arsenal', 'Bayern', 'Arsenal']}, content_type='application/json'
+        )
+        self.assertEqual(cache.stats()['hits'], hits + 1)
+        self.assertEqual(second.json(), first.json())
+
+        self.client.post(self.url, {'teams': ['Bayern'], 'max_size': 2}, content_type='application/json')
+        self.assertEqual(cache.stats()['hits'], hits + 1)
+
+    def test_import_invalidates_results(self):
+        response = self.client.post(self.url, {'teams': ['Bayern']}, content_type='application/json')
+        self.assertEqual(self.combination_prices(response), [200, 700, 900])
+        with tempfile.TemporaryDirectory() as directory:
+            import_dataset(directory, packages=PACKAGES[:5] + [(6, 'Highlights Club', 2900, 100)])
+        response = self.client.post(self.url, {'teams': ['Bayern']}, content_type='application/json')
+        self.assertEqual(self.combination_prices(response), [2200, 2900, 3000])
+
+    def test_invalid_selection(self):
+        for body in (
+            {'teams': [1, 'Bayern']},
+            {'teams': 'Bayern'},
+            {'teams': ['Bayern'], 'packages_to_exclude': ['x']},
+            {'teams': ['Bayern'], 'packages_to_exclude': [[1]]},
+        ):
+            with self.subTest(body=body):
+                for url in (self.url, '/api/packages/combinations-backup/'):
+                    response = self.client.post(url, body, content_type='application/json')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('error', response.json())
+
+    def test_package_ids_as_strings(self):
+        response = self.client.post(
+            self.url, {'teams': ['Bayern'], 'packages_to_exclude': ['4', 6]}, content_type='application/json'
+        )
+        self.assertEqual(self.combination_prices(response), [2200])
+
+
+class ImportDataTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_full_import(self):
+        import_dataset(self.directory)
+
+        self.assertEqual(Game.objects.count(), len(GAMES))
+        self.assertEqual(StreamingPackage.objects.count(), len(PACKAGES))
+        self.assertEqual(StreamingOffer.objects.count(), len(OFFERS))
+        self.assertIsNone(StreamingPackage.objects.get(id=3).monthly_price_yearly_subscription_in_cents)
+        self.assertEqual(Game.objects.get(id=4).tournament_name, 'Premier League')
+        self.assertFalse(StreamingOffer.objects.get(game_id=1, streaming_package_id=6).live)
+        data_import = DataImport.objects.get()
+        self.assertEqual(data_import.mode, DataImport.MODE_FULL)
+        self.assertEqual(data_import.rows_inserted, len(GAMES) + len(PACKAGES) + len(OFFERS))
+
+        index = get_coverage_index()
+        self.assertEqual(index.version, data_import.id)
+        self.assertEqual(index.offer_count, len(OFFERS))
+
+    def test_snapshot(self):
+        snapshot_path = self.directory / 'coverage.snapshot'
+        import_dataset(self.directory, snapshot_path=snapshot_path)
+        data_import = DataImport.objects.get()
+        index = get_coverage_index()
+
+        snapshot = load_snapshot(snapshot_path)
+        self.assertEqual(snapshot.version, data_import.id)
+        self.assertEqual(snapshot.source, import_source(data_import.id))
+        loaded = CoverageIndex.from_snapshot(snapshot)
+        self.assertEqual(loaded.mode_package_games, index.mode_package_games)
+        self.assertEqual(loaded.team_games, index.team_games)
+        self.assertEqual(loaded.package_data, index.package_data)
+
+        # Workers load the snapshot of the current import instead of querying the data
+        with override_settings(COVERAGE_SNAPSHOT_PATH=str(snapshot_path)), \
+                mock.patch.object(CoverageIndex, 'build', side_effect=AssertionError('built from the database')):
+            self.assertEqual(coverage_index._build_current_index().mode_package_games, index.mode_package_games)
+        # but not after another import that did not write it
+        import_dataset(self.directory)
+        with override_settings(COVERAGE_SNAPSHOT_PATH=str(snapshot_path)), \
+                mock.patch.object(CoverageIndex, 'build', wraps=CoverageIndex.build) as build:
+            coverage_index._build_current_index()
+        build.assert_called_once()
+
+    def test_full_import_replaces_the_data(self):
+        import_dataset(self.directory)
+        import_dataset(self.directory, games=GAMES[:3], offers=[offer for offer in OFFERS if offer[0] <= 3])
+        self.assertEqual(Game.objects.count(), 3)
+        self.assertEqual(StreamingOffer.objects.count(), 9)
+        self.assertEqual(DataImport.objects.count(), 2)
+        self.assertEqual(get_coverage_index().offer_count, 9)
+
+    def test_incremental_import(self):
+        import_dataset(self.directory)
+        games = GAMES + [(6, 'Juventus', 'Bayern', '2024-12-10 21:00:00', 'Champions League')]
+        packages = [(1, 'Liga Pass', 1200, 800)] + PACKAGES[1:]
+        offers = [offer for offer in OFFERS if offer != (3, 2, 1, 0)] + [(6, 3, 1, 1)]
+        import_dataset(self.directory, incremental=True, games=games, packages=packages, offers=offers)
+
+        data_import = DataImport.objects.latest('id')
+        self.assertEqual(data_import.mode, DataImport.MODE_INCREMENTAL)
+        self.assertEqual(
+            (data_import.rows_inserted, data_import.rows_updated, data_import.rows_deleted), (2, 1, 1)
+        )
+        self.assertEqual(StreamingPackage.objects.get(id=1).monthly_price_cents, 1200)
+        self.assertFalse(StreamingOffer.objects.filter(game_id=3, streaming_package_id=2).exists())
+
+        index = get_coverage_index()
+        self.assertEqual(index.version, data_import.id)
+        self.assertEqual(index.offer_count, len(offers))
+        self.assertEqual(index.games_for_teams(['Juventus']).bit_count(), 1)
+
+        # Nothing changed, nothing to import
+        import_dataset(self.directory, incremental=True, games=games, packages=packages, offers=offers)
+        self.assertEqual(DataImport.objects.latest('id'), data_import)
+
+    def test_incremental_import_of_repeated_keys(self):
+        import_dataset(self.directory)
+        # Repeated across chunks of two rows: the last row of a key wins
+        packages = PACKAGES + [(7, 'New Pass', 100, 100), (1, 'Liga Pass', 1100, 800), (7, 'New Pass', 150, 100)]
+        offers = OFFERS + [(4, 6, 0, 1), (1, 1, 0, 1), (1, 1, 1, 1), (4, 6, 1, 1)]
+        import_dataset(self.directory, incremental=True, chunk_size=2, packages=packages, offers=offers)
+
+        self.assertEqual(StreamingPackage.objects.count(), 7)
+        self.assertEqual(StreamingPackage.objects.get(id=7).monthly_price_cents, 150)
+        self.assertEqual(StreamingPackage.objects.get(id=1).monthly_price_cents, 1100)
+        self.assertEqual(StreamingOffer.objects.count(), len(OFFERS) + 1)
+        self.assertTrue(StreamingOffer.objects.get(game_id=1, streaming_package_id=1).live)
+        self.assertTrue(StreamingOffer.objects.get(game_id=4, streaming_package_id=6).live)
+
+    def team_games(self):
+        return sorted(TeamGame.objects.values_list('team__name', 'game_id', 'is_home'))
+
+    def test_team_tables(self):
+        import_dataset(self.directory)
+        self.assertEqual(
+            sorted(Team.objects.values_list('name', flat=True)),
+            ['Arsenal', 'Bayern', 'Chelsea', 'Dortmund', 'Leipzig'],
+        )
+        expected = sorted(
+            [(home, game_id, True) for game_id, home, _, _, _ in GAMES]
+            + [(away, game_id, False) for game_id, _, away, _, _ in GAMES]
+        )
+        self.assertEqual(self.team_games(), expected)
+
+        # Dortmund's only game becomes Juventus' and a new Bayern game is added
+        games = [(1, 'Bayern', 'Juventus', '2024-08-23 18:30:00', 'Bundesliga')] + GAMES[1:]
+        games.append((6, 'Bayern', 'Arsenal', '2024-12-10 21:00:00', 'Champions League'))
+        import_dataset(self.directory, incremental=True, games=games)
+        self.assertFalse(Team.objects.filter(name='Dortmund').exists())
+        self.assertEqual(
+            sorted(TeamGame.objects.filter(game_id__in=[1, 6]).values_list('team__name', 'game_id')),
+            [('Arsenal', 6), ('Bayern', 1), ('Bayern', 6), ('Juventus', 1)],
+        )
+        self.assertEqual(TeamGame.objects.count(), 2 * len(games))
+
+
+class TeamSearchIndexTests(SimpleTestCase):
+    names = ['FC Bayern München', 'Bayer Leverkusen', 'Bayern II', 'Borussia Dortmund', 'Union Berlin', '1. FC Union Berlin']
+
+    def setUp(self):
+        self.index = TeamSearchIndex(1, self.names)
+
+    def test_ranking(self):
+        self.assertEqual(self.index.search('BAYERN'), ['Bayern II', 'FC Bayern München'])
+        self.assertEqual(self.index.search('sen'), ['Bayer Leverkusen'])
+        self.assertEqual(self.index.search('b', limit=2), ['Bayern II', 'Bayer Leverkusen'])
+
+    def test_short_queries_match_word_prefixes(self):
+        for query in ['b', 'ba', 'u', 'un', 'fc', '1.', 'er', 'x']:
+            expected = {name for name in self.names if any(word.startswith(query) for word in name.casefold().split())}
+            self.assertEqual(set(self.index.search(query)), expected, query)
+
+
+class TeamSearchViewTests(ImportedDataTestCase):
+    url = '/api/teams/search/'
+
+    def test_search(self):
+        response = self.client.get(self.url, {'query': 'bay'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), ['Bayern'])
+        self.assertEqual(self.client.get(self.url, {'query': 'sea'}).json(), ['Chelsea'])
+        self.assertEqual(self.client.get(self.url, {'query': ''}).json(), [])
+
+    def test_limit(self):
+        # Clamped to at least one result
+        self.assertEqual(self.client.get(self.url, {'query': 'bay', 'limit': 0}).json(), ['Bayern'])
+        self.assertEqual(self.client.get(self.url, {'query': 'bay', 'limit': 'many'}).status_code, 400)
+
+
+class PackageCombinationBatchViewTests(ImportedDataTestCase):
+    url = '/api/packages/combinations/batch/'
+
+    def setUp(self):
+        # A fresh cache, so every selection is solved
+        patcher = mock.patch.object(result_cache, '_result_cache', LocalResultCache(max_entries=100, ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_match_single_requests(self):
+        selections = [
+            {'teams': ['Bayern'], 'max_size': 2},
+            {'teams': ['Arsenal']},
+            {'teams': []},
+            {'teams': ['Bayern'], 'max_size': 2},
+        ]
+        response = self.client.post(self.url, {'selections': selections}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 4)
+        for selection, result in zip(selections, results):
+            single = self.client.post('/api/packages/combinations/', selection, content_type='application/json')
+            self.assertEqual(result, single.json())
+
+    def test_stream(self):
+        selections = [{'teams': ['Bayern']}, {'teams': ['Arsenal']}]
+        with mock.patch.object(instrumentation.registry, 'observe') as observe:
+            response = self.client.post(
+                self.url, {'selections': selections, 'stream': True}, content_type='application/json'
+            )
+            observe.assert_not_called()
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+            response.close()
+
+        self.assertEqual([line['index'] for line in lines], [0, 1])
+        # Recorded once the stream closed, with the solving and rendering done while streaming
+        observe.assert_called_once()
+        endpoint, method, status, total, metrics = observe.call_args.args
+        self.assertEqual((endpoint, method, status), ('/api/packages/combinations/batch/', 'POST', 200))
+        self.assertGreater(metrics.seconds['solver'], 0)
+        self.assertGreater(metrics.seconds['serialization'], 0)
+
+    @override_settings(BATCH_MAX_SELECTIONS=2)
+    def test_too_many_selections(self):
+        response = self.client.post(
+            self.url, {'selections': [{'teams': ['Bayern']}] * 3}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_selections(self):
+        for body in ({}, {'selections': ['Bayern']}, {'selections': [{'teams': [1]}]}):
+            with self.subTest(body=body):
+                response = self.client.post(self.url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+
+class SolverPoolTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(4)
+        masks = [rng.getrandbits(30) for _ in range(30)]
+        self.solver_args = {
+            'masks': masks, 'monthly_prices': [rng.randint(100, 5000) for _ in masks],
+            'yearly_prices': [rng.randint(100, 5000) for _ in masks], 'target': (1 << 30) - 1, 'max_size': 4,
+        }
+
+    @override_settings(SOLVER_POOL_ENABLED=False, SOLVER_PARALLEL_MIN_PACKAGES=24)
+    def test_disabled_pool_is_never_started(self):
+        with mock.patch.object(solver_pool, 'get_solver_pool') as get_solver_pool:
+            solution = solver_pool.solve_partitioned(self.solver_args, time_budget=10)
+        get_solver_pool.assert_not_called()
+        expected = solver_pool.solve_cover_problem(**self.solver_args, time_budget=10)
+        self.assertTrue(solution['complete'])
+        self.assertEqual((solution['monthly'], solution['yearly']), (expected['monthly'], expected['yearly']))
+
+
+@override_settings(SOLVER_POOL_GRACE_SECONDS=60)
+class PackageCombinationAsyncViewTests(ImportedDataTestCase):
+    url = '/api/packages/combinations/async/'
+
+    def setUp(self):
+        # A fresh cache, so every request is solved
+        patcher = mock.patch.object(result_cache, '_result_cache', LocalResultCache(max_entries=100, ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_same_result_as_combinations(self, body):
+        response = self.client.post(self.url, body, content_type='application/json')
+        get_result_cache().clear()
+        expected = self.client.post('/api/packages/combinations/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), expected.json())
+
+    def test_same_result_as_combinations(self):
+        self.assert_same_result_as_combinations({'teams': ['Bayern'], 'max_size': 2})
+
+    @override_settings(SOLVER_POOL_ENABLED=True)
+    def test_same_result_in_the_pool(self):
+        with mock.patch.object(solver_pool, 'get_solver_pool', wraps=solver_pool.get_solver_pool) as get_solver_pool:
+            self.assert_same_result_as_combinations({'teams': ['Bayern', 'Arsenal']})
+        get_solver_pool.assert_called()
+
+    def test_invalid_body(self):
+        for body in ('not json', '[1, 2]', '{"teams": [1]}'):
+            with self.subTest(body=body):
+                response = self.client.post(self.url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+
+class InstrumentationTests(ImportedDataTestCase):
+    def setUp(self):
+        # A fresh cache, so the request is solved
+        patcher = mock.patch.object(result_cache, '_result_cache', LocalResultCache(max_entries=100, ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def combinations(self):
+        return self.client.post('/api/packages/combinations/', {'teams': ['Bayern']}, content_type='application/json')
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_server_timing_header(self):
+        timings = dict(part.split(';dur=') for part in self.combinations()['Server-Timing'].split(', '))
+        self.assertEqual(sorted(timings), ['db', 'serialization', 'solver', 'total'])
+        self.assertGreater(float(timings['solver']), 0)
+        self.assertGreaterEqual(float(timings['total']), float(timings['solver']))
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_no_server_timing_header(self):
+        self.assertFalse(self.combinations().has_header('Server-Timing'))
+
+    def metrics(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        return dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines() if not line.startswith('#'))
+
+    def test_metrics(self):
+        endpoint = 'endpoint="/api/packages/combinations/"'
+        requests = f'api_requests_total{{{endpoint},method="POST",status="200"}}'
+        before = int(self.metrics().get(requests, 0))
+        self.combinations()
+        metrics = self.metrics()
+        self.assertEqual(int(metrics[requests]), before + 1)
+        self.assertIn(f'api_request_stage_seconds_total{{{endpoint},stage="solver"}}', metrics)
+        self.assertIn(f'api_solver_searches_total{{{endpoint},backend="branch_and_bound"}}', metrics)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/8'])
+    def test_metrics_allow_list(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 200)
+        # Forwarded addresses are not trusted
+        self.assertEqual(self.client.get('/metrics', HTTP_X_FORWARDED_FOR='10.1.2.3').status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_metrics_off(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+class PackageScheduleViewTests(ImportedDataTestCase):
+    url = '/api/packages/schedule/'
+
+    def test_schedule(self):
+        response = self.client.post(self.url, {'teams': ['Bayern']}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['months'], ['2024-08', '2024-09', '2024-10', '2024-11'])
+        # Highlights Club in every month with a Bayern game beats a yearly subscription
+        self.assertEqual(data['total_price'], 600)
+        self.assertEqual([(segment['billing'], segment['from']) for segment in data['plan']], [
+            ('monthly', '2024-08'), ('monthly', '2024-10'), ('monthly', '2024-11'),
+        ])
+        self.assertEqual(
+            self.client.post(self.url, {'teams': []}, content_type='application/json').json()['total_price'], 0
+        )
@@ -8,7 +8,12 @@ from .views import (
     PackagesByTeamsView,
     PackagesByTeamsViewSoft,
     PackageCombinationView,
+    PackageCombinationBatchView,
+    PackageCombinationAsyncView,
     PackageCombinationViewBackup,
+    PackageScheduleView,
+    PackageParetoView,
+    ResultCacheStatsView,
     StreamingPackageViewSet
 )
 
@@ -22,5 +27,10 @@ urlpatterns = [
     path('packages/by-teams/', PackagesByTeamsView.as_view()),
     path('packages/by-teams-soft/', PackagesByTeamsViewSoft.as_view()),
     path('packages/combinations/', PackageCombinationView.as_view()),
+    path('packages/combinations/batch/', PackageCombinationBatchView.as_view()),
+    path('packages/combinations/async/', PackageCombinationAsyncView.as_view()),
     path('packages/combinations-backup/', PackageCombinationViewBackup.as_view()),
+    path('packages/schedule/', PackageScheduleView.as_view()),
+    path('packages/pareto/', PackageParetoView.as_view()),
+    path('cache/stats/', ResultCacheStatsView.as_view()),
 ]
\ No newline at end of file
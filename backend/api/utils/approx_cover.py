@@ -0,0 +1,224 @@
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from api.utils.set_cover_solver import _price_key
+
+try:
+    from scipy.optimize import linprog
+except ImportError:  # optional, a dual ascent bound is used without it
+    linprog = None
+
+# Improving swap moves tried before local search stops
+LOCAL_SEARCH_ROUNDS = 50
+
+
+def _union(masks: Sequence[int], chosen: Sequence[int]) -> int:
+    covered = 0
+    for i in chosen:
+        covered |= masks[i]
+    return covered
+
+
+def _total_key(chosen: Sequence[int], prices: Sequence[Optional[int]]) -> Tuple[int, int]:
+    """(has unpriced package, total price), the order combos are ranked in"""
+    keys = [_price_key(prices[i]) for i in chosen]
+    return max((flag for flag, _ in keys), default=0), sum(price for _, price in keys)
+
+
+def greedy_cover(
+    masks: Sequence[int],
+    prices: Sequence[Optional[int]],
+    target: int,
+    value: Callable[[int], float] = int.bit_count,
+) -> Tuple[List[int], int]:
+    """
+    Cost-effectiveness greedy: keep adding the package with the lowest price per newly
+    covered value of `target` until no package adds anything. Unpriced packages are
+    only taken once no priced package helps. Returns the package indices and the number
+    of packages evaluated.
+    """
+    remaining = [i for i, mask in enumerate(masks) if mask & target]
+    chosen: List[int] = []
+    covered = 0
+    evaluated = 0
+    while remaining:
+        best = None
+        for i in remaining:
+            evaluated += 1
+            gain = value(masks[i] & target & ~covered)
+            if gain <= 0:
+                continue
+            flag, price = _price_key(prices[i])
+            key = (flag, price / gain, -gain, i)
+            if best is None or key < best:
+                best = key
+        if best is None:
+            break
+        chosen.append(best[3])
+        covered |= masks[best[3]]
+        remaining.remove(best[3])
+    return chosen, evaluated
+
+
+def remove_redundant(
+    chosen: Sequence[int],
+    masks: Sequence[int],
+    prices: Sequence[Optional[int]],
+    target: int,
+    keep: Sequence[int] = (),
+) -> List[int]:
+    """
+    Drop packages, most expensive first, whose part of `target` the others cover as well.
+    Packages in `keep` are never dropped.
+    """
+    kept = list(chosen)
+    covered = _union(masks, kept) & target
+    for i in sorted(chosen, key=lambda i: (_price_key(prices[i]), i), reverse=True):
+        if i in keep:
+            continue
+        rest = [j for j in kept if j != i]
+        if _union(masks, rest) & target == covered:
+            kept = rest
+    return kept
+
+
+def local_search(
+    chosen: Sequence[int],
+    masks: Sequence[int],
+    prices: Sequence[Optional[int]],
+    target: int,
+    rounds: int = LOCAL_SEARCH_ROUNDS,
+) -> Tuple[List[int], int]:
+    """
+    Improve a cover with swap moves that keep its coverage: add one package and drop
+    the chosen ones it makes redundant, i.e. swap it in for one or several of them.
+    A move is made when it lowers the price. Stops at the first cover no move improves,
+    or after `rounds` moves. Returns the package indices and the number of moves evaluated.
+    """
+    chosen = remove_redundant(chosen, masks, prices, target)
+    candidates = [i for i, mask in enumerate(masks) if mask & target]
+    current = _total_key(chosen, prices)
+    evaluated = 0
+    for _ in range(rounds):
+        best = None
+        for i in candidates:
+            if i in chosen:
+                continue
+            evaluated += 1
+            swapped = remove_redundant(chosen + [i], masks, prices, target, keep=(i,))
+            key = _total_key(swapped, prices)
+            if key < current and (best is None or key < best[0]):
+                best = (key, swapped)
+        if best is None:
+            break
+        current, chosen = best
+    return chosen, evaluated
+
+
+def _coverage_matrix(masks: Sequence[int], target: int) -> np.ndarray:
+    """Boolean (distinct bit of `target`, package) matrix, one row per distinct set of covering packages"""
+    width = max(target.bit_length(), 1)
+    size = (width + 7) // 8
+    positions = np.flatnonzero(_bits(target, size, width))
+    columns = [_bits(mask & target, size, width)[positions] for mask in masks]
+    matrix = np.stack(columns, axis=1) if columns else np.zeros((len(positions), 0), dtype=bool)
+    matrix = matrix[matrix.any(axis=1)]
+    return np.unique(matrix, axis=0) if len(matrix) else matrix
+
+
+def _bits(mask: int, size: int, width: int) -> np.ndarray:
+    raw = np.frombuffer(mask.to_bytes(size, 'little'), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder='little')[:width].astype(bool)
+
+
+def lp_lower_bound(masks: Sequence[int], prices: Sequence[Optional[int]], target: int) -> float:
+    """
+    Lower bound on the price of every cover of `target`, from the LP relaxation of the
+    set cover (each package taken to a fraction 0..1). Unpriced packages are left out,
+    and so are the games only they cover.
+
+    With scipy the LP is solved exactly. Without it, a feasible solution of the dual LP
+    is built by dual ascent (most constrained games first, each raised until a covering
+    package's price is used up); its value is a weaker but still valid bound.
+    Games with the same covering packages are one row, they add nothing to the bound.
+    """
+    available = [i for i, price in enumerate(prices) if price is not None and masks[i] & target]
+    if not available:
+        return 0.0
+    matrix = _coverage_matrix([masks[i] for i in available], target)
+    if not len(matrix):
+        return 0.0
+    costs = np.array([prices[i] for i in available], dtype=float)
+
+    if linprog is not None:
+        result = linprog(
+            costs, A_ub=-matrix.astype(float), b_ub=-np.ones(len(matrix)), bounds=(0, 1), method='highs'
+        )
+        if result.status == 0:
+            return float(result.fun)
+
+    slack = costs.copy()
+    bound = 0.0
+    for row in matrix[np.argsort(matrix.sum(axis=1), kind='stable')]:
+        covering = np.flatnonzero(row)
+        raised = slack[covering].min()
+        slack[covering] -= raised
+        bound += raised
+    return bound
+
+
+def approximate_cover(
+    masks: Sequence[int],
+    prices: Sequence[Optional[int]],
+    target: int,
+    value: Callable[[int], float] = int.bit_count,
+) -> Dict:
+    """
+    Cheap set of packages covering as much of `target` as all packages together can.
+
+    All free packages are taken, the games they leave open are covered greedily by
+    price per newly covered `value`, then redundant packages are dropped and swap
+    moves lower the price further; the same is done starting from all paid packages,
+    and the cheaper result is kept. `value` weighs the bits of a mask (by default
+    every bit counts 1). The price is compared to the LP lower bound: `ratio` is how far
+    from the optimum the cover can at most be (None when a package has no price).
+    """
+    reachable = _union(masks, range(len(masks))) & target
+    # Free packages cost nothing, the search only covers what they leave open
+    free = [i for i, price in enumerate(prices) if price == 0 and masks[i] & reachable]
+    paid = [i for i, price in enumerate(prices) if price != 0 and masks[i] & reachable]
+    paid_masks = [masks[i] for i in paid]
+    paid_prices = [prices[i] for i in paid]
+    rest = reachable & ~_union(masks, free)
+
+    greedy, evaluated = greedy_cover(paid_masks, paid_prices, rest, value)
+    # Second start: every paid package, most expensive ones dropped first
+    chosen = None
+    for start in (greedy, list(range(len(paid)))):
+        improved, moves = local_search(start, paid_masks, paid_prices, rest)
+        evaluated += moves
+        if chosen is None or _total_key(improved, paid_prices) < _total_key(chosen, paid_prices):
+            chosen = improved
+    # Free packages made redundant by the paid ones are dropped last
+    chosen = remove_redundant(free + [paid[i] for i in chosen], masks, prices, reachable)
+
+    flag, total = _total_key(chosen, prices)
+    price = None if flag else total
+    lower_bound = lp_lower_bound(masks, prices, reachable)
+    # Prices are whole cents, so is the optimum
+    lower_bound = math.ceil(lower_bound - 1e-6)
+    if price is None:
+        ratio = None
+    elif lower_bound > 0:
+        ratio = price / lower_bound
+    else:
+        ratio = 1.0 if price == 0 else None
+    return {
+        'packages': chosen,
+        'price': price,
+        'lower_bound': lower_bound,
+        'ratio': ratio,
+        'evaluated': evaluated,
+    }
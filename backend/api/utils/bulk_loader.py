@@ -0,0 +1,86 @@
+import io
+import logging
+import time
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def prepare_games(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert starts_at to UTC-aware timestamps"""
+    df['starts_at'] = pd.to_datetime(df['starts_at'], utc=True)
+    return df
+
+
+def prepare_packages(df: pd.DataFrame) -> pd.DataFrame:
+    """Prices are nullable integers"""
+    for column in ('monthly_price_cents', 'monthly_price_yearly_subscription_in_cents'):
+        df[column] = df[column].astype('Int64')
+    return df
+
+
+def prepare_offers(df: pd.DataFrame) -> pd.DataFrame:
+    """Offer flags are stored as booleans"""
+    df['live'] = df['live'].astype(bool)
+    df['highlights'] = df['highlights'].astype(bool)
+    return df
+
+
+def bulk_load_csv(
+    model,
+    csv_path,
+    columns: List[str],
+    prepare: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Tuple[int, float]:
+    """
+    Stream a CSV file into the model's table in chunks of `chunk_size` rows.
+
+    On PostgreSQL every chunk is sent with a single `COPY ... FROM STDIN`, without
+    building model instances. Other databases (e.g. SQLite in tests) fall back to a
+    batched `bulk_create`. Returns the number of rows loaded and the elapsed seconds.
+    """
+    started = time.perf_counter()
+    rows = 0
+    for chunk in pd.read_csv(csv_path, usecols=columns, chunksize=chunk_size):
+        if prepare is not None:
+            chunk = prepare(chunk)
+        chunk = chunk[columns]
+        if connection.vendor == 'postgresql':
+            _copy_chunk(model, chunk)
+        else:
+            bulk_create_frame(model, chunk, chunk_size)
+        rows += len(chunk)
+    return rows, time.perf_counter() - started
+
+
+def _copy_chunk(model, chunk: pd.DataFrame) -> None:
+    """Load one chunk through PostgreSQL COPY, empty fields become NULL"""
+    db_columns = ', '.join(
+        connection.ops.quote_name(model._meta.get_field(column).column) for column in chunk.columns
+    )
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(model._meta.db_table)} ({db_columns}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '')",
+            buffer,
+        )
+
+
+def frame_to_instances(model, df: pd.DataFrame) -> list:
+    """Model instances for the rows of a prepared frame, missing values become None"""
+    records = df.astype(object).where(df.notna(), None).to_dict('records')
+    return [model(**record) for record in records]
+
+
+def bulk_create_frame(model, df: pd.DataFrame, batch_size: int) -> None:
+    """Fallback for databases without COPY"""
+    model.objects.bulk_create(frame_to_instances(model, df), batch_size=batch_size)
@@ -0,0 +1,471 @@
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time as dt_time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from api.models import DataImport, Game, StreamingOffer, StreamingPackage, TeamGame
+from api.serializers import StreamingPackageSerializer
+from api.utils.coverage_snapshot import CoverageSnapshot, load_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Which offers count as covering a game:
+# - live / highlights: only offers with that flag
+# - either: any offer (the default)
+# - weighted: a live offer counts fully, a highlights-only offer with
+#   `settings.COVERAGE_HIGHLIGHTS_WEIGHT`, an offer with neither flag not at all;
+#   as a bitmask, any live or highlights offer
+COVERAGE_MODES = ('live', 'highlights', 'either', 'weighted')
+DEFAULT_COVERAGE_MODE = 'either'
+
+
+def parse_coverage_mode(data, modes=COVERAGE_MODES) -> str:
+    """`coverage_mode` from request data; ValueError if it is not one of `modes`"""
+    mode = data.get('coverage_mode') or DEFAULT_COVERAGE_MODE
+    if mode not in modes:
+        raise ValueError(f"`coverage_mode` must be one of: {', '.join(modes)}")
+    return mode
+
+
+class GameFilter:
+    """Restricts a request to games of some tournaments and/or a `starts_at` range (inclusive)"""
+
+    def __init__(self, tournaments: Optional[Iterable[str]] = None, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None):
+        self.tournaments = tuple(sorted(set(tournaments))) if tournaments else None
+        self.start = start
+        self.end = end
+
+    def __bool__(self):
+        return bool(self.tournaments) or self.start is not None or self.end is not None
+
+    def cache_key(self) -> Optional[tuple]:
+        if not self:
+            return None
+        return (
+            self.tournaments,
+            self.start.isoformat() if self.start else None,
+            self.end.isoformat() if self.end else None,
+        )
+
+
+def _parse_bound(value, field: str, end_of_day: bool) -> Optional[datetime]:
+    """
+    Datetime for `from`/`to`: ISO date or datetime, or 'now'; a date covers the whole day.
+    'now' is rounded down to the minute, so such requests share cached results for a minute.
+    """
+    if value in (None, ''):
+        return None
+    if value == 'now':
+        return timezone.now().replace(second=0, microsecond=0)
+    if isinstance(value, str):
+        # Dates first, parse_datetime also takes them (as midnight)
+        day = parse_date(value)
+        if day is not None:
+            moment = datetime.combine(day, dt_time.max if end_of_day else dt_time.min)
+            return timezone.make_aware(moment)
+        moment = parse_datetime(value)
+        if moment is not None:
+            return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+    raise ValueError(f"`{field}` must be an ISO date or datetime, or 'now'")
+
+
+def parse_game_filter(data) -> GameFilter:
+    """`tournaments`, `from` and `to` from request data; ValueError if they are malformed"""
+    tournaments = data.get('tournaments') or None
+    if tournaments is not None and (
+        not isinstance(tournaments, list) or not all(isinstance(name, str) for name in tournaments)
+    ):
+        raise ValueError('`tournaments` must be a list of tournament names')
+    return GameFilter(
+        tournaments,
+        _parse_bound(data.get('from'), 'from', end_of_day=False),
+        _parse_bound(data.get('to'), 'to', end_of_day=True),
+    )
+
+
+class CoverageIndex:
+    """
+    Read-only in-memory view of games, packages and offers for one import version.
+
+    Games are addressed by their position in `game_ids`, so a set of games is a plain
+    integer bitmask. Positions follow `starts_at`, so a date range is a contiguous run
+    of bits. Offers are kept as a CSR table per package (`offer_indptr`, `offer_games`
+    and flags, rows aligned with `package_ids`) for vectorized scoring, and as a bitmask
+    of covered games per package for every coverage mode; `package_games` are those of
+    the default mode. The index is never mutated after it is built; a new import
+    produces a new index that replaces the old one as a whole. It is built from the
+    database, or from a memory-mapped snapshot (see `coverage_snapshot`).
+    """
+
+    def __init__(
+        self, version: int, games, team_games, packages: Iterable[StreamingPackage], offers, offer_table=None
+    ):
+        self.version = version
+
+        # Games in kick-off order: position <-> id, plus a bitmask of games per team and tournament
+        games = sorted(games, key=lambda game: (game[1], game[0]))
+        self.game_ids: List[int] = [game_id for game_id, _, _ in games]
+        self.game_starts: List[datetime] = [starts_at for _, starts_at, _ in games]
+        self.game_positions: Dict[int, int] = {game_id: position for position, game_id in enumerate(self.game_ids)}
+        self.tournament_games: Dict[str, int] = {}
+        for position, (_, _, tournament) in enumerate(games):
+            self.tournament_games[tournament] = self.tournament_games.get(tournament, 0) | 1 << position
+        self.team_games: Dict[str, int] = {}
+        for team, game_id in team_games:
+            position = self.game_positions.get(game_id)
+            if position is not None:
+                self.team_games[team] = self.team_games.get(team, 0) | 1 << position
+
+        # Calendar months ('YYYY-MM', in the current time zone) with a bitmask of their games
+        self.month_games: Dict[str, int] = {}
+        for position, starts_at in enumerate(self.game_starts):
+            month = timezone.localtime(starts_at).strftime('%Y-%m')
+            self.month_games[month] = self.month_games.get(month, 0) | 1 << position
+        self.months: List[str] = sorted(self.month_games)
+
+        # Packages ordered by id with aligned price arrays
+        self.packages: Dict[int, StreamingPackage] = {pkg.id: pkg for pkg in sorted(packages, key=lambda p: p.id)}
+        self.package_ids: List[int] = list(self.packages)
+        self.monthly_prices: List[Optional[int]] = [pkg.monthly_price_cents for pkg in self.packages.values()]
+        self.yearly_prices: List[Optional[int]] = [
+            pkg.monthly_price_yearly_subscription_in_cents for pkg in self.packages.values()
+        ]
+        # Serialized once per import, responses reuse these dicts instead of running the serializer
+        self.package_data: Dict[int, dict] = {
+            package_id: dict(data)
+            for package_id, data in zip(
+                self.package_ids, StreamingPackageSerializer(list(self.packages.values()), many=True).data
+            )
+        }
+
+        # Offers as a CSR table over package rows (aligned with `package_ids`): the offers
+        # of row r are offer_games[offer_indptr[r]:offer_indptr[r + 1]], game positions
+        # in ascending order, with their live / highlights flags
+        if offer_table is None:
+            offer_table = _offer_table(offers, self.game_positions, self.package_ids)
+        self.offer_indptr, self.offer_games, self.offer_live, self.offer_highlights = offer_table
+
+        # A bitmask of covered games per package and mode
+        self.mode_package_games: Dict[str, Dict[int, int]] = {}
+        for mode in COVERAGE_MODES:
+            flags = self.mode_offer_flags(mode)
+            games_per_package = {}
+            for row, package_id in enumerate(self.package_ids):
+                offers = slice(self.offer_indptr[row], self.offer_indptr[row + 1])
+                positions = self.offer_games[offers] if flags is None else self.offer_games[offers][flags[offers]]
+                games_per_package[package_id] = _positions_to_mask(positions, len(self.game_ids))
+            self.mode_package_games[mode] = games_per_package
+        self.package_games: Dict[int, int] = self.mode_package_games[DEFAULT_COVERAGE_MODE]
+
+        # Per team, the packages offering every one of its games (any offer). A package
+        # covers all games of several teams exactly if it is in each of their sets.
+        self.team_full_cover: Dict[str, frozenset] = {
+            team: frozenset(
+                package_id for package_id, package_games in self.package_games.items()
+                if not games & ~package_games
+            )
+            for team, games in self.team_games.items()
+        }
+
+    @classmethod
+    def build(cls, version: int) -> 'CoverageIndex':
+        """Load the whole dataset from the database"""
+        started = time.perf_counter()
+        index = cls(
+            version,
+            Game.objects.values_list('id', 'starts_at', 'tournament_name'),
+            TeamGame.objects.values_list('team__name', 'game_id'),
+            StreamingPackage.objects.all(),
+            StreamingOffer.objects.values_list('game_id', 'streaming_package_id', 'live', 'highlights').iterator(),
+        )
+        logger.info(
+            f"Built coverage index v{version}: {len(index.game_ids)} games, {len(index.package_ids)} packages "
+            f"in {time.perf_counter() - started:.3f}s"
+        )
+        return index
+
+    @classmethod
+    def from_snapshot(cls, snapshot: CoverageSnapshot) -> 'CoverageIndex':
+        """Build from a snapshot, the offers stay views on its mapped arrays"""
+        started = time.perf_counter()
+        tournaments = [snapshot.tournaments[number] for number in snapshot.game_tournaments.tolist()]
+        game_ids = snapshot.game_ids.tolist()
+        team_games = [
+            (team, game_ids[position])
+            for team_number, team in enumerate(snapshot.teams)
+            for position in snapshot.team_games[
+                snapshot.team_indptr[team_number]:snapshot.team_indptr[team_number + 1]
+            ].tolist()
+        ]
+        packages = [
+            StreamingPackage(
+                id=package_id, name=name, monthly_price_cents=monthly,
+                monthly_price_yearly_subscription_in_cents=yearly,
+            )
+            for package_id, name, monthly, yearly in zip(
+                snapshot.package_ids.tolist(), snapshot.package_names,
+                snapshot.prices('monthly_prices'), snapshot.prices('yearly_prices'),
+            )
+        ]
+        index = cls(
+            snapshot.version,
+            zip(game_ids, snapshot.game_starts(), tournaments),
+            team_games,
+            packages,
+            None,
+            offer_table=(snapshot.offer_indptr, snapshot.offer_games, snapshot.offer_live, snapshot.offer_highlights),
+        )
+        logger.info(
+            f"Loaded coverage index v{snapshot.version} from {snapshot.path}: {len(index.game_ids)} games, "
+            f"{len(index.package_ids)} packages in {time.perf_counter() - started:.3f}s"
+        )
+        return index
+
+    @property
+    def offer_count(self) -> int:
+        return len(self.offer_games)
+
+    def mode_offer_flags(self, mode: str = DEFAULT_COVERAGE_MODE) -> Optional[np.ndarray]:
+        """Which offers count in a coverage mode, aligned with `offer_games`; None for all of them"""
+        if mode == 'live':
+            return self.offer_live
+        if mode == 'highlights':
+            return self.offer_highlights
+        if mode == 'weighted':
+            return self.offer_live | self.offer_highlights
+        return None
+
+    def offer_weights(self) -> np.ndarray:
+        """Score per offer in the weighted mode: 1 live, the highlights weight highlights only, 0 otherwise"""
+        return np.where(
+            self.offer_live, 1.0, np.where(self.offer_highlights, settings.COVERAGE_HIGHLIGHTS_WEIGHT, 0.0)
+        )
+
+    def package_totals(self, offer_values: np.ndarray) -> np.ndarray:
+        """
+        Sum of per-offer values (aligned with `offer_games`) per package row. Rows are
+        contiguous runs of the CSR table, so this needs no per-offer row array.
+        """
+        totals = np.zeros(len(self.package_ids))
+        starts = np.asarray(self.offer_indptr[:-1])
+        filled = np.diff(self.offer_indptr) > 0
+        if filled.any():
+            # Each non-empty row runs up to the next non-empty row's start
+            totals[filled] = np.add.reduceat(offer_values, starts[filled], dtype=np.float64)
+        return totals
+
+    def games_for_teams(self, teams: Iterable[str]) -> int:
+        """Bitmask of all games involving any of the given teams"""
+        mask = 0
+        for team in teams:
+            mask |= self.team_games.get(team, 0)
+        return mask
+
+    def games_between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        """Bitmask of games starting within [start, end], found by bisecting the kick-off times"""
+        low = 0 if start is None else bisect_left(self.game_starts, start)
+        high = len(self.game_starts) if end is None else bisect_right(self.game_starts, end)
+        if high <= low:
+            return 0
+        return (1 << high) - (1 << low)
+
+    def filter_games(self, mask: int, game_filter: Optional[GameFilter]) -> int:
+        """Restrict a bitmask of games to the tournaments and date range of the filter"""
+        if not game_filter:
+            return mask
+        if game_filter.tournaments:
+            allowed = 0
+            for tournament in game_filter.tournaments:
+                allowed |= self.tournament_games.get(tournament, 0)
+            mask &= allowed
+        if game_filter.start is not None or game_filter.end is not None:
+            mask &= self.games_between(game_filter.start, game_filter.end)
+        return mask
+
+    def packages_covering_all(self, teams: Iterable[str], game_filter: Optional[GameFilter] = None) -> List[int]:
+        """
+        Ids of packages offering every (matching) game of the given teams, in id order.
+        Without a filter that is the intersection of the teams' precomputed sets; a filter
+        drops games, so then every package's bitmask is checked against the remaining games.
+        """
+        if game_filter:
+            games = self.filter_games(self.games_for_teams(teams), game_filter)
+            return [
+                package_id for package_id, package_games in self.package_games.items()
+                if not games & ~package_games
+            ]
+        covering = None
+        for team in set(teams):
+            team_packages = self.team_full_cover.get(team)
+            if team_packages is not None:
+                covering = team_packages if covering is None else covering & team_packages
+        if covering is None:
+            return list(self.package_ids)
+        return [package_id for package_id in self.package_ids if package_id in covering]
+
+    def games_vector(self, mask: int) -> np.ndarray:
+        """Boolean vector over all games for the bitmask"""
+        n_games = len(self.game_ids)
+        packed = np.frombuffer(mask.to_bytes((n_games + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(packed, count=n_games, bitorder='little').astype(bool)
+
+    def packages_covering(self, mask: int, exclude: Iterable[int] = (), mode: str = DEFAULT_COVERAGE_MODE) -> List[int]:
+        """Ids of packages covering at least one game in the bitmask"""
+        excluded = {int(package_id) for package_id in exclude}
+        return [
+            package_id for package_id, games in self.mode_package_games[mode].items()
+            if games & mask and package_id not in excluded
+        ]
+
+    def coverage(self, package_ids: Iterable[int], mode: str = DEFAULT_COVERAGE_MODE) -> int:
+        """Bitmask of all games covered by the given packages"""
+        package_games = self.mode_package_games[mode]
+        mask = 0
+        for package_id in package_ids:
+            mask |= package_games[package_id]
+        return mask
+
+    def cover_masks(self, package_ids: Iterable[int], games_mask: int, mode: str = DEFAULT_COVERAGE_MODE):
+        """
+        The cover problem for the games in `games_mask`: (masks per package, target, value).
+        `value(mask)` is the coverage score of the target bits in a mask.
+
+        In the weighted mode a game only covered by highlights adds the highlights weight,
+        and offers with neither flag count for nothing, as in `offer_weights`. With
+        score = (1 - weight) * |live games| + weight * |live or highlights games|, that is
+        a cover of live bits and, shifted above them, live-or-highlights bits.
+        """
+        if mode != 'weighted':
+            package_games = self.mode_package_games[mode]
+            return [package_games[package_id] for package_id in package_ids], games_mask, int.bit_count
+
+        weight = settings.COVERAGE_HIGHLIGHTS_WEIGHT
+        shift = len(self.game_ids)
+        live_games = self.mode_package_games['live']
+        flagged_games = self.mode_package_games['weighted']
+        masks = [live_games[package_id] | (flagged_games[package_id] << shift) for package_id in package_ids]
+        target = (games_mask if weight < 1 else 0) | ((games_mask << shift) if weight > 0 else 0)
+        low_bits = (1 << shift) - 1
+
+        def value(mask: int) -> float:
+            return (1 - weight) * (mask & low_bits).bit_count() + weight * (mask >> shift).bit_count()
+
+        return masks, target, value
+
+
+def _row_to_mask(row: np.ndarray) -> int:
+    """Integer bitmask of a boolean row, bit i set for row[i]"""
+    return int.from_bytes(np.packbits(row, bitorder='little').tobytes(), 'little')
+
+
+def _positions_to_mask(positions: np.ndarray, size: int) -> int:
+    """Integer bitmask with the bits at `positions` set"""
+    row = np.zeros(size, dtype=bool)
+    row[positions] = True
+    return _row_to_mask(row)
+
+
+def _offer_table(offers, game_positions: Dict[int, int], package_ids: List[int]):
+    """CSR arrays (indptr, game positions, live, highlights) from (game_id, package_id, live, highlights) rows"""
+    package_rows = {package_id: row for row, package_id in enumerate(package_ids)}
+    rows, positions, live_flags, highlights_flags = [], [], [], []
+    for game_id, package_id, live, highlights in offers:
+        position = game_positions.get(game_id)
+        row = package_rows.get(package_id)
+        if position is not None and row is not None:
+            rows.append(row)
+            positions.append(position)
+            live_flags.append(bool(live))
+            highlights_flags.append(bool(highlights))
+    rows = np.asarray(rows, dtype=np.int32)
+    positions = np.asarray(positions, dtype=np.int32)
+    order = np.lexsort((positions, rows))
+    indptr = np.zeros(len(package_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(package_ids)), out=indptr[1:])
+    return (
+        indptr,
+        positions[order],
+        np.asarray(live_flags, dtype=bool)[order],
+        np.asarray(highlights_flags, dtype=bool)[order],
+    )
+
+
+_index: Optional[CoverageIndex] = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def current_import_version() -> int:
+    """Version of the data currently in the database, 0 if it was never imported"""
+    return DataImport.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def import_source(version: int) -> str:
+    """
+    Identifies the data of an import version across databases: the database plus the
+    import's id and time. Import ids alone repeat, e.g. in a fresh or test database.
+    """
+    database = connection.settings_dict
+    created_at = DataImport.objects.filter(id=version).values_list('created_at', flat=True).first()
+    return ':'.join([
+        connection.vendor, str(database['HOST']), str(database['NAME']),
+        str(version), created_at.isoformat() if created_at else '',
+    ])
+
+
+def _build_current_index() -> CoverageIndex:
+    """
+    Build the index, retrying if an import committed while it was being loaded.
+    A snapshot at `COVERAGE_SNAPSHOT_PATH` is used when it is of the current import of
+    this database.
+    """
+    while True:
+        version = current_import_version()
+        snapshot = load_snapshot(settings.COVERAGE_SNAPSHOT_PATH) if settings.COVERAGE_SNAPSHOT_PATH else None
+        if snapshot is not None and snapshot.version == version and snapshot.source == import_source(version):
+            index = CoverageIndex.from_snapshot(snapshot)
+        else:
+            index = CoverageIndex.build(version)
+        if current_import_version() == version:
+            return index
+
+
+def get_coverage_index() -> CoverageIndex:
+    """
+    Return the coverage index for the current import version.
+
+    The database is asked for the import version at most once every
+    `COVERAGE_INDEX_CHECK_INTERVAL` seconds; if it changed, a new index is built and
+    swapped in. Requests that already hold the old index keep using it untouched.
+    """
+    global _index, _index_checked_at
+
+    index = _index
+    if index is not None and time.monotonic() - _index_checked_at < settings.COVERAGE_INDEX_CHECK_INTERVAL:
+        return index
+
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_checked_at >= settings.COVERAGE_INDEX_CHECK_INTERVAL:
+            version = current_import_version()
+            if _index is None or _index.version != version:
+                _index = _build_current_index()
+            _index_checked_at = time.monotonic()
+        return _index
+
+
+def reload_coverage_index() -> CoverageIndex:
+    """Rebuild the index right away, e.g. after an import in this process"""
+    global _index, _index_checked_at
+
+    with _index_lock:
+        _index = _build_current_index()
+        _index_checked_at = time.monotonic()
+        return _index
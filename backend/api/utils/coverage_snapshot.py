@@ -0,0 +1,155 @@
+import json
+import logging
+import mmap
+import os
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CVSNAP01'
+# Arrays start at multiples of this, so every mapped array is aligned for its dtype
+ALIGNMENT = 64
+# Missing prices are stored as this value in the int64 price arrays
+NO_PRICE = -1
+
+
+class CoverageSnapshot:
+    """
+    A coverage snapshot file mapped read-only into memory.
+
+    The arrays are views on the mapping: every process that loads the same file shares
+    one copy of its pages through the OS page cache, and nothing is parsed or copied on
+    load. Game positions (`offer_games`, `team_games`) refer to `game_ids`, which are in
+    kick-off order like in `CoverageIndex`.
+    """
+
+    def __init__(self, path, header: Dict, arrays: Dict[str, np.ndarray]):
+        self.path = path
+        self.version: int = header['version']
+        self.source: Optional[str] = header.get('source')
+        self.tournaments: List[str] = header['tournaments']
+        self.teams: List[str] = header['teams']
+        self.package_names: List[str] = header['package_names']
+        self.arrays = arrays
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['arrays'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def game_starts(self) -> List[datetime]:
+        return [
+            datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+            for micros in self.arrays['game_starts'].tolist()
+        ]
+
+    def prices(self, name: str) -> List[Optional[int]]:
+        return [None if price == NO_PRICE else price for price in self.arrays[name].tolist()]
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_snapshot(index, path, source: str) -> int:
+    """
+    Write the games, teams, packages and offers of a coverage index to `path`, tagged
+    with `source` (see `coverage_index.import_source`):
+    MAGIC, the header length (uint64) and a JSON header with names and the array
+    layout, then the raw arrays, each aligned to `ALIGNMENT`. Offers are a CSR table
+    (`offer_indptr` per package row, `offer_games` positions and flags), team games
+    likewise (`team_indptr`, `team_games`), prices are int64 with `NO_PRICE` for none.
+
+    The file is written next to `path` and renamed over it, so readers that still map
+    the previous snapshot keep a consistent view. Returns the size in bytes.
+    """
+    tournaments = sorted(index.tournament_games)
+    tournament_positions = np.zeros(len(index.game_ids), dtype=np.int32)
+    for number, tournament in enumerate(tournaments):
+        tournament_positions[index.games_vector(index.tournament_games[tournament])] = number
+    teams = sorted(index.team_games)
+    team_positions = [np.flatnonzero(index.games_vector(index.team_games[team])) for team in teams]
+    team_indptr = np.zeros(len(teams) + 1, dtype=np.int64)
+    np.cumsum([len(positions) for positions in team_positions], out=team_indptr[1:])
+
+    def prices(values):
+        return np.asarray([NO_PRICE if price is None else price for price in values], dtype=np.int64)
+
+    arrays = {
+        'game_ids': np.asarray(index.game_ids, dtype=np.int64),
+        'game_starts': np.asarray(
+            [round(starts_at.timestamp() * 1_000_000) for starts_at in index.game_starts], dtype=np.int64
+        ),
+        'game_tournaments': tournament_positions,
+        'package_ids': np.asarray(index.package_ids, dtype=np.int64),
+        'monthly_prices': prices(index.monthly_prices),
+        'yearly_prices': prices(index.yearly_prices),
+        'offer_indptr': np.asarray(index.offer_indptr, dtype=np.int64),
+        'offer_games': np.asarray(index.offer_games, dtype=np.int32),
+        'offer_live': np.asarray(index.offer_live, dtype=bool),
+        'offer_highlights': np.asarray(index.offer_highlights, dtype=bool),
+        'team_indptr': team_indptr,
+        'team_games': np.concatenate(team_positions).astype(np.int32) if teams else np.zeros(0, dtype=np.int32),
+    }
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _aligned(offset)
+        layout[name] = {'dtype': array.dtype.str, 'length': len(array), 'offset': offset}
+        offset += array.nbytes
+    header = json.dumps({
+        'version': index.version,
+        'source': source,
+        'tournaments': tournaments,
+        'teams': teams,
+        'package_names': [index.packages[package_id].name for package_id in index.package_ids],
+        'arrays': layout,
+    }).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return data_start + offset
+
+
+def load_snapshot(path) -> Optional[CoverageSnapshot]:
+    """Map the snapshot at `path` read-only; None if there is none or it is not a snapshot"""
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        # ValueError: empty file, nothing to map
+        return None
+
+    if mapped[:len(MAGIC)] != MAGIC:
+        logger.warning(f"Ignoring coverage snapshot {path}: unknown format")
+        return None
+    header_length = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 8], 'little')
+    header_start = len(MAGIC) + 8
+    header = json.loads(mapped[header_start:header_start + header_length])
+    data_start = _aligned(header_start + header_length)
+    arrays = {
+        name: np.frombuffer(
+            mapped, dtype=np.dtype(spec['dtype']), count=spec['length'], offset=data_start + spec['offset']
+        )
+        for name, spec in header['arrays'].items()
+    }
+    return CoverageSnapshot(path, header, arrays)
@@ -0,0 +1,117 @@
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+from api.utils.bulk_loader import DEFAULT_CHUNK_SIZE, bulk_create_frame, frame_to_instances
+
+
+class TableDelta:
+    """Rows to insert, update and delete to bring one table in line with its CSV file"""
+
+    def __init__(self, model, value_columns: List[str], inserts: pd.DataFrame, updates: pd.DataFrame, delete_pks: list):
+        self.model = model
+        self.value_columns = value_columns
+        self.inserts = inserts
+        self.updates = updates  # carries the primary key in column 'id'
+        self.delete_pks = delete_pks
+
+    def __bool__(self):
+        return bool(len(self.inserts) or len(self.updates) or len(self.delete_pks))
+
+    def __str__(self):
+        return f"{len(self.inserts)} inserted, {len(self.updates)} updated, {len(self.delete_pks)} deleted"
+
+    def apply_upserts(self, batch_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        if len(self.inserts):
+            bulk_create_frame(self.model, self.inserts, batch_size)
+        if len(self.updates):
+            self.model.objects.bulk_update(
+                frame_to_instances(self.model, self.updates), self.value_columns, batch_size=batch_size
+            )
+
+    def apply_deletes(self, batch_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        for start in range(0, len(self.delete_pks), batch_size):
+            self.model.objects.filter(pk__in=self.delete_pks[start:start + batch_size]).delete()
+
+
+def content_hash(df: pd.DataFrame, value_columns: List[str]) -> pd.Series:
+    """
+    64-bit hash of the value columns of each row.
+    Values are compared in their text form, so the CSV and database sides hash the same
+    regardless of the exact dtype (e.g. datetime resolution) each side was read with.
+    """
+    return pd.util.hash_pandas_object(df[value_columns].astype(str), index=False)
+
+
+def diff_table(
+    model,
+    csv_path,
+    key_columns: List[str],
+    value_columns: List[str],
+    prepare: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> TableDelta:
+    """
+    Compare a CSV file with the model's table by key and content hash.
+
+    The current table is reduced to one hash per key; the CSV is streamed in chunks and
+    only rows that are new or whose hash changed are kept in memory. A key listed more
+    than once in the CSV counts once, with its last row.
+    """
+    pk_in_key = key_columns == ['id']
+    db_columns = key_columns + value_columns if pk_in_key else ['id'] + key_columns + value_columns
+    current = pd.DataFrame.from_records(
+        model.objects.values_list(*db_columns).iterator(chunk_size=chunk_size),
+        columns=db_columns,
+    )
+    if prepare is not None and len(current):
+        current = prepare(current)
+    current = current.set_index(key_columns, drop=False)
+    # Rows sharing a key with an earlier row are leftovers and get deleted
+    duplicated = current.index.duplicated(keep='first')
+    duplicate_pks = current.loc[duplicated, 'id'].tolist()
+    current = current[~duplicated]
+    current_hashes = content_hash(current, value_columns)
+    current_hashes.index = current.index
+
+    seen = []
+    inserts, updates = [], []
+    for chunk in pd.read_csv(csv_path, usecols=key_columns + value_columns, chunksize=chunk_size):
+        if prepare is not None:
+            chunk = prepare(chunk)
+        chunk = chunk.drop_duplicates(subset=key_columns, keep='last').set_index(key_columns, drop=False)
+        seen.append(chunk.index)
+
+        known = chunk.index.isin(current_hashes.index)
+        inserts.append(chunk[~known])
+
+        existing = chunk[known]
+        changed = content_hash(existing, value_columns).to_numpy() != current_hashes.loc[existing.index].to_numpy()
+        changed_rows = existing[changed].copy()
+        if not pk_in_key:
+            changed_rows['id'] = current.loc[changed_rows.index, 'id'].to_numpy()
+        updates.append(changed_rows)
+
+    # A key repeated in a later chunk is decided by its last row there, like within a chunk
+    later_keys = current.index[:0]
+    for position in reversed(range(len(seen))):
+        if len(later_keys):
+            inserts[position] = inserts[position][~inserts[position].index.isin(later_keys)]
+            updates[position] = updates[position][~updates[position].index.isin(later_keys)]
+        later_keys = later_keys.append(seen[position])
+
+    seen_keys = seen[0].append(seen[1:]) if seen else current.index[:0]
+    removed = current[~current.index.isin(seen_keys)]
+
+    def _collect(frames, columns):
+        frames = [frame.reset_index(drop=True)[columns] for frame in frames if len(frame)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    columns = key_columns + value_columns
+    return TableDelta(
+        model,
+        value_columns,
+        _collect(inserts, columns),
+        _collect(updates, columns if pk_in_key else ['id'] + columns),
+        removed['id'].tolist() + duplicate_pks,
+    )
@@ -0,0 +1,128 @@
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from scipy.optimize import Bounds, LinearConstraint, milp
+except ImportError:  # optional, every search uses branch and bound without it
+    milp = None
+
+BRANCH_AND_BOUND = 'branch_and_bound'
+ILP = 'ilp'
+
+
+def choose_backend(package_count: int, min_packages: int) -> str:
+    """
+    The ILP backend for problems with at least `min_packages` packages (0: never),
+    if a MILP solver is installed; branch and bound otherwise.
+    """
+    if milp is not None and 0 < min_packages <= package_count:
+        return ILP
+    return BRANCH_AND_BOUND
+
+
+def _cover_rows(masks: Sequence[int], target: int) -> np.ndarray:
+    """Boolean (game, package) matrix of `target`, games with the same covering packages merged into one row"""
+    width = target.bit_length()
+    size = (width + 7) // 8
+
+    def bits(mask: int) -> np.ndarray:
+        raw = np.frombuffer(mask.to_bytes(size, 'little'), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder='little')[:width].astype(bool)
+
+    games = np.flatnonzero(bits(target))
+    matrix = np.stack([bits(mask & target)[games] for mask in masks], axis=1)
+    return np.unique(matrix, axis=0)
+
+
+def ilp_cheapest_covers(
+    masks: Sequence[int],
+    price_keys: Sequence[Tuple[int, int]],
+    target: int,
+    max_size: int,
+    top_k: int,
+    deadline: Optional[float] = None,
+) -> Tuple[List[Tuple[int, ...]], bool, int]:
+    """
+    Cheapest covers of `target` as a 0-1 integer program, solved with the HiGHS MILP
+    solver through scipy:
+
+        minimize   sum(cost_j * x_j) + unpriced_cost * y
+        subject to sum(x_j for packages j covering game g) >= 1   for every game g
+                   sum(x_j) <= max_size
+                   x_j <= y                                         for unpriced packages j
+
+    Costs rank covers like `(has_unpriced_package, total_price, size)`: a package costs
+    its price times (max_size + 1) plus 1, and y outweighs any priced cover. The next
+    best cover is found by adding a no-good cut that excludes exactly the covers found
+    so far, until `top_k` are found. Covers tying with the k-th one are enumerated too,
+    so the caller can break ties like the branch and bound does.
+
+    `price_keys` are `(unpriced, price)` pairs as from `_price_key`. Returns the covers
+    (package positions) in ascending cost, whether the enumeration finished before the
+    `deadline` (time.monotonic()), and the number of programs solved.
+    """
+    n = len(masks)
+    unpriced = [j for j, (flag, _) in enumerate(price_keys) if flag]
+    size_cost = max_size + 1
+    costs = [size_cost * price + 1 for _, price in price_keys]
+    if unpriced:
+        costs.append(size_cost * (sum(price for _, price in price_keys) + 1))
+    columns = len(costs)
+
+    rows, lower, upper = [], [], []
+    for row in _cover_rows(masks, target):
+        rows.append(np.concatenate([row, np.zeros(columns - n)]))
+        lower.append(1)
+        upper.append(np.inf)
+    rows.append(np.concatenate([np.ones(n), np.zeros(columns - n)]))
+    lower.append(0)
+    upper.append(max_size)
+    for j in unpriced:
+        row = np.zeros(columns)
+        row[j] = 1
+        row[n] = -1
+        rows.append(row)
+        lower.append(-np.inf)
+        upper.append(0)
+
+    covers: List[Tuple[int, ...]] = []
+    values: List[int] = []
+    solved = 0
+    while True:
+        options = {'mip_rel_gap': 0}
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return covers, False, solved
+            options['time_limit'] = remaining
+        result = milp(
+            costs,
+            integrality=np.ones(columns),
+            bounds=Bounds(0, 1),
+            constraints=LinearConstraint(np.array(rows), lower, upper),
+            options=options,
+        )
+        solved += 1
+        if result.status == 2:
+            # Infeasible: every cover has been found
+            return covers, True, solved
+        if result.status != 0:
+            # Time limit, the incumbent is not known to be the next best
+            return covers, False, solved
+
+        value = round(result.fun)
+        if len(covers) >= top_k and value > values[top_k - 1]:
+            return covers, True, solved
+        cover = tuple(int(j) for j in np.flatnonzero(result.x[:n] > 0.5))
+        covers.append(cover)
+        values.append(value)
+
+        # No-good cut: any other set of packages, sum(x_j in cover) - sum(x_j not in cover) <= |cover| - 1
+        cut = np.full(columns, -1.0)
+        cut[n:] = 0
+        cut[list(cover)] = 1
+        rows.append(cut)
+        lower.append(-np.inf)
+        upper.append(len(cover) - 1)
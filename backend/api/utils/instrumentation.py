@@ -0,0 +1,338 @@
+import ipaddress
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+from api.utils.renderers import FastJSONRenderer
+
+# Upper bounds (seconds) of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stages a request's wall time is split into, besides the total
+STAGES = ('db', 'solver', 'serialization')
+
+# What happened to the packages of a cover problem in the pre-reduction (`problem_reduction`)
+REDUCTION_OUTCOMES = ('forced', 'dominated', 'equivalent', 'kept')
+
+# Backends that solve combination searches (`ilp_cover`)
+SOLVER_BACKENDS = ('branch_and_bound', 'ilp')
+
+
+class RequestMetrics:
+    """Time spent per stage and work done while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.queries = 0
+        self.combos = 0
+        self.reduction: Dict[str, int] = dict.fromkeys(REDUCTION_OUTCOMES, 0)
+        # Searches run and seconds spent per solver backend
+        self.solver_runs: Dict[str, int] = dict.fromkeys(SOLVER_BACKENDS, 0)
+        self.solver_seconds: Dict[str, float] = dict.fromkeys(SOLVER_BACKENDS, 0.0)
+        # Nested stages only count for the outermost one
+        self.active_stage: Optional[str] = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar('request_metrics', default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Attribute the time spent in the block to a stage of the current request.
+    Queries run inside the block still count as db time only.
+    """
+    metrics = _current.get()
+    if metrics is None or metrics.active_stage is not None:
+        yield
+        return
+    metrics.active_stage = name
+    started = time.perf_counter()
+    db_before = metrics.seconds['db']
+    try:
+        yield
+    finally:
+        metrics.seconds[name] += time.perf_counter() - started - (metrics.seconds['db'] - db_before)
+        metrics.active_stage = None
+
+
+def record_combos(count: int) -> None:
+    """Count combinations evaluated by a solver for the current request"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.combos += count
+
+
+def record_reduction(stats: Dict[str, int]) -> None:
+    """Count packages set aside or kept by the problem reduction for the current request"""
+    metrics = _current.get()
+    if metrics is not None:
+        for outcome in REDUCTION_OUTCOMES:
+            metrics.reduction[outcome] += stats[outcome]
+
+
+def record_solver(backend: str, seconds: float) -> None:
+    """Count a combination search and its solver time by the backend that solved it"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.solver_runs[backend] += 1
+        metrics.solver_seconds[backend] += seconds
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    metrics.queries += 1
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.seconds['db'] += time.perf_counter() - started
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(_install_query_timer)
+
+
+class TimedJSONRenderer(FastJSONRenderer):
+    """JSON renderer that counts rendering as serialization time"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with stage('serialization'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class MetricsRegistry:
+    """
+    Per endpoint totals since the process started, in Prometheus text format.
+    Every worker process keeps its own registry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str, str], int] = {}
+        self._endpoints: Dict[str, Dict] = {}
+
+    def observe(self, endpoint: str, method: str, status: int, total: float, metrics: RequestMetrics) -> None:
+        with self._lock:
+            key = (endpoint, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            entry = self._endpoints.setdefault(endpoint, {
+                'buckets': [0] * len(DURATION_BUCKETS),
+                'count': 0,
+                'seconds': dict.fromkeys(('total',) + STAGES, 0.0),
+                'queries': 0,
+                'combos': 0,
+                'reduction': dict.fromkeys(REDUCTION_OUTCOMES, 0),
+                'solver_runs': dict.fromkeys(SOLVER_BACKENDS, 0),
+                'solver_seconds': dict.fromkeys(SOLVER_BACKENDS, 0.0),
+            })
+            for position, bound in enumerate(DURATION_BUCKETS):
+                if total <= bound:
+                    entry['buckets'][position] += 1
+            entry['count'] += 1
+            entry['seconds']['total'] += total
+            for name in STAGES:
+                entry['seconds'][name] += metrics.seconds[name]
+            entry['queries'] += metrics.queries
+            entry['combos'] += metrics.combos
+            for outcome in REDUCTION_OUTCOMES:
+                entry['reduction'][outcome] += metrics.reduction[outcome]
+            for backend in SOLVER_BACKENDS:
+                entry['solver_runs'][backend] += metrics.solver_runs[backend]
+                entry['solver_seconds'][backend] += metrics.solver_seconds[backend]
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                '# HELP api_requests_total Requests handled, by endpoint, method and status.',
+                '# TYPE api_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'api_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            lines += [
+                '# HELP api_request_duration_seconds Wall time of requests.',
+                '# TYPE api_request_duration_seconds histogram',
+            ]
+            for endpoint, entry in sorted(self._endpoints.items()):
+                for bound, count in zip(DURATION_BUCKETS, entry['buckets']):
+                    lines.append(f'api_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'api_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {entry["count"]}')
+                lines.append(f'api_request_duration_seconds_sum{{endpoint="{endpoint}"}} {entry["seconds"]["total"]}')
+                lines.append(f'api_request_duration_seconds_count{{endpoint="{endpoint}"}} {entry["count"]}')
+
+            lines += [
+                '# HELP api_request_stage_seconds_total Wall time spent per request stage.',
+                '# TYPE api_request_stage_seconds_total counter',
+            ]
+            for endpoint, entry in sorted(self._endpoints.items()):
+                for name in STAGES:
+                    lines.append(
+                        f'api_request_stage_seconds_total{{endpoint="{endpoint}",stage="{name}"}} {entry["seconds"][name]}'
+                    )
+
+            for metric, field, help_text in (
+                ('api_db_queries_total', 'queries', 'SQL queries executed.'),
+                ('api_solver_combos_evaluated_total', 'combos', 'Package combinations evaluated by the solvers.'),
+            ):
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                for endpoint, entry in sorted(self._endpoints.items()):
+                    lines.append(f'{metric}{{endpoint="{endpoint}"}} {entry[field]}')
+
+            lines += [
+                '# HELP api_solver_reduced_packages_total Packages of cover problems by pre-reduction outcome.',
+                '# TYPE api_solver_reduced_packages_total counter',
+            ]
+            for endpoint, entry in sorted(self._endpoints.items()):
+                for outcome in REDUCTION_OUTCOMES:
+                    lines.append(
+                        f'api_solver_reduced_packages_total{{endpoint="{endpoint}",outcome="{outcome}"}} '
+                        f'{entry["reduction"][outcome]}'
+                    )
+
+            for metric, field, help_text in (
+                ('api_solver_searches_total', 'solver_runs', 'Combination searches by the backend that solved them.'),
+                ('api_solver_seconds_total', 'solver_seconds', 'Time spent in combination searches per backend.'),
+            ):
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                for endpoint, entry in sorted(self._endpoints.items()):
+                    for backend in SOLVER_BACKENDS:
+                        lines.append(f'{metric}{{endpoint="{endpoint}",backend="{backend}"}} {entry[field][backend]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _server_timing(metrics: RequestMetrics, total: float) -> str:
+    parts = [f'{name};dur={metrics.seconds[name] * 1000:.2f}' for name in STAGES]
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+
+def _observe(request, response, metrics: RequestMetrics) -> float:
+    total = metrics.elapsed()
+    match = getattr(request, 'resolver_match', None)
+    endpoint = '/' + match.route if match is not None and match.route else 'unmatched'
+    registry.observe(endpoint, request.method, response.status_code, total, metrics)
+    return total
+
+
+def _timed_stream(request, response, metrics: RequestMetrics, content):
+    """Produce the chunks of a streaming response as part of its request, recorded when the stream closes"""
+    iterator = iter(content)
+    try:
+        while True:
+            token = _current.set(metrics)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        _observe(request, response, metrics)
+
+
+async def _atimed_stream(request, response, metrics: RequestMetrics, content):
+    iterator = content.__aiter__()
+    try:
+        while True:
+            token = _current.set(metrics)
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+    finally:
+        _observe(request, response, metrics)
+
+
+class InstrumentationMiddleware:
+    """
+    Records wall time, stage times, query count and evaluated combos of every request
+    into the metrics registry. With `settings.SERVER_TIMING_HEADER` the same numbers
+    are sent back in a `Server-Timing` header.
+
+    Streaming responses produce most of their body after the view returned, so they
+    are recorded when the stream closes, including the time spent producing it, and
+    get no `Server-Timing` header (it is sent before the body).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    @staticmethod
+    def _finish(request, response, metrics: RequestMetrics):
+        if response.streaming:
+            stream = _atimed_stream if response.is_async else _timed_stream
+            response.streaming_content = stream(request, response, metrics, response.streaming_content)
+            return response
+        total = _observe(request, response, metrics)
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = _server_timing(metrics, total)
+        return response
+
+
+def _metrics_allowed(address: str) -> bool:
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, only for clients in `settings.METRICS_ALLOWED_IPS`
+    (by the connecting address, forwarded headers are not trusted)
+    """
+    if not settings.METRICS_ALLOWED_IPS:
+        raise Http404()
+    if not _metrics_allowed(request.META.get('REMOTE_ADDR', '')):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
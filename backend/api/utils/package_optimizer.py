@@ -1,36 +1,29 @@
-from typing import List, Dict, Set, Tuple
-from django.db.models import Q
-from api.models import Game, StreamingOffer
+from typing import Tuple
 
-def get_team_games(teams: List[str]) -> Set[int]:
-    """Get all game IDs for the given teams"""
-    return set(Game.objects.filter(
-        Q(team_home__in=teams) | Q(team_away__in=teams)
-    ).values_list('id', flat=True))
+import numpy as np
 
-def calculate_package_coverage(packages, team_games_ids):
-    """Calculate the coverage of each package"""
-    package_coverage = []
-    total_game_count = len(team_games_ids)
-    
-    for package in packages:
-        # Get games covered by this package
-        covered_games = StreamingOffer.objects.filter(
-            game_id__in=team_games_ids,
-            streaming_package_id=package.id
-        ).count()
-        
-        coverage = covered_games / total_game_count if total_game_count > 0 else 0
-        package_coverage.append({
-            'package': package,
-            'coverage': coverage
-        })
-    
-    return package_coverage
+def calculate_package_coverage(index, games_mask: int, mode: str = 'either') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the coverage of every package over the games in the bitmask with a single
+    weighted count over the index's offer table. Returns package ids and coverage ratios,
+    highest coverage first. In the weighted mode a highlights-only game counts with its
+    weight instead of 1.
+    """
+    total_game_count = games_mask.bit_count()
+    package_ids = np.asarray(index.package_ids, dtype=np.int64)
+    if total_game_count == 0:
+        return package_ids, np.zeros(len(package_ids))
 
-def get_coverage(pkg_list):
-    """Helper function to get total game coverage from a list of packages"""
-    covered_games = set()
-    for pkg in pkg_list:
-        covered_games.update(offer.game_id for offer in pkg.relevant_offers)
-    return covered_games
\ No newline at end of file
+    # Which offers are for one of the games, then summed up per package row
+    selected = index.games_vector(games_mask)[index.offer_games]
+    if mode == 'weighted':
+        weights = selected * index.offer_weights()
+    else:
+        flags = index.mode_offer_flags(mode)
+        weights = selected if flags is None else selected & flags
+    covered_games = index.package_totals(weights)
+    coverage = covered_games / total_game_count
+
+    # Stable sort keeps packages with equal coverage in id order
+    order = np.argsort(-coverage, kind='stable')
+    return package_ids[order], coverage[order]
@@ -0,0 +1,70 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# (price, covered bitmask, package indices)
+State = Tuple[int, int, Tuple[int, ...]]
+
+
+def _frontier(states: Sequence[State], value: Callable[[int], float]) -> List[Tuple[float, State]]:
+    """States no other state beats on both price and covered value, cheapest first"""
+    frontier = []
+    best_value = None
+    for state in sorted(states, key=lambda state: (state[0], -value(state[1]), len(state[2]))):
+        state_value = value(state[1])
+        if best_value is None or state_value > best_value:
+            frontier.append((state_value, state))
+            best_value = state_value
+    return frontier
+
+
+def pareto_frontier(
+    masks: Sequence[int],
+    prices: Sequence[Optional[int]],
+    target: int,
+    value: Callable[[int], float] = int.bit_count,
+    max_points: int = 20,
+    beam_width: int = 256,
+) -> List[Dict]:
+    """
+    Trade-off between price and covered value of `target`: the cheapest combination
+    found for each level of coverage, where paying more always covers more.
+
+    Packages are added one at a time, cheapest first, to every kept partial
+    combination. Combinations covering the same games are merged into the cheapest.
+    After each package only `beam_width` combinations are kept: first the ones on the
+    current frontier, then the ones covering most. So the run is linear in the number
+    of packages and the frontier exact unless the beam overflows.
+    Unpriced packages are skipped. At most `max_points` points are returned, evenly
+    spread over the frontier and always including its cheapest and its best covering end.
+    """
+    candidates = sorted(
+        (i for i, price in enumerate(prices) if price is not None and masks[i] & target),
+        key=lambda i: (prices[i], i),
+    )
+    states: List[State] = [(0, 0, ())]
+    for i in candidates:
+        mask = masks[i] & target
+        cheapest: Dict[int, State] = {covered: (price, covered, chosen) for price, covered, chosen in states}
+        for price, covered, chosen in states:
+            if mask & ~covered:
+                new = (price + prices[i], covered | mask, chosen + (i,))
+                old = cheapest.get(new[1])
+                if old is None or new[0] < old[0]:
+                    cheapest[new[1]] = new
+        states = list(cheapest.values())
+        if len(states) > beam_width:
+            kept = [state for _, state in _frontier(states, value)][:beam_width]
+            on_frontier = {state[1] for state in kept}
+            rest = sorted(
+                (state for state in states if state[1] not in on_frontier),
+                key=lambda state: (-value(state[1]), state[0]),
+            )
+            states = kept + rest[:beam_width - len(kept)]
+
+    points = [(state_value, state) for state_value, state in _frontier(states, value) if state_value > 0]
+    if len(points) > max_points:
+        step = (len(points) - 1) / max(max_points - 1, 1)
+        points = [points[-1 - round(n * step)] for n in reversed(range(max_points))]
+    return [
+        {'packages': list(chosen), 'price': price, 'value': state_value}
+        for state_value, (price, covered, chosen) in points
+    ]
@@ -0,0 +1,144 @@
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from django.conf import settings
+
+from api.utils.result_cache import LocalResultCache
+from api.utils.set_cover_solver import _dominates, _price_key
+
+
+class ReducedProblem:
+    """A cover problem after pre-reduction, with the packages that were set aside"""
+
+    def __init__(
+        self,
+        kept: List[int],
+        forced: List[int],
+        monthly_prices: List[Optional[int]],
+        yearly_prices: List[Optional[int]],
+        target: int,
+        max_size: int,
+        stats: Dict[str, int],
+    ):
+        self.kept = kept  # indices of the packages left to search, ascending
+        self.forced = forced  # indices of the packages every cover contains
+        # Prices of the kept packages to search with (see `reduce_cover_problem`)
+        self.monthly_prices = monthly_prices
+        self.yearly_prices = yearly_prices
+        self.target = target  # what the kept packages still have to cover
+        self.max_size = max_size  # packages a cover may still add
+        self.stats = stats  # package counts per outcome
+
+
+def _forced_packages(masks: Sequence[int], target: int) -> List[int]:
+    """Packages that are the only one covering some bit of `target`"""
+    once = twice = 0
+    for mask in masks:
+        twice |= once & mask
+        once |= mask
+    single = once & ~twice & target
+    return [i for i, mask in enumerate(masks) if mask & single]
+
+
+def reduce_cover_problem(
+    masks: Sequence[int],
+    monthly_prices: Sequence[Optional[int]],
+    yearly_prices: Sequence[Optional[int]],
+    target: int,
+    max_size: int,
+    top_k: int = 3,
+) -> ReducedProblem:
+    """
+    Shrink a cover problem before searching it, keeping its top-k answers exact.
+
+    1) Forced: a package that is the only one covering some game is in every cover.
+       It is set aside, its games leave the target and it takes one of the `max_size`
+       slots. (If that would leave nothing to cover, the last one stays in the search,
+       so covers are never empty.) If a forced package has no price, every cover is
+       unpriced and ranked by the rest of its price, so the kept packages without a
+       price are searched as free in that price type.
+    2) Dominated: package A dominates B when it covers a superset of B's remaining
+       games and is no worse (see `_dominates`) by monthly and by yearly price.
+       Packages with identical coverage are the special case of equivalent packages:
+       all but the cheapest are dominated. Like `prune_dominated`, a package is dropped
+       once it has `top_k + max_size - 2` dominators, so it can never be in a top-k combo.
+    """
+    n = len(masks)
+    forced = _forced_packages(masks, target)
+    residual = target
+    for i in forced:
+        residual &= ~masks[i]
+    if forced and not residual:
+        forced = forced[:-1]
+        residual = target
+        for i in forced:
+            residual &= ~masks[i]
+    max_size -= len(forced)
+
+    def search_prices(prices):
+        if any(prices[i] is None for i in forced):
+            return [price or 0 for price in prices]
+        return list(prices)
+
+    monthly_prices = search_prices(monthly_prices)
+    yearly_prices = search_prices(yearly_prices)
+    candidates = [i for i in range(n) if i not in set(forced)]
+    remaining = {i: masks[i] & residual for i in candidates}
+    monthly_keys = {i: _price_key(monthly_prices[i]) for i in candidates}
+    yearly_keys = {i: _price_key(yearly_prices[i]) for i in candidates}
+    min_dominators = top_k + max(0, max_size - 2)
+
+    kept, dominated, equivalent = [], 0, 0
+    for i in candidates:
+        dominators = 0
+        same_coverage = False
+        for j in candidates:
+            if (
+                i != j and not remaining[i] & ~remaining[j]
+                and _dominates(monthly_keys[j], monthly_keys[i], j < i)
+                and _dominates(yearly_keys[j], yearly_keys[i], j < i)
+            ):
+                dominators += 1
+                same_coverage = same_coverage or remaining[i] == remaining[j]
+                if dominators >= min_dominators:
+                    break
+        if dominators < min_dominators:
+            kept.append(i)
+        elif same_coverage:
+            equivalent += 1
+        else:
+            dominated += 1
+
+    stats = {
+        'packages': n,
+        'forced': len(forced),
+        'dominated': dominated,
+        'equivalent': equivalent,
+        'kept': len(kept),
+    }
+    return ReducedProblem(
+        kept,
+        forced,
+        [monthly_prices[i] for i in kept],
+        [yearly_prices[i] for i in kept],
+        residual,
+        max_size,
+        stats,
+    )
+
+
+_reduction_cache = None
+_reduction_cache_lock = threading.Lock()
+
+
+def get_reduction_cache() -> LocalResultCache:
+    """Per process cache of reduced problems, keyed by team selection and search parameters"""
+    global _reduction_cache
+
+    if _reduction_cache is None:
+        with _reduction_cache_lock:
+            if _reduction_cache is None:
+                _reduction_cache = LocalResultCache(
+                    settings.OPTIMIZER_REDUCTION_CACHE_MAX_ENTRIES, settings.OPTIMIZER_RESULT_CACHE['TTL']
+                )
+    return _reduction_cache
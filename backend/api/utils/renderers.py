@@ -0,0 +1,27 @@
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional, the standard json encoder is used without it
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Compact JSON through orjson when it is installed. Indented output (e.g. requested
+    via the Accept header) and values orjson cannot encode go through the standard renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def json_response(data, status: int = 200) -> HttpResponse:
+    """JSON response for plain Django views, encoded like the API responses"""
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
@@ -0,0 +1,151 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LocalResultCache:
+    """
+    In-process LRU cache with a time-to-live per entry.
+
+    Entries are stored per import version: the first access with a newer version drops
+    every entry, and requests still running against an older version bypass the cache.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._version: Optional[int] = None
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key) if self._check_version(version) else None
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, version: int) -> None:
+        with self._lock:
+            if not self._check_version(version):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'local',
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'version': self._version,
+        }
+
+    def _check_version(self, version: int) -> bool:
+        """Switch to a newer version if needed; False for a stale version"""
+        if self._version is None or version > self._version:
+            self._entries.clear()
+            self._version = version
+        return version == self._version
+
+
+class DjangoResultCache:
+    """
+    Result cache on top of a Django cache backend, shared between processes.
+
+    The import version is passed as the Django cache key version, so entries of an
+    older import are simply never read again and age out through the backend's TTL.
+    """
+
+    def __init__(self, alias: str, ttl: float):
+        self.alias = alias
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        value = caches[self.alias].get(self._key(key), version=version)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, version: int) -> None:
+        caches[self.alias].set(self._key(key), value, timeout=self.ttl, version=version)
+
+    def clear(self) -> None:
+        # Entries are versioned by import, nothing to drop eagerly
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'django',
+            'alias': self.alias,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        # Hash the key so it is valid for every backend (e.g. no spaces for memcached)
+        return 'optimizer:' + hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def combination_cache_key(
+    endpoint: str,
+    teams: Iterable[str],
+    packages_to_exclude: Iterable[int],
+    max_size: Optional[int] = None,
+    top_k: Optional[int] = None,
+    coverage_mode: Optional[str] = None,
+    game_filter: Optional[tuple] = None,
+) -> tuple:
+    """Cache key that does not depend on the order or duplicates of teams and exclusions"""
+    return (
+        endpoint,
+        tuple(sorted(set(teams))),
+        tuple(sorted({int(package_id) for package_id in packages_to_exclude})),
+        max_size,
+        top_k,
+        coverage_mode,
+        game_filter,
+    )
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Return the result cache configured by `settings.OPTIMIZER_RESULT_CACHE`"""
+    global _result_cache
+
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                config = settings.OPTIMIZER_RESULT_CACHE
+                if config['BACKEND'] == 'django':
+                    _result_cache = DjangoResultCache(config['ALIAS'], config['TTL'])
+                else:
+                    _result_cache = LocalResultCache(config['MAX_ENTRIES'], config['TTL'])
+    return _result_cache
@@ -0,0 +1,138 @@
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from api.utils.set_cover_solver import cheapest_covers
+
+# Months a yearly subscription runs for, and is paid for
+YEARLY_TERM_MONTHS = 12
+
+
+def calendar_months(first: str, last: str) -> List[str]:
+    """All 'YYYY-MM' months from `first` to `last`, inclusive"""
+    year, month = map(int, first.split('-'))
+    months = []
+    while True:
+        current = f'{year:04d}-{month:02d}'
+        months.append(current)
+        if current >= last:
+            return months
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def cheapest_bundle(
+    package_ids: Sequence[int],
+    masks: Sequence[int],
+    prices: Sequence[Optional[int]],
+    target: int,
+    max_size: int,
+    time_budget: Optional[float] = None,
+) -> Tuple[Optional[Tuple[int, List[int]]], bool]:
+    """
+    Cheapest set of at most `max_size` packages covering `target`, as (price, package ids).
+    Packages without a price are not available and never used. Returns None for the
+    bundle if there is no cover, plus whether the search finished within the time budget.
+    """
+    if not target:
+        return (0, []), True
+    available = [i for i, price in enumerate(prices) if price is not None and masks[i] & target]
+    result = cheapest_covers(
+        [masks[i] for i in available], [prices[i] for i in available], target, max_size, 1, time_budget
+    )
+    if not result.combos:
+        return None, result.complete
+    chosen = [available[i] for i in result.combos[0]]
+    return (sum(prices[i] for i in chosen), [package_ids[i] for i in chosen]), result.complete
+
+
+def cheapest_schedule(
+    months: Sequence[str],
+    month_targets: Sequence[int],
+    package_ids: Sequence[int],
+    masks: Sequence[int],
+    monthly_prices: Sequence[Optional[int]],
+    yearly_prices: Sequence[Optional[int]],
+    max_size: int,
+    time_budget: Optional[float] = None,
+) -> Dict:
+    """
+    Cheapest subscription plan covering the games of every month.
+
+    The months are split into consecutive segments, each paid either
+    - monthly: the cheapest bundle for that single month at monthly prices, or
+    - yearly: one bundle for the games of up to 12 months, paid for the full year
+      (12 x the monthly price of the yearly subscription).
+
+    `best[t]`, the cheapest plan for months t..end, is filled in from the last month
+    backwards, trying a monthly month or every yearly window starting at t, so each
+    segment's bundle is searched once: O(months x 12) cover searches instead of
+    enumerating plans. Months without games cost nothing.
+    """
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    complete = True
+
+    def remaining() -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def bundle(prices, target):
+        nonlocal complete
+        found, finished = cheapest_bundle(package_ids, masks, prices, target, max_size, remaining())
+        complete = complete and finished
+        return found
+
+    n = len(months)
+    # best[t] = (price, first segment) of the cheapest plan for months t..n-1
+    best: List[Optional[Tuple[int, Optional[Dict]]]] = [None] * n + [(0, None)]
+    for start in range(n - 1, -1, -1):
+        options = []
+
+        found = bundle(monthly_prices, month_targets[start])
+        if found is not None and best[start + 1] is not None:
+            price, bundle_ids = found
+            options.append((price + best[start + 1][0], 1, 'monthly', price, bundle_ids))
+
+        target = 0
+        for length in range(1, min(YEARLY_TERM_MONTHS, n - start) + 1):
+            target |= month_targets[start + length - 1]
+            if not target or best[start + length] is None:
+                continue
+            found = bundle(yearly_prices, target)
+            if found is None:
+                # A larger window only has more games to cover
+                break
+            price, bundle_ids = found
+            price *= YEARLY_TERM_MONTHS
+            options.append((price + best[start + length][0], length, 'yearly', price, bundle_ids))
+
+        if options:
+            # Cheapest first, then fewer and longer segments
+            total, length, billing, price, bundle_ids = min(options, key=lambda option: (option[0], -option[1]))
+            best[start] = (total, {
+                'billing': billing,
+                'from': months[start],
+                'to': months[start + length - 1],
+                'months': length,
+                'package_ids': bundle_ids,
+                'price': price,
+            })
+
+    if best[0] is None:
+        # Some month cannot be covered at all, neither monthly nor within any yearly window
+        return {
+            'total_price': None,
+            'plan': [],
+            'uncoverable_months': [
+                month for month, target in zip(months, month_targets)
+                if bundle(monthly_prices, target) is None and bundle(yearly_prices, target) is None
+            ],
+            'complete': complete,
+        }
+
+    plan = []
+    start = 0
+    while start < n:
+        segment = best[start][1]
+        # Months without games need no subscription
+        if segment['package_ids'] or segment['billing'] == 'yearly':
+            plan.append(segment)
+        start += segment['months']
+    return {'total_price': best[0][0], 'plan': plan, 'uncoverable_months': [], 'complete': complete}
@@ -0,0 +1,620 @@
+import heapq
+import itertools
+import math
+import time
+from concurrent.futures import Executor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from api.utils.ilp_cover import BRANCH_AND_BOUND, ILP, ilp_cheapest_covers
+
+# Combos are ranked by (has_unpriced_package, total_price, size, package_indices).
+# A package without a price (e.g. no monthly subscription) pushes its combos to the end,
+# which mirrors the float('inf') sort key used when building responses.
+ComboKey = Tuple[int, int, int, Tuple[int, ...]]
+
+
+def _price_key(price: Optional[int]) -> Tuple[int, int]:
+    """Sort key for a single package price, unpriced packages last"""
+    return (1, 0) if price is None else (0, price)
+
+
+def _dominates(key: Tuple[int, int], other: Tuple[int, int], before: bool) -> bool:
+    """
+    Whether a package with price key `key` is at least as good as one with `other` in
+    every combo: no unpriced flag where the other has none, and no higher price
+    (an unpriced package adds nothing to the total of an already unpriced combo).
+    Equal keys are decided by `before`, the package order.
+    """
+    return key[0] <= other[0] and key[1] <= other[1] and (key != other or before)
+
+
+def prune_dominated(
+    masks: Sequence[int],
+    prices: Sequence[Optional[int]],
+    min_dominators: int = 1,
+) -> List[int]:
+    """
+    Return the indices of packages that are not dominated by enough other packages.
+
+    Package A dominates package B when A covers a superset of B's games and is cheaper,
+    or equally priced with a lower index (see `_dominates`). Every combo containing B
+    can then be turned into an at least as good combo by swapping B for A (or dropping
+    B if A is already in it).
+    To keep the top-k combos exact, a package is only dropped once it has
+    `min_dominators` dominators; see `cheapest_covers`.
+    """
+    keys = [_price_key(price) for price in prices]
+    kept = []
+    for i, mask in enumerate(masks):
+        dominators = 0
+        for j, other in enumerate(masks):
+            if i != j and not mask & ~other and _dominates(keys[j], keys[i], j < i):
+                dominators += 1
+                if dominators >= min_dominators:
+                    break
+        if dominators < min_dominators:
+            kept.append(i)
+    return kept
+
+
+class _Largest:
+    """Heap entry with reversed ordering, so heapq keeps the largest key on top"""
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other: '_Largest') -> bool:
+        return other.key < self.key
+
+
+class TopK:
+    """The `k` smallest keys pushed so far, kept in a bounded max-heap"""
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: List[_Largest] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    @property
+    def full(self) -> bool:
+        return len(self._heap) >= self.k
+
+    def worst(self):
+        """The k-th smallest key, only meaningful once the heap is full"""
+        return self._heap[0].key
+
+    def push(self, key) -> None:
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, _Largest(key))
+        elif key < self._heap[0].key:
+            heapq.heapreplace(self._heap, _Largest(key))
+
+    def sorted(self) -> list:
+        return sorted(entry.key for entry in self._heap)
+
+
+class CoverSearchResult:
+    """Outcome of a cover search"""
+
+    def __init__(
+        self, combos: List[Tuple[int, ...]], complete: bool = True, nodes: int = 0, backend: str = BRANCH_AND_BOUND
+    ):
+        self.combos = combos  # tuples of package indices, cheapest first
+        self.complete = complete  # False if the time budget ran out before the search finished
+        self.nodes = nodes  # number of combos evaluated (plus integer programs solved, for the ILP backend)
+        self.backend = backend  # the solver that found them
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+# How many combos are evaluated between two checks of the time budget (and the shared bound)
+BUDGET_CHECK_INTERVAL = 1024
+# Subtrees per worker in a partitioned search, so that uneven subtrees still keep all workers busy
+SUBTREES_PER_WORKER = 4
+# Combos a partitioned search first evaluates in the calling process: smaller problems are
+# solved right there, larger ones start their subtrees with the bound found so far
+WARM_UP_NODES = 8 * BUDGET_CHECK_INTERVAL
+# Combos the ILP backend first leaves to branch and bound, which is faster unless the
+# problem is tight (few covers, or none, among very many combos)
+ILP_WARM_UP_NODES = 256 * BUDGET_CHECK_INTERVAL
+
+# Larger than every combo key, i.e. no bound yet
+_NO_LIMIT = (2, 0, 0)
+_NO_BOUND = (1 << 63) - 1
+
+
+def _pack_key(key: Tuple[int, int, int]) -> Optional[int]:
+    """(has_unpriced_package, total_price, size) as one int64, in the same order; None if it does not fit"""
+    unpriced, total, size = key
+    if total >= 1 << 46 or size >= 1 << 16:
+        return None
+    return unpriced << 62 | total << 16 | size
+
+
+def _unpack_key(value: int) -> Tuple[int, int, int]:
+    return value >> 62, value >> 16 & (1 << 46) - 1, value & (1 << 16) - 1
+
+
+class SharedBound:
+    """
+    The k-th best combo key found so far by the subtree searches of one partitioned
+    search, in shared memory. Each subtree publishes its own k-th best key to its own
+    int64 slot, so there is a single writer per slot and no lock; the bound is the
+    smallest slot. Any subtree's k-th best key is at least the overall k-th best, so a
+    branch above the bound can never make the overall top k.
+    """
+
+    def __init__(self, name: str, slot: int):
+        self._memory = shared_memory.SharedMemory(name=name)
+        self._slots = self._memory.buf.cast('q')
+        self._slot = slot
+
+    @staticmethod
+    def create(slots: int) -> shared_memory.SharedMemory:
+        memory = shared_memory.SharedMemory(create=True, size=8 * max(slots, 1))
+        view = memory.buf.cast('q')
+        for slot in range(len(view)):
+            view[slot] = _NO_BOUND
+        view.release()
+        return memory
+
+    def get(self) -> Tuple[int, int, int]:
+        value = min(self._slots)
+        return _NO_LIMIT if value == _NO_BOUND else _unpack_key(value)
+
+    def publish(self, key: Tuple[int, int, int]) -> None:
+        value = _pack_key(key)
+        if value is not None and value < self._slots[self._slot]:
+            self._slots[self._slot] = value
+
+    def close(self) -> None:
+        self._slots.release()
+        self._memory.close()
+
+
+def _search_order(masks: Sequence[int], prices: Sequence[Optional[int]], target: int, max_size: int, top_k: int):
+    """
+    Packages left after pruning, in ascending price order: their indices, coverage of
+    `target`, price keys and suffix unions (`suffix_union[i]` is everything packages
+    i..n-1 can still contribute). None if they cannot cover `target`.
+    """
+    min_dominators = top_k + max(0, max_size - 2)
+    candidates = prune_dominated([mask & target for mask in masks], prices, min_dominators)
+    candidates.sort(key=lambda i: (_price_key(prices[i]), i))
+    cand_masks = [masks[i] & target for i in candidates]
+    cand_keys = [_price_key(prices[i]) for i in candidates]
+    n = len(candidates)
+
+    suffix_union = [0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        suffix_union[i] = suffix_union[i + 1] | cand_masks[i]
+    if suffix_union[0] != target:
+        return None
+    return candidates, cand_masks, cand_keys, suffix_union
+
+
+def _branch_and_bound(
+    candidates: List[int],
+    cand_masks: List[int],
+    cand_keys: List[Tuple[int, int]],
+    suffix_union: List[int],
+    target: int,
+    max_size: int,
+    top_k: int,
+    deadline: Optional[float],
+    prefix: Sequence[int] = (),
+    start: int = 0,
+    bound: Optional[SharedBound] = None,
+    max_nodes: Optional[int] = None,
+) -> Tuple[List[ComboKey], bool, int]:
+    """
+    Depth-first search for the `top_k` cheapest covers among the combos that contain
+    exactly the candidates `prefix` of the first `start` ones (all combos by default).
+    Returns their keys, cheapest first, whether the search finished and the number of
+    combos evaluated. With a `bound`, the k-th best key is shared with the searches of
+    the other subtrees and their bound cuts branches here too. The search also stops
+    (incomplete) after about `max_nodes` combos.
+    """
+    best = TopK(top_k)
+    chosen = [candidates[i] for i in prefix]
+    covered = unpriced = total = 0
+    for i in prefix:
+        covered |= cand_masks[i]
+        unpriced |= cand_keys[i][0]
+        total += cand_keys[i][1]
+    # Branches with a key above `limit` are cut: the local k-th best, or the shared bound if lower
+    limit = _NO_LIMIT if bound is None else bound.get()
+    n = len(candidates)
+    nodes = 0
+
+    if bound is not None:
+        if (unpriced, total, len(prefix)) > limit:
+            # Every combo of this subtree is at least as expensive as its prefix
+            return [], True, 0
+        if deadline is not None and time.monotonic() > deadline:
+            # Only got a worker after the time budget ran out
+            return [], False, 0
+
+    def push(key: ComboKey) -> None:
+        nonlocal limit
+        best.push(key)
+        if best.full and best.worst()[:3] < limit:
+            limit = best.worst()[:3]
+            if bound is not None:
+                bound.publish(limit)
+
+    def search(start: int, covered: int, unpriced: int, total: int) -> None:
+        nonlocal nodes, limit
+        size = len(chosen) + 1
+        if size > max_size:
+            return
+        for i in range(start, n):
+            if covered != target and covered | suffix_union[i] != target:
+                return
+            flag, price = cand_keys[i]
+            new_unpriced = unpriced | flag
+            new_total = total + price
+            if (new_unpriced, new_total, size) > limit:
+                if unpriced and not flag:
+                    # The unpriced siblings (sorted last) add nothing to an already unpriced combo
+                    continue
+                # Remaining siblings are at least as expensive
+                return
+            nodes += 1
+            if nodes % BUDGET_CHECK_INTERVAL == 0:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise _BudgetExceeded
+                if max_nodes is not None and nodes >= max_nodes:
+                    raise _BudgetExceeded
+                if bound is not None:
+                    limit = min(limit, bound.get())
+            new_covered = covered | cand_masks[i]
+            chosen.append(candidates[i])
+            if new_covered == target:
+                push((new_unpriced, new_total, size, tuple(sorted(chosen))))
+            search(i + 1, new_covered, new_unpriced, new_total)
+            chosen.pop()
+
+    complete = True
+    try:
+        if prefix and covered == target:
+            push((unpriced, total, len(prefix), tuple(sorted(chosen))))
+        search(start, covered, unpriced, total)
+    except _BudgetExceeded:
+        complete = False
+    return best.sorted(), complete, nodes
+
+
+def _search_subtree(
+    candidates, cand_masks, cand_keys, suffix_union, target, max_size, top_k, wall_deadline,
+    prefix, start, bound_name, slot,
+) -> Tuple[List[ComboKey], bool, int]:
+    """One subtree of a partitioned search, run in a worker process"""
+    # Deadlines cross process boundaries as wall clock time
+    deadline = None if wall_deadline is None else time.monotonic() + wall_deadline - time.time()
+    bound = SharedBound(bound_name, slot)
+    try:
+        return _branch_and_bound(
+            candidates, cand_masks, cand_keys, suffix_union, target, max_size, top_k, deadline,
+            prefix, start, bound,
+        )
+    finally:
+        bound.close()
+
+
+def _partitioned_search(
+    executor: Executor,
+    workers: int,
+    candidates: List[int],
+    cand_masks: List[int],
+    cand_keys: List[Tuple[int, int]],
+    suffix_union: List[int],
+    target: int,
+    max_size: int,
+    top_k: int,
+    deadline: Optional[float],
+) -> Tuple[List[ComboKey], bool, int]:
+    """
+    Split the search by which of the first (cheapest) `depth` candidates a combo
+    contains, solve the subtrees in `executor` and merge their top k. The subtrees
+    share their bound (see `SharedBound`) and are submitted in the serial search order,
+    so the ones most likely to hold cheap covers tighten the bound for the rest.
+
+    The search first runs here for `WARM_UP_NODES` combos. If that finishes it, the
+    problem was too small to be worth splitting; otherwise the k-th best key found
+    seeds the shared bound (its combos are found again in their subtrees).
+    """
+    keys, complete, nodes = _branch_and_bound(
+        candidates, cand_masks, cand_keys, suffix_union, target, max_size, top_k, deadline,
+        max_nodes=WARM_UP_NODES,
+    )
+    if complete or (deadline is not None and time.monotonic() > deadline):
+        return keys, complete, nodes
+
+    n = len(candidates)
+    depth = min(n, math.ceil(math.log2(workers * SUBTREES_PER_WORKER)))
+    prefixes = []
+    for size in range(min(depth, max_size) + 1):
+        for prefix in itertools.combinations(range(depth), size):
+            covered = 0
+            for i in prefix:
+                covered |= cand_masks[i]
+            if covered | suffix_union[depth] == target:
+                prefixes.append(prefix)
+    # In the order the serial search would visit them: combos with the cheapest packages first
+    prefixes.sort(key=lambda prefix: prefix + (depth,))
+
+    wall_deadline = None if deadline is None else time.time() + deadline - time.monotonic()
+    # One slot per subtree, the last one holds the warm-up bound
+    memory = SharedBound.create(len(prefixes) + 1)
+    futures = []
+    try:
+        if len(keys) >= top_k:
+            seed = SharedBound(memory.name, len(prefixes))
+            seed.publish(keys[-1][:3])
+            seed.close()
+        futures = [
+            executor.submit(
+                _search_subtree, candidates, cand_masks, cand_keys, suffix_union, target, max_size, top_k,
+                wall_deadline, prefix, depth, memory.name, slot,
+            )
+            for slot, prefix in enumerate(prefixes)
+        ]
+        best = TopK(top_k)
+        complete = True
+        for future in futures:
+            keys, subtree_complete, subtree_nodes = future.result()
+            for key in keys:
+                best.push(key)
+            complete = complete and subtree_complete
+            nodes += subtree_nodes
+        return best.sorted(), complete, nodes
+    finally:
+        for future in futures:
+            future.cancel()
+        memory.close()
+        memory.unlink()
+
+
+def _combo_key(indices: Sequence[int], prices: Sequence[Optional[int]]) -> ComboKey:
+    keys = [_price_key(prices[i]) for i in indices]
+    return (
+        max((flag for flag, _ in keys), default=0),
+        sum(price for _, price in keys),
+        len(indices),
+        tuple(sorted(indices)),
+    )
+
+
+def _connected_components(cand_masks: Sequence[int]) -> Tuple[List[Tuple[int, List[int]]], List[int]]:
+    """
+    Group candidate positions into components of packages linked by shared games.
+    Returns (games of the component, positions) per component, and the positions of
+    packages covering none of the games.
+    """
+    components: List[Tuple[int, List[int]]] = []
+    idle = []
+    for position, mask in enumerate(cand_masks):
+        if not mask:
+            idle.append(position)
+            continue
+        # Components are disjoint, so one pass finds every component the package links
+        games, positions = mask, [position]
+        separate = []
+        for component_games, component_positions in components:
+            if component_games & mask:
+                games |= component_games
+                positions += component_positions
+            else:
+                separate.append((component_games, component_positions))
+        components = separate + [(games, positions)]
+    return components, idle
+
+
+def _merge_top_k(first: List[ComboKey], second: List[ComboKey], top_k: int) -> List[ComboKey]:
+    """The `top_k` cheapest combos made of one combo of each sorted list, by a heap over pairs of ranks"""
+    def combined(i: int, j: int) -> ComboKey:
+        a, b = first[i], second[j]
+        return (a[0] | b[0], a[1] + b[1], a[2] + b[2], tuple(sorted(a[3] + b[3])))
+
+    if not first or not second:
+        return []
+    heap = [(combined(0, 0), 0, 0)]
+    seen = {(0, 0)}
+    merged = []
+    while heap and len(merged) < top_k:
+        key, i, j = heapq.heappop(heap)
+        merged.append(key)
+        for pair in ((i + 1, j), (i, j + 1)):
+            if pair[0] < len(first) and pair[1] < len(second) and pair not in seen:
+                seen.add(pair)
+                heapq.heappush(heap, (combined(*pair), *pair))
+    return merged
+
+
+def _decomposed_search(
+    masks: Sequence[int],
+    prices: Sequence[Optional[int]],
+    order,
+    components: List[Tuple[int, List[int]]],
+    idle: List[int],
+    max_size: int,
+    top_k: int,
+    deadline: Optional[float],
+    executor: Optional[Executor],
+    workers: int,
+) -> Tuple[Optional[List[ComboKey]], bool, int]:
+    """
+    Top k covers of a problem whose packages split into components sharing no games:
+    every cover is one cover per component (plus any packages covering nothing), so
+    the components are searched on their own and their top k lists merged, a sum
+    instead of a product of search spaces.
+
+    The merge is exact when `max_size` cannot bind, i.e. the largest combos of the
+    lists fit together, and when the top k consists of fully priced combos (an unpriced
+    package moves a whole combo to the end, whatever the other components cost).
+    Otherwise the keys are None and the problem has to be searched as a whole.
+    """
+    candidates, _, cand_keys, _ = order
+    if len(components) > max_size:
+        # Every component needs a package of its own
+        return [], True, 0
+    # Every other component takes at least one package
+    size_left = max_size - (len(components) - 1)
+
+    def remaining() -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    lists = []
+    complete = True
+    nodes = 0
+    for games, positions in components:
+        # Ascending indices, so combos tie the same way as in the whole problem
+        indices = sorted(candidates[position] for position in positions)
+        result = cheapest_covers(
+            [masks[i] for i in indices], [prices[i] for i in indices], games, size_left, top_k,
+            remaining(), executor, workers,
+        )
+        lists.append(sorted(_combo_key([indices[i] for i in combo], prices) for combo in result.combos))
+        complete = complete and result.complete
+        nodes += result.nodes
+    if idle:
+        # Packages covering nothing can be left out, or added to any cover
+        idle_keys, idle_complete, idle_nodes = _branch_and_bound(
+            [candidates[position] for position in idle], [0] * len(idle),
+            [cand_keys[position] for position in idle], [0] * (len(idle) + 1),
+            0, size_left - 1, top_k, deadline,
+        )
+        lists.append([(0, 0, 0, ())] + idle_keys[:top_k - 1])
+        complete = complete and idle_complete
+        nodes += idle_nodes
+
+    priced = [[key for key in keys if not key[0]] for keys in lists]
+    if sum(max((key[2] for key in keys), default=0) for keys in priced) > max_size:
+        return None, complete, nodes
+    merged = priced[0]
+    for keys in priced[1:]:
+        merged = _merge_top_k(merged, keys, top_k)
+    if len(merged) < top_k and any(len(keys) < len(all_keys) for keys, all_keys in zip(priced, lists)):
+        return None, complete, nodes
+    return merged, complete, nodes
+
+
+def cheapest_covers(
+    masks: Sequence[int],
+    prices: Sequence[Optional[int]],
+    target: int,
+    max_size: int,
+    top_k: int = 3,
+    time_budget: Optional[float] = None,
+    executor: Optional[Executor] = None,
+    workers: int = 1,
+    backend: str = BRANCH_AND_BOUND,
+) -> CoverSearchResult:
+    """
+    Find the `top_k` cheapest combinations of packages whose coverage bitmasks
+    together cover every bit of `target`.
+
+    Every subset of at most `max_size` packages counts as a separate combo, including
+    supersets of a cheaper cover. Before searching, packages with at least
+    `top_k + max_size - 2` dominators are pruned: a combo with such a package is beaten by
+    at least `top_k` other combos, so it can never make the result.
+
+    Packages are explored in ascending price order with a depth-first branch and bound:
+    - a branch is cut as soon as the remaining packages cannot complete the cover
+    - once `top_k` covers are known, any branch that is already more expensive than
+      the current k-th best is cut, together with all pricier siblings
+    Only the best `top_k` covers are kept (in a bounded heap), however many covers exist.
+
+    With the `ILP` backend, a search that branch and bound does not finish within
+    `ILP_WARM_UP_NODES` combos is solved as an integer program instead (see
+    `ilp_cover`); ties are broken the same way.
+
+    If the packages fall apart into groups sharing no games, each group is searched on
+    its own and the results are merged (see `_decomposed_search`).
+
+    With an `executor` (a process pool of `workers` processes), the search tree is split
+    into independent subtrees that are searched in parallel; see `_partitioned_search`.
+
+    With a `time_budget` (seconds), the search stops once it is used up and returns the
+    best combos found so far, marked as incomplete.
+    """
+    if top_k < 1 or max_size < 1 or not target:
+        return CoverSearchResult([])
+
+    order = _search_order(masks, prices, target, max_size, top_k)
+    if order is None:
+        return CoverSearchResult([])
+
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    if backend == ILP:
+        keys, complete, nodes = _branch_and_bound(
+            *order, target, max_size, top_k, deadline, max_nodes=ILP_WARM_UP_NODES
+        )
+        if complete or (deadline is not None and time.monotonic() > deadline):
+            return CoverSearchResult([key[3] for key in keys], complete, nodes)
+        candidates, cand_masks, cand_keys, _ = order
+        covers, complete, solved = ilp_cheapest_covers(cand_masks, cand_keys, target, max_size, top_k, deadline)
+        ilp_keys = {_combo_key([candidates[position] for position in cover], prices) for cover in covers}
+        if not complete:
+            # Out of time: the best combos either search found
+            ilp_keys.update(keys)
+        return CoverSearchResult([key[3] for key in sorted(ilp_keys)[:top_k]], complete, nodes + solved, ILP)
+
+    nodes = 0
+    components, idle = _connected_components(order[1])
+    if len(components) > 1:
+        keys, complete, nodes = _decomposed_search(
+            masks, prices, order, components, idle, max_size, top_k, deadline, executor, workers
+        )
+        if keys is not None:
+            return CoverSearchResult([key[3] for key in keys], complete, nodes)
+
+    if executor is not None and workers > 1:
+        keys, complete, search_nodes = _partitioned_search(executor, workers, *order, target, max_size, top_k, deadline)
+    else:
+        keys, complete, search_nodes = _branch_and_bound(*order, target, max_size, top_k, deadline)
+    return CoverSearchResult([key[3] for key in keys], complete, nodes + search_nodes)
+
+
+def solve_cover_problem(
+    masks: Sequence[int],
+    monthly_prices: Sequence[Optional[int]],
+    yearly_prices: Sequence[Optional[int]],
+    target: int,
+    max_size: int,
+    top_k: int = 3,
+    time_budget: Optional[float] = None,
+    executor: Optional[Executor] = None,
+    workers: int = 1,
+    backend: str = BRANCH_AND_BOUND,
+) -> Dict:
+    """
+    Cheapest covers by monthly and by yearly price, sharing one time budget.
+    Only takes and returns plain data, so it can run in a worker process
+    (or split its searches over an `executor`, see `cheapest_covers`).
+    Reports the `backend` that solved them (ILP if either search needed it) and the
+    `seconds` the searches took.
+    """
+    started = time.perf_counter()
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+
+    def remaining() -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    monthly = cheapest_covers(masks, monthly_prices, target, max_size, top_k, remaining(), executor, workers, backend)
+    yearly = cheapest_covers(masks, yearly_prices, target, max_size, top_k, remaining(), executor, workers, backend)
+    return {
+        'monthly': monthly.combos,
+        'yearly': yearly.combos,
+        'complete': monthly.complete and yearly.complete,
+        'nodes': monthly.nodes + yearly.nodes,
+        'backend': ILP if ILP in (monthly.backend, yearly.backend) else BRANCH_AND_BOUND,
+        'seconds': time.perf_counter() - started,
+    }
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from api.utils.ilp_cover import ILP
+from api.utils.set_cover_solver import solve_cover_problem
+
+logger = logging.getLogger(__name__)
+
+
+class SolverBusy(Exception):
+    """No worker became free in time to run the search"""
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_solver_pool() -> ProcessPoolExecutor:
+    """Return the shared pool of `settings.SOLVER_POOL_WORKERS` solver processes"""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Workers only import the solver module, never Django or the database
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.SOLVER_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next request starts a fresh one"""
+    global _pool
+
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def solve_in_pool(solver_args: Dict, time_budget: float) -> Dict:
+    """
+    Run `solve_cover_problem` in a worker process without blocking the event loop,
+    or in a thread of this process unless `SOLVER_POOL_ENABLED` is set.
+
+    The search stops itself after `time_budget` seconds; if the job does not even get a
+    worker within the grace period on top of that, it is cancelled and `SolverBusy` raised.
+    If the pool breaks, a new one is started for the next request and this search runs
+    in a thread of this process instead.
+    """
+    loop = asyncio.get_running_loop()
+    if not settings.SOLVER_POOL_ENABLED:
+        return await loop.run_in_executor(None, partial(solve_cover_problem, **solver_args, time_budget=time_budget))
+
+    pool = get_solver_pool()
+    future = loop.run_in_executor(pool, partial(solve_cover_problem, **solver_args, time_budget=time_budget))
+    try:
+        return await asyncio.wait_for(future, time_budget + settings.SOLVER_POOL_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        raise SolverBusy()
+    except BrokenProcessPool:
+        logger.error("Solver pool broke, starting a new one and searching in this process")
+        _discard_pool(pool)
+    return await loop.run_in_executor(None, partial(solve_cover_problem, **solver_args, time_budget=time_budget))
+
+
+def solve_partitioned(solver_args: Dict, time_budget: float) -> Dict:
+    """
+    Run `solve_cover_problem` with its searches split into subtrees that the worker
+    pool solves in parallel. Without `SOLVER_POOL_ENABLED`, for problems with fewer
+    than `SOLVER_PARALLEL_MIN_PACKAGES` packages and for problems for the ILP backend,
+    the search runs in this process. If the pool breaks, the search is run here.
+    """
+    if (
+        not settings.SOLVER_POOL_ENABLED or settings.SOLVER_POOL_WORKERS < 2
+        or solver_args.get('backend') == ILP
+        or not 0 < settings.SOLVER_PARALLEL_MIN_PACKAGES <= len(solver_args['masks'])
+    ):
+        return solve_cover_problem(**solver_args, time_budget=time_budget)
+
+    pool = get_solver_pool()
+    try:
+        return solve_cover_problem(
+            **solver_args, time_budget=time_budget, executor=pool, workers=settings.SOLVER_POOL_WORKERS
+        )
+    except BrokenProcessPool:
+        logger.error("Solver pool broke, searching in this process")
+        _discard_pool(pool)
+        return solve_cover_problem(**solver_args, time_budget=time_budget)
@@ -0,0 +1,79 @@
+import csv
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict
+
+SEASON_START = datetime(2024, 8, 1)
+SEASON_DAYS = 300
+
+
+def generate_dataset(
+    directory,
+    games: int,
+    packages: int,
+    teams: int = 40,
+    tournaments: int = 6,
+    seed: int = 0,
+) -> Dict[str, Path]:
+    """
+    Write games.csv, packages.csv and offers.csv with the columns `import_data` expects.
+
+    Every package streams a random subset of tournaments, covering a random share of
+    their games. Prices mix regular, free and missing (null) values like the real data.
+    The same arguments always produce the same files. Returns the CSV path per setting.
+    """
+    rng = random.Random(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    team_names = [f"Team {i}" for i in range(1, teams + 1)]
+    tournament_names = [f"Tournament {i}" for i in range(1, tournaments + 1)]
+
+    game_rows = []
+    for game_id in range(1, games + 1):
+        home, away = rng.sample(team_names, 2)
+        starts_at = SEASON_START + timedelta(minutes=rng.randrange(SEASON_DAYS * 24 * 60))
+        game_rows.append((game_id, home, away, starts_at.strftime('%Y-%m-%d %H:%M:%S'), rng.choice(tournament_names)))
+
+    package_rows = []
+    for package_id in range(1, packages + 1):
+        monthly = rng.choice([None, 0] + [rng.randint(5, 60) * 100 for _ in range(8)])
+        yearly = rng.choice([None] + [rng.randint(4, 50) * 100 for _ in range(8)])
+        package_rows.append((
+            package_id,
+            f"Package {package_id}",
+            '' if monthly is None else monthly,
+            '' if yearly is None else yearly,
+        ))
+
+    paths = {
+        'GAMES_CSV': directory / 'games.csv',
+        'PACKAGES_CSV': directory / 'packages.csv',
+        'OFFERS_CSV': directory / 'offers.csv',
+    }
+    _write_csv(paths['GAMES_CSV'], ['id', 'team_home', 'team_away', 'starts_at', 'tournament_name'], game_rows)
+    _write_csv(
+        paths['PACKAGES_CSV'],
+        ['id', 'name', 'monthly_price_cents', 'monthly_price_yearly_subscription_in_cents'],
+        package_rows,
+    )
+
+    with open(paths['OFFERS_CSV'], 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['game_id', 'streaming_package_id', 'live', 'highlights'])
+        for package_id, *_ in package_rows:
+            streamed = set(rng.sample(tournament_names, rng.randint(1, tournaments)))
+            share = rng.random()
+            for game_id, _, _, _, tournament in game_rows:
+                if tournament in streamed and rng.random() < share:
+                    live = rng.random() < 0.8
+                    writer.writerow([game_id, package_id, int(live), int(not live or rng.random() < 0.5)])
+
+    return paths
+
+
+def _write_csv(path: Path, header, rows) -> None:
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
@@ -0,0 +1,124 @@
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set
+
+from api.utils.coverage_index import get_coverage_index
+
+# Same default as PostgreSQL's pg_trgm.similarity_threshold
+FUZZY_THRESHOLD = 0.3
+
+# Match tiers, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrams of a folded string, padded like pg_trgm so word starts weigh more"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TeamSearchIndex:
+    """
+    Read-only autocomplete index over team names for one import version.
+
+    Names are kept case-folded in a sorted array for prefix lookups (binary search)
+    and in an inverted trigram index for substring and fuzzy matches. Every word start
+    of a name is kept in a second sorted array, so queries shorter than a trigram find
+    their name and word prefix matches by binary search too.
+    """
+
+    def __init__(self, version: int, names: Iterable[str]):
+        self.version = version
+        self.names: List[str] = sorted(set(names), key=lambda name: (name.casefold(), name))
+        self.folded: List[str] = [name.casefold() for name in self.names]
+        self.name_trigrams: List[Set[str]] = [trigrams(name) for name in self.folded]
+        self.postings: Dict[str, List[int]] = {}
+        for position, grams in enumerate(self.name_trigrams):
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(position)
+        # (rest of the name from a word start, position), sorted
+        word_tails = []
+        for position, folded in enumerate(self.folded):
+            start = 0
+            for word in folded.split():
+                start = folded.index(word, start)
+                word_tails.append((folded[start:], position))
+                start += len(word)
+        word_tails.sort()
+        self.word_tails: List[str] = [tail for tail, _ in word_tails]
+        self.word_tail_positions: List[int] = [position for _, position in word_tails]
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """
+        Team names matching the query, ranked by match tier (exact, prefix, word prefix,
+        substring, fuzzy), then trigram similarity, then name. Queries shorter than a
+        trigram (the first keystrokes of an autocomplete) only match name and word
+        prefixes.
+        """
+        query = query.casefold().strip()
+        if not query:
+            return []
+        query_grams = trigrams(query)
+
+        # Prefix matches are a contiguous range of the sorted folded names
+        candidates: Set[int] = set()
+        start = bisect_left(self.folded, query)
+        end = start
+        while end < len(self.folded) and self.folded[end].startswith(query):
+            end += 1
+        candidates.update(range(start, end))
+
+        # Any substring or fuzzy match shares at least one trigram with the query;
+        # shorter queries take the names with a word starting with them, again a range
+        if len(query) < 3:
+            start = bisect_left(self.word_tails, query)
+            end = start
+            while end < len(self.word_tails) and self.word_tails[end].startswith(query):
+                end += 1
+            candidates.update(self.word_tail_positions[start:end])
+        else:
+            for gram in query_grams:
+                candidates.update(self.postings.get(gram, ()))
+
+        ranked = []
+        for position in candidates:
+            folded = self.folded[position]
+            grams = self.name_trigrams[position]
+            similarity = len(query_grams & grams) / len(query_grams | grams)
+            if folded == query:
+                tier = EXACT
+            elif folded.startswith(query):
+                tier = PREFIX
+            elif any(word.startswith(query) for word in folded.split()):
+                tier = WORD_PREFIX
+            elif query in folded:
+                tier = SUBSTRING
+            elif similarity >= FUZZY_THRESHOLD:
+                tier = FUZZY
+            else:
+                continue
+            ranked.append((tier, -similarity, folded, self.names[position]))
+
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [name for *_, name in ranked]
+
+
+_search_index: Optional[TeamSearchIndex] = None
+_search_index_lock = threading.Lock()
+
+
+def get_team_search_index() -> TeamSearchIndex:
+    """Return the search index for the current coverage index, rebuilding it after an import"""
+    global _search_index
+
+    coverage_index = get_coverage_index()
+    search_index = _search_index
+    if search_index is not None and search_index.version == coverage_index.version:
+        return search_index
+
+    with _search_index_lock:
+        if _search_index is None or _search_index.version != coverage_index.version:
+            _search_index = TeamSearchIndex(coverage_index.version, coverage_index.team_games)
+        return _search_index
@@ -0,0 +1,53 @@
+from typing import Iterable, Optional
+
+from django.db import connection
+from api.models import Game, Team, TeamGame
+
+TEAM_GAMES_BATCH_SIZE = 500
+
+TEAM_GAMES_INSERT_SQL = """
+    INSERT INTO team_games (team_id, game_id, is_home)
+    SELECT teams.id, games.id, %s
+    FROM games JOIN teams ON teams.name = games.{team_column}
+    WHERE {condition}
+"""
+
+
+def sync_team_tables(game_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Bring `teams` and `team_games` in line with `games`.
+
+    Without `game_ids` the association table is rebuilt from scratch (full import);
+    otherwise only the associations of the given, new or changed, games are rewritten.
+    Teams that no longer play any game are removed.
+    """
+    names = set(Game.objects.values_list('team_home', flat=True).distinct())
+    names |= set(Game.objects.values_list('team_away', flat=True).distinct())
+    existing = set(Team.objects.values_list('name', flat=True))
+    Team.objects.bulk_create([Team(name=name) for name in sorted(names - existing)])
+
+    if game_ids is None:
+        TeamGame.objects.all().delete()
+        _insert_team_games('TRUE', [])
+    else:
+        game_ids = list(game_ids)
+        for start in range(0, len(game_ids), TEAM_GAMES_BATCH_SIZE):
+            batch = game_ids[start:start + TEAM_GAMES_BATCH_SIZE]
+            TeamGame.objects.filter(game_id__in=batch).delete()
+            _insert_team_games(f"games.id IN ({', '.join(['%s'] * len(batch))})", batch)
+
+    Team.objects.exclude(name__in=names).delete()
+
+
+def _insert_team_games(condition: str, params: list) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            TEAM_GAMES_INSERT_SQL.format(team_column='team_home', condition=condition),
+            [True] + params,
+        )
+        # A team playing itself is only stored once, as home team
+        cursor.execute(
+            TEAM_GAMES_INSERT_SQL.format(team_column='team_away', condition=condition)
+            + ' AND games.team_away <> games.team_home',
+            [False] + params,
+        )
@@ -1,21 +1,43 @@
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, views
 from rest_framework.response import Response
-from django.db.models import Q, Count, Prefetch
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from typing import List, Dict, Set
-from .models import Game, StreamingPackage, StreamingOffer
+from .models import StreamingPackage, Team
 from .serializers import StreamingPackageSerializer
-from itertools import combinations
 
-from .utils.package_optimizer import calculate_package_coverage, get_coverage
+from .utils.approx_cover import approximate_cover
+from .utils.coverage_index import DEFAULT_COVERAGE_MODE, get_coverage_index, parse_coverage_mode, parse_game_filter
+from .utils.ilp_cover import choose_backend
+from .utils.instrumentation import TimedJSONRenderer, record_combos, record_reduction, record_solver, stage
+from .utils.package_optimizer import calculate_package_coverage
+from .utils.pareto import pareto_frontier
+from .utils.problem_reduction import get_reduction_cache, reduce_cover_problem
+from .utils.renderers import json_response
+from .utils.result_cache import combination_cache_key, get_result_cache
+from .utils.schedule_optimizer import calendar_months, cheapest_schedule
+from .utils.solver_pool import SolverBusy, solve_in_pool, solve_partitioned
+from .utils.team_search import get_team_search_index
+
+logger = logging.getLogger(__name__)
+
+# Coverage modes an exact cover can be searched for; the weighted mode only has a score
+MASK_COVERAGE_MODES = ('live', 'highlights', 'either')
 
 
 
 class TeamListView(views.APIView):
  def get(self, request):
     """Get all unique team names"""
-    home_teams = Game.objects.values_list('team_home', flat=True).distinct()
-    away_teams = Game.objects.values_list('team_away', flat=True).distinct()
-    all_teams = sorted(set(list(home_teams) + list(away_teams)))
+    all_teams = list(Team.objects.order_by('name').values_list('name', flat=True))
     return Response(all_teams)
     
 class PackageListView(views.APIView):
@@ -27,104 +49,91 @@ class PackageListView(views.APIView):
 
 class TeamSearchView(views.APIView):
     def get(self, request):
-        """Search teams by name"""
-        query = request.query_params.get('query', '').lower()
-        if not query:
-            return Response([])
+        """
+        Search teams by name, best matches first, limited to `limit` results
+        (at most `TEAM_SEARCH_MAX_LIMIT`, which is also the default)
+        """
+        limit = request.query_params.get('limit', settings.TEAM_SEARCH_MAX_LIMIT)
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            return Response({'error': '`limit` must be an integer'}, status=400)
+        limit = min(max(limit, 1), settings.TEAM_SEARCH_MAX_LIMIT)
 
-        home_teams = Game.objects.filter(team_home__icontains=query)
-        away_teams = Game.objects.filter(team_away__icontains=query)
-        all_teams = sorted(set(
-            list(home_teams.values_list('team_home', flat=True)) +
-            list(away_teams.values_list('team_away', flat=True))
-        ))
-        return Response(all_teams)
+        query = request.query_params.get('query', '')
+        if not query.strip():
+            return Response([])
+        return Response(get_team_search_index().search(query, limit))
     
 class PackagesByTeamsView(views.APIView):
     http_method_names = ['post']
     
     def post(self, request, *args, **kwargs):
-        """Get packages that offer all games for selected teams"""
-        print(f"\n packages by teams view\n")
-        print("Received request method:", request.method)
-        print("Received content type:", request.content_type)
-        print("Received data:", request.data)
-        
+        """
+        Get packages that offer all games for selected teams.
+        `tournaments`, `from` and `to` restrict which of their games count.
+        """
+        logger.debug(f"Packages by teams view: {request.method} {request.content_type} {request.data}")
+
         teams = request.data.get('teams', [])
-        print("Extracted teams:", teams)
+        try:
+            game_filter = parse_game_filter(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         
+        index = get_coverage_index()
         if not teams:
             # No teams selected, return all packages
-            packages = StreamingPackage.objects.all()
-            serializer = StreamingPackageSerializer(packages, many=True)
-            return Response(serializer.data)
+            return Response(list(index.package_data.values()))
         
-        print("Extracted teams:", teams)
+        logger.debug(f"Extracted teams: {teams}")
 
-        # Get all games involving the selected teams
-        team_games = Game.objects.filter(
-            Q(team_home__in=teams) | Q(team_away__in=teams)
-        )
-            
-        #Convert the games to a list of IDs
-        team_games_ids = team_games.values_list('id', flat=True).distinct()
-        team_games_count = len(team_games_ids)
-        
-        # Only fetch packages that cover all those games
-        packages = (
-            StreamingPackage.objects
-            .annotate(
-                covered_game_count=Count(
-                    'streamingoffer__game',
-                    filter=Q(streamingoffer__game__in=team_games_ids),
-                    distinct=True
-                )
-            )
-            .filter(covered_game_count=team_games_count)
-        ).distinct()
+        # Packages offering all (matching) games of the selected teams, from the
+        # per-team sets and bitmasks precomputed in the coverage index; like the
+        # aggregate query it replaced, every package qualifies if there are no such games
+        package_ids = index.packages_covering_all(teams, game_filter)
 
-        print("Found packages:", packages.count())
-        
-        serializer = StreamingPackageSerializer(packages, many=True)
-        return Response(serializer.data)
+        with stage('serialization'):
+            serializer_data = [index.package_data[pid] for pid in package_ids]
+        logger.debug(f"Found packages: {len(serializer_data)}")
+        return Response(serializer_data)
     
 class PackagesByTeamsViewSoft(views.APIView):
     http_method_names = ['post']
 
     def post(self, request, *args, **kwargs):
-        """Get packages with coverage percentage for selected teams"""
+        """
+        Get packages with coverage percentage for selected teams.
+        `coverage_mode` decides which offers count (live, highlights, either or weighted),
+        `tournaments`, `from` and `to` which games.
+        """
         teams = request.data.get('teams', [])
+        try:
+            coverage_mode = parse_coverage_mode(request.data)
+            game_filter = parse_game_filter(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        index = get_coverage_index()
         
         if not teams:
-            packages = StreamingPackage.objects.all()
-            serializer = StreamingPackageSerializer(packages, many=True)
-            return Response(serializer.data)
+            return Response(list(index.package_data.values()))
 
-        # Get all games involving the selected teams
-        team_games = Game.objects.filter(
-            Q(team_home__in=teams) | Q(team_away__in=teams)
-        )
-            
-        # Convert the games to a list of IDs
-        team_games_ids = team_games.values_list('id', flat=True).distinct()
-        
-        # Get all packages
-        packages = StreamingPackage.objects.all()
+        # Get all (matching) games involving the selected teams
+        team_games_mask = index.filter_games(index.games_for_teams(teams), game_filter)
         
-        # Calculate coverage for each package
-        package_coverage = calculate_package_coverage(packages, team_games_ids)
+        # Calculate coverage for each package, sorted by coverage (highest first)
+        with stage('solver'):
+            package_ids, coverage = calculate_package_coverage(index, team_games_mask, coverage_mode)
 
         # Convert to response format
-        response_data = [
-            {
-                'package': StreamingPackageSerializer(item['package']).data,
-                'coverage': item['coverage']
-            }
-            for item in package_coverage
-        ]
-
-        # Sort packages by coverage (highest first)
-        response_data.sort(key=lambda x: x['coverage'], reverse=True)
+        with stage('serialization'):
+            response_data = [
+                {
+                    'package': index.package_data[package_id],
+                    'coverage': package_coverage
+                }
+                for package_id, package_coverage in zip(package_ids.tolist(), coverage.tolist())
+            ]
 
         return Response(response_data)
 
@@ -135,26 +144,37 @@ class PackageCombinationView(views.APIView):
         """
         Step-by-step logic:
 
-        1) Parse request data for `teams`, `packages_to_exclude`, and `max_size`.
-        2) Get all games for the given teams.
+        1) Parse request data for `teams`, `packages_to_exclude`, `max_size`, `top_k`,
+           `coverage_mode` (which offers count: live, highlights or either) and the
+           game filters `tournaments`, `from` and `to`.
+        2) Get all (matching) games for the given teams from the coverage index.
         3) Get all streaming packages that cover at least one of these games.
            Exclude any packages the user wants to exclude.
         4) Separate free packages from paid packages.
         5) Collect coverage from all relevant free packages first. 
            If these free packages alone cover 100% of games, return only that combo.
-        6) If free packages alone do not cover everything, generate combinations
-           of the remaining (paid) packages up to `max_size`. Combine coverage
-           from free + paid to see if we reach 100%. Keep all combos that cover 100%.
-        7) Sort combos separately by monthly and yearly price and return both lists.
+        5b) Reduce the problem: paid packages that alone cover some game are in every
+           combo, packages dominated by cheaper supersets (or equal coverage) are dropped.
+        6) If free packages alone do not cover everything, run a branch-and-bound
+           search over the coverage bitmasks of the remaining (paid) packages for
+           the cheapest combos of up to `max_size` paid packages that reach 100%,
+           once ordered by monthly and once by yearly price.
+           Packages falling apart into groups that share no games (e.g. teams of
+           different leagues) are searched per group and the results merged.
+           Large searches are split into subtrees solved in parallel by the solver pool.
+           Selections with many packages go to the ILP backend when a MILP solver is
+           installed, if branch and bound does not finish quickly.
+           The search stops after `time_budget` seconds and then returns the best
+           combos found so far, flagged with `partial`.
+        7) Return the top `top_k` (default 3) combos for both price types.
         """
         # 1) Parse request data
-        teams = request.data.get('teams', [])
-        packages_to_exclude = request.data.get('packages_to_exclude', []) or []
-        max_size = request.data.get('max_size', 8)  # Default = 8
         try:
-            max_size = int(max_size)
-        except ValueError:
-            max_size = 8
+            teams, packages_to_exclude, max_size = self.parse_selection(request.data)
+            coverage_mode = parse_coverage_mode(request.data, MASK_COVERAGE_MODES)
+            game_filter = parse_game_filter(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
 
         # If no teams provided, nothing to do
         if not teams:
@@ -163,117 +183,457 @@ class PackageCombinationView(views.APIView):
                 'yearly_ordered': []
             })
 
-        # 2) Get all games for these teams
-        team_games = Game.objects.filter(
-            Q(team_home__in=teams) | Q(team_away__in=teams)
+        time_budget = self.parse_time_budget(request.data)
+        top_k = self.parse_top_k(request.data)
+        return Response(self.get_combinations(
+            get_coverage_index(), teams, packages_to_exclude, max_size, time_budget, top_k, coverage_mode, game_filter
+        ))
+
+    @staticmethod
+    def parse_teams(data):
+        """
+        Extract `teams` (team names) and `packages_to_exclude` (package ids) from request
+        data. Raises ValueError if they are not lists of those.
+        """
+        teams = data.get('teams', []) or []
+        if not isinstance(teams, list) or not all(isinstance(team, str) for team in teams):
+            raise ValueError('`teams` must be a list of team names')
+        packages_to_exclude = data.get('packages_to_exclude', []) or []
+        try:
+            if not isinstance(packages_to_exclude, list) or any(
+                isinstance(package_id, (bool, float)) for package_id in packages_to_exclude
+            ):
+                raise TypeError
+            packages_to_exclude = [int(package_id) for package_id in packages_to_exclude]
+        except (TypeError, ValueError):
+            raise ValueError('`packages_to_exclude` must be a list of package ids')
+        return teams, packages_to_exclude
+
+    @classmethod
+    def parse_selection(cls, data):
+        """Extract `teams`, `packages_to_exclude` and `max_size` from request data, see `parse_teams`"""
+        teams, packages_to_exclude = cls.parse_teams(data)
+        max_size = data.get('max_size', 8)  # Default = 8
+        try:
+            max_size = int(max_size)
+        except (TypeError, ValueError):
+            max_size = 8
+        return teams, packages_to_exclude, max_size
+
+    @staticmethod
+    def parse_top_k(data) -> int:
+        """Per-request number of combos to return, between 1 and the configured maximum"""
+        try:
+            top_k = int(data.get('top_k', settings.SOLVER_DEFAULT_TOP_K))
+        except (TypeError, ValueError):
+            top_k = settings.SOLVER_DEFAULT_TOP_K
+        return min(max(top_k, 1), settings.SOLVER_MAX_TOP_K)
+
+    @staticmethod
+    def parse_time_budget(data) -> float:
+        """Per-request `time_budget` in seconds, capped by the configured maximum"""
+        try:
+            time_budget = float(data.get('time_budget', settings.SOLVER_TIME_BUDGET_SECONDS))
+        except (TypeError, ValueError):
+            time_budget = settings.SOLVER_TIME_BUDGET_SECONDS
+        return min(max(time_budget, 0.0), settings.SOLVER_MAX_TIME_BUDGET_SECONDS)
+
+    def get_combinations(
+        self, index, teams, packages_to_exclude, max_size, time_budget=None, top_k=3,
+        coverage_mode=DEFAULT_COVERAGE_MODE, game_filter=None,
+    ) -> Dict:
+        """Serve repeated selections from the result cache, search otherwise"""
+        cache = get_result_cache()
+        cache_key = self.cache_key(teams, packages_to_exclude, max_size, top_k, coverage_mode, game_filter)
+        data = cache.get(cache_key, index.version)
+        if data is None:
+            data = self.find_combinations(
+                index, teams, packages_to_exclude, max_size, time_budget, top_k, coverage_mode, game_filter
+            )
+            # Partial results depend on the time budget and machine load, keep searching next time
+            if not data.get('partial'):
+                cache.set(cache_key, data, index.version)
+        return data
+
+    @staticmethod
+    def cache_key(teams, packages_to_exclude, max_size, top_k=3, coverage_mode=DEFAULT_COVERAGE_MODE, game_filter=None):
+        return combination_cache_key(
+            'combinations', teams, packages_to_exclude, max_size, top_k, coverage_mode,
+            game_filter.cache_key() if game_filter else None,
         )
-        team_games_ids = set(team_games.values_list('id', flat=True).distinct())
+
+    def find_combinations(
+        self, index, teams, packages_to_exclude, max_size, time_budget=None, top_k=3,
+        coverage_mode=DEFAULT_COVERAGE_MODE, game_filter=None,
+    ) -> Dict:
+        """Run steps 2-7 for already parsed request data"""
+        problem = self.prepare_problem(index, teams, packages_to_exclude, max_size, top_k, coverage_mode, game_filter)
+        if 'result' in problem:
+            return problem['result']
+        if time_budget is None:
+            time_budget = settings.SOLVER_TIME_BUDGET_SECONDS
+        with stage('solver'):
+            solution = solve_partitioned(problem['solver_args'], time_budget)
+        record_combos(solution['nodes'])
+        record_solver(solution['backend'], solution['seconds'])
+        return self.build_result(problem, solution)
+
+    def prepare_problem(
+        self, index, teams, packages_to_exclude, max_size, top_k=3,
+        coverage_mode=DEFAULT_COVERAGE_MODE, game_filter=None,
+    ) -> Dict:
+        """
+        Steps 2-5b. Returns either the final `result`, or the `solver_args` for step 6
+        (plain data, so the search can run in another process) and the packages to
+        build the response from.
+        """
+        # 2) Get all (matching) games for these teams
+        team_games_mask = index.filter_games(index.games_for_teams(teams), game_filter)
 
         # If no games for these teams, return empty
-        if not team_games_ids:
-            return Response({
+        if not team_games_mask:
+            return {'result': {
                 'monthly_ordered': [],
                 'yearly_ordered': []
-            })
+            }}
 
-        # 3) Get all relevant packages covering at least one of these games with prefetching
-        packages = StreamingPackage.objects.filter(
-            streamingoffer__game__in=team_games_ids
-        ).prefetch_related(
-            Prefetch(
-                'streamingoffer_set',
-                queryset=StreamingOffer.objects.filter(game_id__in=team_games_ids),
-                to_attr='relevant_offers'
-            )
-        ).distinct()
+        # 3) Get all relevant packages covering at least one of these games,
+        # excluding packages specified by the user
+        package_ids = index.packages_covering(team_games_mask, exclude=packages_to_exclude, mode=coverage_mode)
 
-        # Exclude packages specified by the user
-        if packages_to_exclude:
-            packages = packages.exclude(id__in=packages_to_exclude)
-
-        # 4) Separate free packages from paid packages with prefetching maintained
-        all_free_packages = packages.filter(
-            Q(monthly_price_cents__isnull=False) & Q(monthly_price_cents=0) 
-        )
-        paid_packages = packages.exclude(id__in=all_free_packages)
+        # 4) Separate free packages from paid packages
+        all_free_packages = [pid for pid in package_ids if index.packages[pid].monthly_price_cents == 0]
+        paid_package_ids = [pid for pid in package_ids if index.packages[pid].monthly_price_cents != 0]
 
         # 5) Collect coverage from all relevant free packages
-        coverage_from_free = set()
-        free_packages_in_use = []
-        games_to_cover = set(team_games_ids)
-
-        for free_pkg in all_free_packages:
-            # Use prefetched offers
-            covered_by_this_free = {offer.game_id for offer in free_pkg.relevant_offers}
-            if covered_by_this_free:
-                games_to_cover -= covered_by_this_free
-                free_packages_in_use.append(free_pkg)
-                coverage_from_free |= covered_by_this_free
+        games_to_cover = team_games_mask & ~index.coverage(all_free_packages, coverage_mode)
 
         # If free coverage alone covers everything, return that combo for both lists
-        if games_to_cover == set():
-            combo_data = self._build_response([free_packages_in_use], 'monthly')
-            return Response({
+        if not games_to_cover:
+            combo_data = self._build_response(index, [all_free_packages], 'monthly')
+            return {'result': {
                 'monthly_ordered': combo_data,
                 'yearly_ordered': combo_data
-            })
+            }}
+
+        # Only the games not already covered by free packages need to be covered
+        paid_package_list = [index.packages[pid] for pid in paid_package_ids]
+        masks = [index.mode_package_games[coverage_mode][pid] for pid in paid_package_ids]
+        monthly_prices = [p.monthly_price_cents for p in paid_package_list]
+        yearly_prices = [p.monthly_price_yearly_subscription_in_cents or 0 for p in paid_package_list]
+        max_size = min(max_size, len(paid_package_list))
+
+        # 5b) Set aside forced packages and drop dominated ones, cached per selection
+        reduction_cache = get_reduction_cache()
+        reduction_key = self.cache_key(teams, packages_to_exclude, max_size, top_k, coverage_mode, game_filter)
+        reduced = reduction_cache.get(reduction_key, index.version)
+        if reduced is None:
+            with stage('solver'):
+                reduced = reduce_cover_problem(masks, monthly_prices, yearly_prices, games_to_cover, max_size, top_k)
+            reduction_cache.set(reduction_key, reduced, index.version)
+        record_reduction(reduced.stats)
 
-        # 6) Generate combos of paid packages up to `max_size`
-        all_covering_combos = []
-        paid_package_list = list(paid_packages)
-        max_combo_size = min(max_size, len(paid_package_list))
+        return {
+            'index': index,
+            'free_package_ids': all_free_packages + [paid_package_ids[i] for i in reduced.forced],
+            'paid_package_ids': [paid_package_ids[i] for i in reduced.kept],
+            'solver_args': {
+                'masks': [masks[i] for i in reduced.kept],
+                'monthly_prices': reduced.monthly_prices,
+                'yearly_prices': reduced.yearly_prices,
+                'target': reduced.target,
+                'max_size': min(reduced.max_size, len(reduced.kept)),
+                'top_k': top_k,
+                'backend': choose_backend(len(reduced.kept), settings.SOLVER_ILP_MIN_PACKAGES),
+            },
+        }
 
-        for size in range(1, max_combo_size + 1):
-            for combo in combinations(paid_package_list, size):
-                games_to_cover_combo = set(games_to_cover)
+    def build_result(self, problem, solution) -> Dict:
+        """
+        Step 7 for the combos found by step 6: the cheapest covering combos of up to
+        `max_size` paid packages, once by monthly and once by yearly price.
+        """
+        def to_package_ids(covers):
+            return [
+                problem['free_package_ids'] + [problem['paid_package_ids'][i] for i in combo]
+                for combo in covers
+            ]
 
-                # Use prefetched offers for paid packages too
-                for paid_pkg in combo:
-                    coverage_of_paid_pkg = {offer.game_id for offer in paid_pkg.relevant_offers}
-                    games_to_cover_combo -= coverage_of_paid_pkg
+        # 7) Build response with both monthly and yearly ordered combinations
+        index = problem['index']
+        top_k = problem['solver_args']['top_k']
+        with stage('serialization'):
+            data = {
+                'monthly_ordered': self._build_response(index, to_package_ids(solution['monthly']), 'monthly', top_k),
+                'yearly_ordered': self._build_response(index, to_package_ids(solution['yearly']), 'yearly', top_k),
+            }
+        if not solution['complete']:
+            # The time budget ran out, these are the best combos found so far
+            data['partial'] = True
+        return data
 
-                if games_to_cover_combo == set():
-                    final_combo = list(free_packages_in_use) + list(combo)
-                    all_covering_combos.append(final_combo)
+    def _build_response(self, index, combinations: List[List[int]], sort_by='monthly', limit=None) -> List[Dict]:
+        """
+        Build response data for each combo with pricing and coverage.
+        Totals are summed from the cached package data and sorted first, so only the
+        `limit` returned combos are assembled.
+        """
+        totals = []
+        for combo in combinations:
+            packages = [index.package_data[pid] for pid in combo]
+            monthly_prices = [p['monthly_price_cents'] for p in packages]
 
-        # 7) Build response with both monthly and yearly ordered combinations
-        monthly_combos = self._build_response(all_covering_combos, 'monthly')
-        yearly_combos = self._build_response(all_covering_combos, 'yearly')
+            # If any package has a null monthly price, the monthly total is null
+            total_monthly = None if None in monthly_prices else sum(monthly_prices)
+            total_yearly_by_monthly = sum(p['monthly_price_yearly_subscription_in_cents'] or 0 for p in packages)
+            totals.append((packages, total_monthly, total_yearly_by_monthly))
 
-        return Response({
-            'monthly_ordered': monthly_combos[:3],  # Top 3 monthly combinations
-            'yearly_ordered': yearly_combos[:3]     # Top 3 yearly combinations
-        })
+        # Sort based on the specified price type
+        if sort_by == 'monthly':
+            totals.sort(key=lambda x: float('inf') if x[1] is None else x[1])
+        else:  # yearly
+            totals.sort(key=lambda x: x[2])
 
-    def _build_response(self, combinations: List[List[StreamingPackage]], sort_by='monthly') -> List[Dict]:
-        """Build response data for each combo with pricing and coverage"""
-        response = []
-        for combo in combinations:
-            # Check if any package has null monthly price
-            has_null_monthly = any(p.monthly_price_cents is None for p in combo)
-            
-            # Calculate totals
-            total_monthly = None if has_null_monthly else sum(p.monthly_price_cents or 0 for p in combo)
-            total_yearly_by_monthly = sum(p.monthly_price_yearly_subscription_in_cents or 0 for p in combo)
-            
-            response.append({
-                'packages': StreamingPackageSerializer(combo, many=True).data,
+        return [
+            {
+                'packages': packages,
                 'total_monthly_price': total_monthly,
                 'total_yearly_by_monthly': total_yearly_by_monthly,
                 'coverage': 100.0  # Main view only returns 100% coverage combinations
-            })
+            }
+            for packages, total_monthly, total_yearly_by_monthly in totals[:limit]
+        ]
 
-        # Sort based on the specified price type
-        if sort_by == 'monthly':
-            response.sort(key=lambda x: (
-                float('inf') if x['total_monthly_price'] is None else x['total_monthly_price']
-            ))
-        else:  # yearly
-            response.sort(key=lambda x: (
-                float('inf') if x['total_yearly_by_monthly'] is None else x['total_yearly_by_monthly']
+
+class PackageCombinationBatchView(views.APIView):
+    """
+    Solves many team selections in one request, e.g. for comparison pages or
+    precomputation jobs. All selections are answered from the same coverage index,
+    identical selections are solved only once, and every result goes through the
+    same result cache as single requests. Selections that merely overlap (share
+    some teams) are solved independently.
+
+    A request may hold at most `BATCH_MAX_SELECTIONS` selections and its searches
+    share `BATCH_TIME_BUDGET_SECONDS`: each selection gets its own `time_budget`, but
+    no more than an even share of what is left for the selections not solved yet.
+    """
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        """
+        Expects `selections`: a list of objects with `teams`, `packages_to_exclude` and
+        `max_size` (optionally `top_k`, `time_budget`, `coverage_mode` and game filters),
+        like the body of `packages/combinations/`.
+        Returns `results` in the same order, or, with `stream` set (or an
+        `application/x-ndjson` Accept header), one JSON line per selection as it finishes.
+        """
+        selections = request.data.get('selections')
+        if not isinstance(selections, list) or not all(isinstance(s, dict) for s in selections):
+            return Response({'error': '`selections` must be a list of objects'}, status=400)
+        if len(selections) > settings.BATCH_MAX_SELECTIONS:
+            return Response(
+                {'error': f'At most {settings.BATCH_MAX_SELECTIONS} selections per request'}, status=400
+            )
+
+        try:
+            for selection in selections:
+                PackageCombinationView.parse_selection(selection)
+                parse_coverage_mode(selection, MASK_COVERAGE_MODES)
+                parse_game_filter(selection)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        results = self.solve(get_coverage_index(), selections)
+
+        if request.data.get('stream') or 'application/x-ndjson' in request.headers.get('Accept', ''):
+            # The selections are solved and rendered while streaming, still timed as part of the request
+            renderer = TimedJSONRenderer()
+            return StreamingHttpResponse(
+                (renderer.render({'index': position, **data}) + b'\n' for position, data in results),
+                content_type='application/x-ndjson'
+            )
+        return Response({'results': [data for _, data in results]})
+
+    def solve(self, index, selections):
+        """Yield (position, result) for each selection"""
+        combination_view = PackageCombinationView()
+        solved = {}
+        keys = []
+        for selection in selections:
+            teams, packages_to_exclude, max_size = combination_view.parse_selection(selection)
+            top_k = combination_view.parse_top_k(selection)
+            coverage_mode = parse_coverage_mode(selection, MASK_COVERAGE_MODES)
+            game_filter = parse_game_filter(selection)
+            keys.append(combination_view.cache_key(
+                teams, packages_to_exclude, max_size, top_k, coverage_mode, game_filter
             ))
+        # Selections still to solve, for splitting the remaining time budget evenly
+        unsolved = len(set(keys))
+        deadline = time.monotonic() + settings.BATCH_TIME_BUDGET_SECONDS
+
+        for position, (selection, key) in enumerate(zip(selections, keys)):
+            if key not in solved:
+                teams, packages_to_exclude, max_size = combination_view.parse_selection(selection)
+                if teams:
+                    share = max(0.0, deadline - time.monotonic()) / unsolved
+                    solved[key] = combination_view.get_combinations(
+                        index, teams, packages_to_exclude, max_size,
+                        time_budget=min(combination_view.parse_time_budget(selection), share),
+                        top_k=combination_view.parse_top_k(selection),
+                        coverage_mode=parse_coverage_mode(selection, MASK_COVERAGE_MODES),
+                        game_filter=parse_game_filter(selection),
+                    )
+                else:
+                    solved[key] = {'monthly_ordered': [], 'yearly_ordered': []}
+                unsolved -= 1
+            yield position, solved[key]
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class PackageCombinationAsyncView(View):
+    """
+    Same request and response as `packages/combinations/`, but the search runs off the
+    event loop (in the solver process pool with `SOLVER_POOL_ENABLED`, in a thread
+    otherwise), so under ASGI a long search does not hold up other requests.
+    Responds with 503 if no solver worker becomes free in time.
+    """
+    http_method_names = ['post']
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return json_response({'error': 'Request body must be JSON'}, status=400)
+        if not isinstance(data, dict):
+            return json_response({'error': 'Request body must be a JSON object'}, status=400)
+
+        combination_view = PackageCombinationView()
+        time_budget = combination_view.parse_time_budget(data)
+        top_k = combination_view.parse_top_k(data)
+        try:
+            teams, packages_to_exclude, max_size = combination_view.parse_selection(data)
+            coverage_mode = parse_coverage_mode(data, MASK_COVERAGE_MODES)
+            game_filter = parse_game_filter(data)
+        except ValueError as e:
+            return json_response({'error': str(e)}, status=400)
+
+        # If no teams provided, nothing to do
+        if not teams:
+            return json_response({
+                'monthly_ordered': [],
+                'yearly_ordered': []
+            })
+
+        # The index and cache may touch the database, keep them off the event loop
+        index = await sync_to_async(get_coverage_index)()
+        cache = get_result_cache()
+        cache_key = combination_view.cache_key(teams, packages_to_exclude, max_size, top_k, coverage_mode, game_filter)
+        result = await sync_to_async(cache.get)(cache_key, index.version)
+        if result is not None:
+            return json_response(result)
+
+        # The reduction is CPU work, keep it off the event loop too
+        problem = await sync_to_async(combination_view.prepare_problem)(
+            index, teams, packages_to_exclude, max_size, top_k, coverage_mode, game_filter
+        )
+        if 'result' in problem:
+            result = problem['result']
+        else:
+            try:
+                with stage('solver'):
+                    solution = await solve_in_pool(problem['solver_args'], time_budget)
+            except SolverBusy:
+                return json_response({'error': 'All solver workers are busy, try again later'}, status=503)
+            record_combos(solution['nodes'])
+            record_solver(solution['backend'], solution['seconds'])
+            result = combination_view.build_result(problem, solution)
+
+        if not result.get('partial'):
+            await sync_to_async(cache.set)(cache_key, result, index.version)
+        with stage('serialization'):
+            return json_response(result)
+
+
+class PackageScheduleView(views.APIView):
+    """
+    Cheapest month-by-month subscription plan for the selected teams: games are
+    bucketed by calendar month, and every stretch of months is paid either monthly or
+    with a yearly subscription, whichever makes the whole season cheapest.
+    """
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        """
+        Takes the same fields as `packages/combinations/` (`max_size` limits the packages
+        per segment) and returns the `plan`: segments with their billing, months,
+        packages and price, plus the `total_price` of the season in cents.
+        Packages without a monthly or yearly price cannot be booked that way.
+        """
+        combination_view = PackageCombinationView()
+        time_budget = combination_view.parse_time_budget(request.data)
+        try:
+            teams, packages_to_exclude, max_size = combination_view.parse_selection(request.data)
+            coverage_mode = parse_coverage_mode(request.data, MASK_COVERAGE_MODES)
+            game_filter = parse_game_filter(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        index = get_coverage_index()
+        cache = get_result_cache()
+        cache_key = combination_cache_key(
+            'schedule', teams, packages_to_exclude, max_size,
+            coverage_mode=coverage_mode, game_filter=game_filter.cache_key(),
+        )
+        data = cache.get(cache_key, index.version)
+        if data is None:
+            data = self.find_schedule(index, teams, packages_to_exclude, max_size, coverage_mode, time_budget, game_filter)
+            if not data.get('partial'):
+                cache.set(cache_key, data, index.version)
+        return Response(data)
+
+    def find_schedule(
+        self, index, teams, packages_to_exclude, max_size, coverage_mode, time_budget=None, game_filter=None
+    ) -> Dict:
+        team_games_mask = index.filter_games(index.games_for_teams(teams), game_filter)
+        game_months = [month for month in index.months if index.month_games[month] & team_games_mask]
+        if not game_months:
+            return {'months': [], 'total_price': 0, 'plan': [], 'uncoverable_months': []}
+
+        # Every calendar month of the season, including months without games
+        months = calendar_months(game_months[0], game_months[-1])
+        package_ids = index.packages_covering(team_games_mask, exclude=packages_to_exclude, mode=coverage_mode)
+        with stage('solver'):
+            schedule = cheapest_schedule(
+                months,
+                [team_games_mask & index.month_games.get(month, 0) for month in months],
+                package_ids,
+                [index.mode_package_games[coverage_mode][pid] for pid in package_ids],
+                [index.packages[pid].monthly_price_cents for pid in package_ids],
+                [index.packages[pid].monthly_price_yearly_subscription_in_cents for pid in package_ids],
+                max_size,
+                time_budget,
+            )
 
-        return response
+        with stage('serialization'):
+            data = {
+                'months': months,
+                'total_price': schedule['total_price'],
+                'plan': [
+                    {
+                        'billing': segment['billing'],
+                        'from': segment['from'],
+                        'to': segment['to'],
+                        'months': segment['months'],
+                        'packages': [index.package_data[pid] for pid in segment['package_ids']],
+                        'price': segment['price'],
+                    }
+                    for segment in schedule['plan']
+                ],
+                'uncoverable_months': schedule['uncoverable_months'],
+            }
+        if not schedule['complete']:
+            data['partial'] = True
+        return data
 
 
 class PackageCombinationViewBackup(views.APIView):
@@ -286,20 +646,26 @@ class PackageCombinationViewBackup(views.APIView):
 
     def post(self, request, *args, **kwargs):
         """
-        Backup implementation that finds package combinations by removing non-essential packages,
-        starting from the most expensive ones. Returns the best coverage achieved.
+        Backup implementation that finds a cheap combination reaching the best coverage
+        the relevant packages allow, without an exhaustive search.
         
         Logic:
-        1) Parse request data for teams, packages_to_exclude
+        1) Parse request data for teams, packages_to_exclude, coverage_mode and game filters
         2) Get all games for the given teams
-        3) Get all relevant packages with prefetching
-        4) Sort packages by price (monthly, then yearly)
-        5) Iteratively remove packages that don't reduce coverage
-        6) Return the optimized combination with coverage percentage
+        3) Get all relevant packages from the coverage index
+        4) Encode what each package covers (live and any offer bits in the weighted mode)
+        5) Per price type: greedy by price per newly covered game, then drop redundant
+           packages and try cheaper swaps (see `approx_cover`)
+        6) Compare each price to the LP lower bound of the cover problem
+        7) Return both combinations with coverage percentage and approximation ratio
         """
         # 1) Parse request data
-        teams = request.data.get('teams', [])
-        packages_to_exclude = request.data.get('packages_to_exclude', []) or []
+        try:
+            teams, packages_to_exclude = PackageCombinationView.parse_teams(request.data)
+            coverage_mode = parse_coverage_mode(request.data)
+            game_filter = parse_game_filter(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
         
         # If no teams provided, nothing to do
         if not teams:
@@ -308,100 +674,171 @@ class PackageCombinationViewBackup(views.APIView):
                 'yearly_ordered': []
             })
 
-        # 2) Get all games for these teams
-        team_games = Game.objects.filter(
-            Q(team_home__in=teams) | Q(team_away__in=teams)
+        # Serve repeated selections from the result cache
+        index = get_coverage_index()
+        cache = get_result_cache()
+        cache_key = combination_cache_key(
+            'combinations-backup', teams, packages_to_exclude,
+            coverage_mode=coverage_mode, game_filter=game_filter.cache_key(),
         )
-        team_games_ids = set(team_games.values_list('id', flat=True).distinct())
-        total_games = len(team_games_ids)
+        data = cache.get(cache_key, index.version)
+        if data is None:
+            data = self.find_combinations(index, teams, packages_to_exclude, coverage_mode, game_filter)
+            cache.set(cache_key, data, index.version)
+        return Response(data)
+
+    def find_combinations(
+        self, index, teams, packages_to_exclude, coverage_mode=DEFAULT_COVERAGE_MODE, game_filter=None
+    ) -> Dict:
+        """Run steps 2-7 for already parsed request data"""
+        # 2) Get all (matching) games for these teams
+        team_games_mask = index.filter_games(index.games_for_teams(teams), game_filter)
+        total_games = team_games_mask.bit_count()
 
         # If no games for these teams, return empty
         if not total_games:
-            return Response({
+            return {
                 'monthly_ordered': [],
                 'yearly_ordered': []
-            })
+            }
 
-        # 3) Get all relevant packages with prefetching
-        packages = StreamingPackage.objects.filter(
-            streamingoffer__game__in=team_games_ids
-        ).prefetch_related(
-            Prefetch(
-                'streamingoffer_set',
-                queryset=StreamingOffer.objects.filter(game_id__in=team_games_ids),
-                to_attr='relevant_offers'
-            )
-        ).distinct()
+        # 3) Get all relevant packages, excluding packages specified by the user
+        package_ids = index.packages_covering(team_games_mask, exclude=packages_to_exclude, mode=coverage_mode)
 
-        # Exclude packages specified by the user
-        if packages_to_exclude:
-            packages = packages.exclude(id__in=packages_to_exclude)
+        # 4) What each package covers (live and any offer bits in the weighted mode)
+        masks, target, value = index.cover_masks(package_ids, team_games_mask, coverage_mode)
 
-        # 4) First separate free and paid packages
-        free_packages = packages.filter(
-            Q(monthly_price_cents__isnull=False) & Q(monthly_price_cents=0)
-        )
-        paid_packages = list(packages.exclude(id__in=free_packages.values_list('id', flat=True)))
-        
-        # Start with free packages coverage
-        free_coverage = get_coverage(free_packages)
-        remaining_games = set(team_games_ids) - free_coverage
-        current_packages = list(free_packages)
-
-        # 5) Sort paid packages by coverage first, then price
-        def get_package_sort_key(pkg):
-            """Helper function to sort packages by coverage (desc), then monthly price"""
-            coverage = len(get_coverage([pkg]) & remaining_games)  # Only count coverage of remaining games
-            monthly = pkg.monthly_price_cents or float('inf')
-            yearly = pkg.monthly_price_yearly_subscription_in_cents or float('inf')
-            return (-coverage, monthly, yearly)  # Negative coverage for descending order
-        
-        # Sort paid packages
-        paid_packages.sort(key=get_package_sort_key)
-
-        # 6) Add packages until we have full coverage or run out of packages
-        for pkg in paid_packages:
-            pkg_coverage = get_coverage([pkg])
-            if remaining_games & pkg_coverage:  # If package covers any remaining game
-                current_packages.append(pkg)
-                remaining_games -= pkg_coverage
-                
-                if not remaining_games:  # Full coverage achieved
-                    break
-
-        # Calculate final coverage percentage
-        final_coverage = get_coverage(current_packages)
-        coverage_percentage = (len(final_coverage) / total_games) * 100
+        # 5) + 6) Cheapest cover found per price type, unpriced yearly subscriptions
+        # count as free like in the exact search
+        price_types = {
+            'monthly': [index.packages[pid].monthly_price_cents for pid in package_ids],
+            'yearly': [index.packages[pid].monthly_price_yearly_subscription_in_cents or 0 for pid in package_ids],
+        }
+        covers = {}
+        with stage('solver'):
+            for sort_by, prices in price_types.items():
+                covers[sort_by] = approximate_cover(masks, prices, target, value)
+        record_combos(sum(cover['evaluated'] for cover in covers.values()))
+
+        # Every cover reaches all the coverage the packages allow
+        reachable = 0
+        for mask in masks:
+            reachable |= mask
+        coverage_percentage = value(reachable & target) / total_games * 100
 
         # 7) Build response with monthly and yearly order
-        monthly_combo = self._build_response(current_packages, coverage_percentage, 'monthly')
-        yearly_combo = self._build_response(current_packages, coverage_percentage, 'yearly')
-
-        return Response({
-            'monthly_ordered': [monthly_combo],
-            'yearly_ordered': [yearly_combo]
-        })
+        with stage('serialization'):
+            data = {}
+            for sort_by, cover in covers.items():
+                combo = self._build_response(
+                    index, [package_ids[i] for i in cover['packages']], coverage_percentage, sort_by
+                )
+                combo['price_lower_bound'] = cover['lower_bound']
+                combo['approximation_ratio'] = None if cover['ratio'] is None else round(cover['ratio'], 3)
+                data[f'{sort_by}_ordered'] = [combo]
+        return data
 
-    def _build_response(self, packages: List[StreamingPackage], coverage_percentage: float, sort_by='monthly') -> Dict:
+    def _build_response(self, index, package_ids: List[int], coverage_percentage: float, sort_by='monthly') -> Dict:
         """
         Build response data for each combo, including coverage percentage.
         If any package in a combination has a null monthly price, the total monthly price
         for that combination will be null.
         """
-        # Check if any package has null monthly price
-        has_null_monthly = any(p.monthly_price_cents is None for p in packages)
-            
+        packages = [index.package_data[pid] for pid in package_ids]
+        monthly_prices = [p['monthly_price_cents'] for p in packages]
+
         # Calculate totals
-        total_monthly = None if has_null_monthly else sum(p.monthly_price_cents or 0 for p in packages)
-        total_yearly_by_monthly = sum(p.monthly_price_yearly_subscription_in_cents or 0 for p in packages)
+        total_monthly = None if None in monthly_prices else sum(monthly_prices)
+        total_yearly_by_monthly = sum(p['monthly_price_yearly_subscription_in_cents'] or 0 for p in packages)
 
         return {
-            'packages': StreamingPackageSerializer(packages, many=True).data,
+            'packages': packages,
             'total_monthly_price': total_monthly,
             'total_yearly_by_monthly': total_yearly_by_monthly,
             'coverage': round(coverage_percentage, 1)  # Round to 1 decimal place
         }
 
+class PackageParetoView(views.APIView):
+    """
+    Coverage versus price trade-off for the selected teams: for every coverage level
+    the cheapest combination found, where each next one costs more and covers more.
+    Answers both "what is the cheapest full cover" and "what does 80% cost" at once.
+    """
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        """
+        Takes `teams`, `packages_to_exclude`, `coverage_mode`, the game filters and
+        `max_points` (default `PARETO_DEFAULT_POINTS`, at most `PARETO_MAX_POINTS`).
+        Returns the frontier by monthly and by yearly price, cheapest and least covering
+        first, each point shaped like a `combinations-backup/` combination.
+        """
+        try:
+            teams, packages_to_exclude = PackageCombinationView.parse_teams(request.data)
+            coverage_mode = parse_coverage_mode(request.data)
+            game_filter = parse_game_filter(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        try:
+            max_points = int(request.data.get('max_points', settings.PARETO_DEFAULT_POINTS))
+        except (TypeError, ValueError):
+            max_points = settings.PARETO_DEFAULT_POINTS
+        max_points = min(max(max_points, 1), settings.PARETO_MAX_POINTS)
+
+        if not teams:
+            return Response({'monthly_ordered': [], 'yearly_ordered': []})
+
+        index = get_coverage_index()
+        cache = get_result_cache()
+        cache_key = combination_cache_key(
+            'pareto', teams, packages_to_exclude, top_k=max_points,
+            coverage_mode=coverage_mode, game_filter=game_filter.cache_key(),
+        )
+        data = cache.get(cache_key, index.version)
+        if data is None:
+            data = self.find_frontier(index, teams, packages_to_exclude, max_points, coverage_mode, game_filter)
+            cache.set(cache_key, data, index.version)
+        return Response(data)
+
+    def find_frontier(
+        self, index, teams, packages_to_exclude, max_points, coverage_mode=DEFAULT_COVERAGE_MODE, game_filter=None
+    ) -> Dict:
+        team_games_mask = index.filter_games(index.games_for_teams(teams), game_filter)
+        total_games = team_games_mask.bit_count()
+        if not total_games:
+            return {'monthly_ordered': [], 'yearly_ordered': []}
+
+        package_ids = index.packages_covering(team_games_mask, exclude=packages_to_exclude, mode=coverage_mode)
+        masks, target, value = index.cover_masks(package_ids, team_games_mask, coverage_mode)
+        # Unpriced yearly subscriptions count as free like in the other combination endpoints
+        price_types = {
+            'monthly': [index.packages[pid].monthly_price_cents for pid in package_ids],
+            'yearly': [index.packages[pid].monthly_price_yearly_subscription_in_cents or 0 for pid in package_ids],
+        }
+        frontiers = {}
+        with stage('solver'):
+            for sort_by, prices in price_types.items():
+                frontiers[sort_by] = pareto_frontier(
+                    masks, prices, target, value, max_points, settings.PARETO_BEAM_WIDTH
+                )
+
+        backup_view = PackageCombinationViewBackup()
+        with stage('serialization'):
+            return {
+                f'{sort_by}_ordered': [
+                    backup_view._build_response(
+                        index, [package_ids[i] for i in point['packages']], point['value'] / total_games * 100, sort_by
+                    )
+                    for point in frontier
+                ]
+                for sort_by, frontier in frontiers.items()
+            }
+
+class ResultCacheStatsView(views.APIView):
+    def get(self, request):
+        """Get hit/miss counters of the optimizer result cache"""
+        return Response(get_result_cache().stats())
+
 class StreamingPackageViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for listing all streaming packages"""
     queryset = StreamingPackage.objects.all()
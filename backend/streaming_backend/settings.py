@@ -26,6 +26,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.utils.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -124,7 +125,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.utils.instrumentation.TimedJSONRenderer',
     ],
 }
 
@@ -134,6 +135,74 @@ GAMES_CSV = DATA_DIR / 'games.csv'
 PACKAGES_CSV = DATA_DIR / 'packages.csv'
 OFFERS_CSV = DATA_DIR / 'offers.csv'
 
+# In-memory coverage index: how often (in seconds) to check for a newer data import
+COVERAGE_INDEX_CHECK_INTERVAL = int(os.getenv('COVERAGE_INDEX_CHECK_INTERVAL', 5))
+
+# Memory-mapped coverage snapshot written by import_data and loaded by every process
+# (web workers and solver pool) instead of querying the whole dataset; empty disables it
+COVERAGE_SNAPSHOT_PATH = os.getenv('COVERAGE_SNAPSHOT_PATH', str(DATA_DIR / 'coverage.snapshot'))
+
+# Most team names the search endpoint returns (`limit`), also its default
+TEAM_SEARCH_MAX_LIMIT = int(os.getenv('TEAM_SEARCH_MAX_LIMIT', 50))
+
+# In coverage_mode 'weighted', a game only offered as highlights counts this much (a live game counts 1)
+COVERAGE_HIGHLIGHTS_WEIGHT = float(os.getenv('COVERAGE_HIGHLIGHTS_WEIGHT', 0.5))
+
+# Result cache for combination queries: 'local' (per process LRU) or 'django' (uses CACHES[ALIAS])
+OPTIMIZER_RESULT_CACHE = {
+    'BACKEND': os.getenv('OPTIMIZER_RESULT_CACHE_BACKEND', 'local'),
+    'ALIAS': 'default',
+    'MAX_ENTRIES': int(os.getenv('OPTIMIZER_RESULT_CACHE_MAX_ENTRIES', 1024)),
+    'TTL': int(os.getenv('OPTIMIZER_RESULT_CACHE_TTL', 600)),
+}
+
+# Per process cache of reduced cover problems (forced and dominated packages set aside) per team selection
+OPTIMIZER_REDUCTION_CACHE_MAX_ENTRIES = int(os.getenv('OPTIMIZER_REDUCTION_CACHE_MAX_ENTRIES', 1024))
+
+# Combination solver: default and maximum time budget per request (seconds), after which
+# the best combos found so far are returned as partial results
+SOLVER_TIME_BUDGET_SECONDS = float(os.getenv('SOLVER_TIME_BUDGET_SECONDS', 5))
+SOLVER_MAX_TIME_BUDGET_SECONDS = float(os.getenv('SOLVER_MAX_TIME_BUDGET_SECONDS', 30))
+
+# Number of combinations returned per price type by default (`top_k`), and the most a request may ask for
+SOLVER_DEFAULT_TOP_K = int(os.getenv('SOLVER_DEFAULT_TOP_K', 3))
+SOLVER_MAX_TOP_K = int(os.getenv('SOLVER_MAX_TOP_K', 20))
+
+# Batch combination endpoint: most selections per request, and the time budget (seconds) all
+# of a request's searches share
+BATCH_MAX_SELECTIONS = int(os.getenv('BATCH_MAX_SELECTIONS', 100))
+BATCH_TIME_BUDGET_SECONDS = float(os.getenv('BATCH_TIME_BUDGET_SECONDS', 30))
+
+# Points of the coverage/price frontier returned by default (`max_points`) and at most, and how many
+# partial combinations the frontier search keeps per step
+PARETO_DEFAULT_POINTS = int(os.getenv('PARETO_DEFAULT_POINTS', 10))
+PARETO_MAX_POINTS = int(os.getenv('PARETO_MAX_POINTS', 50))
+PARETO_BEAM_WIDTH = int(os.getenv('PARETO_BEAM_WIDTH', 256))
+
+# Solver process pool, off by default: every web worker process starts its own pool, so a host
+# runs up to (web worker processes x SOLVER_POOL_WORKERS) solver processes. Without it, the async
+# combination endpoint searches in a thread and large searches are not split across processes.
+SOLVER_POOL_ENABLED = bool(int(os.getenv('SOLVER_POOL_ENABLED', 0)))
+# Worker processes per pool, and how long (seconds) past its time budget a request may wait
+# for a free worker
+SOLVER_POOL_WORKERS = int(os.getenv('SOLVER_POOL_WORKERS', 2))
+SOLVER_POOL_GRACE_SECONDS = float(os.getenv('SOLVER_POOL_GRACE_SECONDS', 2))
+
+# Combination searches over at least this many packages (after reduction) are split into
+# subtrees solved in parallel by the solver pool; 0 searches every request in its own process
+SOLVER_PARALLEL_MIN_PACKAGES = int(os.getenv('SOLVER_PARALLEL_MIN_PACKAGES', 24))
+
+# Combination searches over at least this many packages (after reduction) are solved as an
+# integer program when scipy (HiGHS) is installed and branch and bound does not finish quickly; 0 never
+SOLVER_ILP_MIN_PACKAGES = int(os.getenv('SOLVER_ILP_MIN_PACKAGES', 30))
+
+# Client addresses or networks (comma separated, e.g. 10.0.0.0/8) allowed to scrape /metrics,
+# only loopback by default; empty turns the endpoint off
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+
+# Send per-stage request timings (db, solver, serialization) in a Server-Timing header
+SERVER_TIMING_HEADER = bool(int(os.getenv('SERVER_TIMING_HEADER', DEBUG)))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -17,8 +17,10 @@ export const streamingApi = {
     return response.data;
   },
 
-  async searchTeams(query: string): Promise<string[]> {
-    const response = await apiClient.get(`/api/teams/search/?query=${query}`);
+  async searchTeams(query: string, limit?: number): Promise<string[]> {
+    const response = await apiClient.get('/api/teams/search/', {
+      params: { query, limit }
+    });
     return response.data;
   },
 